@@ -1,8 +1,42 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Query, BackgroundTasks
-from fastapi.responses import FileResponse
-from app.utils.utils import pattern_date, phrases_to_ignore, partial_phrases_to_ignore
+from fastapi import APIRouter, UploadFile, File, HTTPException, Query, BackgroundTasks, Depends, Request, Header
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse, Response
+from fastapi.concurrency import run_in_threadpool
+from app.utils.bank_profiles import get_profile, BankProfileError
 
-from ..services.statement_processor import process_pdf_file, extract_transactions_partial_from_pdf
+from app.utils.memory import get_memory_tracker, MemoryLimitExceeded
+from app.utils.functions import extract_statement_period, date_to_ordinal
+from app.utils.log import get_logger
+
+from ..services.statement_processor import (
+    read_pdf,
+    process_pdf_file,
+    extract_transactions_partial_from_pdf,
+    stream_partial_transactions,
+    iter_statement_records,
+    chain_page_callbacks,
+    pdf_json_path,
+)
+from ..services.exporters import write_csv, write_json_array, write_ndjson, write_xlsx
+from ..services.projection import (
+    FULL_FIELDS, PARTIAL_FIELDS, VOUCHER_FIELDS, PERIOD_FIELDS, AMOUNT_FIELDS, DATE_VALUE_FIELDS, parse_fields
+)
+from ..services.admission import admission, slow_admission, AdmissionRejected
+from ..services.preflight import preflight_pdf, PreflightRejected
+from ..services.progress import get_progress_channel, progress_registry
+from ..services.result_store import result_store
+from ..services.statement_diff import diff_statements
+from ..services.movement_summary import GROUP_BY, summary_fields, summarize_movements
+from ..services.bundle import BUNDLE_FORMATS, SUMMARY_FIELDS, write_bundle
+from ..services.etag import make_etag, etag_matches, upload_digest, uploads_digest
+from ..services.single_flight import single_flight
+from ..services.shadow import shadow_runner
+from ..services.cancellation import REQUEST_DEADLINE_SECONDS, CancellationToken, RequestCancelled, watch_cancellation
+from ..services.profiling import ADMIN_TOKEN, RequestProfiler, NullRequestProfiler, profile_path, profile_summary
+from ..services.voucher_processor import process_vouchers
+from ..services.period_aggregator import open_ledger
+from collections import namedtuple
+from contextlib import asynccontextmanager
+from typing import List
 import pdftotext
 import shutil
 import os
@@ -10,8 +44,196 @@ import time
 import json
 import csv
 import re
+import uuid
+import hmac
 
 router  = APIRouter()
+logger = get_logger(__name__)
+
+# Lo que resuelven las dependencias *_etag (y reutiliza el endpoint): ETag, hash
+# de la carga, perfil de banco y campos seleccionados
+UploadEtag = namedtuple("UploadEtag", ("etag", "digest", "profile", "fields"))
+
+def resolve_profile(name, parser):
+    """Obtiene el perfil de banco solicitado o responde 400 si no existe."""
+    try:
+        return get_profile(name, parser=parser)
+    except BankProfileError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def resolve_fields(value, available, default=None):
+    """Valida el parámetro `fields` o responde 400 si pide campos inexistentes."""
+    try:
+        return parse_fields(value, available, default)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@asynccontextmanager
+async def admitted(controller, request):
+    """
+    Reserva un lugar de análisis en `controller` para el cliente (X-API-Key o IP).
+    Si la cola está llena responde 503 con Retry-After.
+    """
+    client = request.headers.get("X-API-Key") or (request.client.host if request.client else "anonimo")
+    try:
+        await controller.acquire(client)
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+    start_time = time.monotonic()
+    try:
+        yield
+    finally:
+        controller.release(time.monotonic() - start_time)
+
+async def parse_admission(request: Request):
+    """Reserva un lugar de análisis para el cliente durante la petición."""
+    async with admitted(admission, request):
+        yield
+
+async def statement_admission(request: Request, file: UploadFile = File(...)):
+    """
+    Preflight del estado de cuenta antes de tomar un lugar de análisis.
+
+    Rechaza en milisegundos los PDFs cifrados, escaneados (sin texto), dañados o
+    con demasiadas páginas, y manda los estados grandes al carril lento para que
+    no retrasen a las cargas normales.
+    """
+    if not file.filename.endswith(".pdf"):
+        raise HTTPException(status_code=400, detail="Solo se permiten archivos PDF.")
+    try:
+        info = await run_in_threadpool(preflight_pdf, file.file)
+    except PreflightRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+    request.state.pdf_pages = info.pages
+    logger.debug("Preflight", extra={"fields": {"pages": info.pages, "size": info.size, "large": info.large}})
+    async with admitted(slow_admission if info.large else admission, request):
+        yield
+
+def require_admin(token):
+    """Valida el token de administrador (variable de entorno ADMIN_TOKEN)."""
+    if not ADMIN_TOKEN or not token or not hmac.compare_digest(token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Se requiere un token de administrador válido (X-Admin-Token).")
+
+def request_profiling(
+    request: Request,
+    profiling: bool = Query(False, description="Perfila la petición con cProfile (requiere X-Admin-Token); el id llega en X-Profile-Id"),
+    x_admin_token: str = Header(None)
+):
+    """
+    Perfilador de la petición. Con `profiling=true` el análisis (incluido el
+    trabajo en el pool de procesos) corre bajo cProfile y el perfil se descarga
+    con GET /admin/profiles/{profile_id}.
+    """
+    if not profiling:
+        return NullRequestProfiler()
+    require_admin(x_admin_token)
+    profiler = RequestProfiler()
+    request.state.profile_id = profiler.profile_id
+    return profiler
+
+def request_cancellation(
+    x_request_timeout: float = Header(None, description="Plazo de análisis en segundos (no puede exceder REQUEST_DEADLINE_SECONDS)")
+):
+    """
+    Token de cancelación de la petición. El análisis se detiene entre páginas si
+    el cliente se desconecta o vence el plazo (REQUEST_DEADLINE_SECONDS o el
+    header X-Request-Timeout, el menor).
+    """
+    deadline = REQUEST_DEADLINE_SECONDS
+    if x_request_timeout is not None and x_request_timeout > 0:
+        deadline = min(deadline, x_request_timeout) if deadline else x_request_timeout
+    return CancellationToken(deadline)
+
+def cancelled_response(request, rc):
+    """Registra la cancelación y arma el error HTTP (499 desconexión, 504 plazo)."""
+    logger.info("Análisis cancelado", extra={"fields": {"path": request.url.path, "status": rc.status_code, "reason": str(rc)}})
+    return HTTPException(status_code=rc.status_code, detail=str(rc))
+
+def not_modified(request, etag):
+    """
+    Respuesta 304 (sin analizar ni serializar nada) si el cliente ya tiene la
+    representación con este ETag; None en caso contrario.
+    """
+    if etag_matches(request.headers.get("If-None-Match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    return None
+
+def precondition(request, etag):
+    """
+    Lanza 304 (sin analizar ni serializar nada) si el cliente ya tiene la
+    representación con este ETag; si no, regresa el ETag.
+
+    Se usa desde las dependencias *_etag, listadas antes de la de admisión: un
+    304 no espera ni ocupa un lugar de análisis (ni pasa por el preflight).
+    """
+    if etag_matches(request.headers.get("If-None-Match"), etag):
+        raise HTTPException(status_code=304, headers={"ETag": etag})
+    return etag
+
+def statement_etag(request, file, endpoint, profile, fields=None, weak=False, **options):
+    """Valida y identifica un estado de cuenta subido; regresa un UploadEtag."""
+    if not file.filename.endswith(".pdf"):
+        raise HTTPException(status_code=400, detail="Solo se permiten archivos PDF.")
+    digest = upload_digest(file.file)
+    if fields is not None:
+        options["fields"] = fields
+    etag = precondition(request, make_etag(digest, endpoint, profile, weak, filename=file.filename, **options))
+    return UploadEtag(etag, digest, profile, fields)
+
+def resolve_csv_fields(fields, parser):
+    """Campos de las exportaciones tabulares (default: los del endpoint equivalente en CSV)."""
+    if parser == "full":
+        return resolve_fields(fields, FULL_FIELDS)
+    return resolve_fields(fields, PARTIAL_FIELDS, tuple(f for f in PARTIAL_FIELDS if f != "raw_lines"))
+
+def resolve_json_fields(fields, parser):
+    """Campos de las salidas JSON (default: los del endpoint equivalente en JSON)."""
+    if parser == "full":
+        return resolve_fields(fields, FULL_FIELDS)
+    return resolve_fields(fields, PARTIAL_FIELDS, PARTIAL_FIELDS[:6])
+
+def resolve_formats(formats):
+    """Valida el parámetro `formats` del paquete o responde 400."""
+    requested_formats = {f.strip() for f in formats.split(",") if f.strip()}
+    unknown = requested_formats - set(BUNDLE_FORMATS)
+    if unknown or not requested_formats:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Formatos no válidos: {', '.join(sorted(unknown)) or formats}. Opciones: {', '.join(BUNDLE_FORMATS)}"
+        )
+    return requested_formats
+
+def temp_upload_path(filename):
+    """Ruta temporal única para el PDF subido (dos cargas con el mismo nombre no se pisan)."""
+    os.makedirs("temp", exist_ok=True)
+    return f"temp/{uuid.uuid4().hex}_{os.path.basename(filename)}"
+
+def flight_key_for(key, progress_id=None, profiler=None):
+    """
+    Clave de single-flight de la petición, o None si no debe agruparse con otras:
+    con `progress_id` (sus propios eventos SSE) o con perfilado (su propio perfil)
+    cada petición hace su propio análisis.
+    """
+    if progress_id or (profiler is not None and profiler.profile_id):
+        return None
+    return key
+
+async def run_single_flight(key, cleanup, fn, *args, request=None, cancel=None):
+    """
+    Corre fn(*args) en el threadpool una sola vez para peticiones idénticas
+    simultáneas (misma `key`: contenido del PDF, endpoint, perfil y opciones;
+    None no agrupa, ver flight_key_for).
+    Las peticiones agrupadas reciben el mismo resultado y comparten sus archivos;
+    `cleanup(resultado)` los elimina cuando la última petición los libera.
+    Con `request` y `cancel` se vigila la desconexión del cliente y el plazo.
+    Retorna (resultado, release).
+    """
+    if cancel is None:
+        return await single_flight.run(key, run_in_threadpool, fn, *args, cleanup=cleanup)
+    async with watch_cancellation(request, cancel):
+        return await single_flight.run(key, run_in_threadpool, fn, *args, cleanup=cleanup, cancel=cancel)
 
 def cleanup_files(*file_paths):
     """Elimina archivos temporales después de ser procesados"""
@@ -19,32 +241,69 @@ def cleanup_files(*file_paths):
         try:
             if os.path.exists(file_path):
                 os.remove(file_path)
-                print(f"Archivo eliminado: {file_path}")
+                logger.debug("Archivo eliminado", extra={"fields": {"path": file_path}})
         except Exception as e:
-            print(f"Error al eliminar {file_path}: {e}")
+            logger.warning("Error al eliminar archivo", extra={"fields": {"path": file_path, "error": str(e)}})
 
-@router.post("/download-pdf")
-async def upload_pdf(file: UploadFile = File(...), background_tasks: BackgroundTasks = None):
-    temp_path = f"temp/{file.filename}"
-    os.makedirs("temp", exist_ok=True)
+def download_pdf_etag(
+    request: Request,
+    file: UploadFile = File(...),
+    low_memory: bool = Query(False, description="Procesa página por página con techo de memoria y reporta picos por etapa"),
+    profile: str = Query(None, description="Perfil de banco en app/config/bank_profiles.json (default: bbva)"),
+    fields: str = Query(None, description="Campos a regresar separados por coma (default: todos)")
+):
+    # Débil: el cuerpo incluye execution_time (y memory_peak_mb con low_memory)
+    return statement_etag(
+        request, file, "download-pdf", resolve_profile(profile, "full"), weak=True,
+        fields=resolve_fields(fields, FULL_FIELDS), low_memory=low_memory
+    )
 
-    if not file.filename.endswith(".pdf"):
-        raise HTTPException(status_code=400, detail="Solo se permiten archivos PDF.")
-    
+@router.post("/download-pdf", dependencies=[Depends(download_pdf_etag), Depends(statement_admission)])
+async def upload_pdf(
+    request: Request,
+    response: Response,
+    file: UploadFile = File(...),
+    background_tasks: BackgroundTasks = None,
+    low_memory: bool = Query(False, description="Procesa página por página con techo de memoria y reporta picos por etapa"),
+    memory_limit_mb: float = Query(None, description="Techo de memoria en MB para low_memory (default: MEMORY_LIMIT_MB)"),
+    progress_id: str = Query(None, description="Publica el avance en GET /progress/{progress_id} (SSE)"),
+    upload_etag: UploadEtag = Depends(download_pdf_etag),
+    profiler: RequestProfiler = Depends(request_profiling),
+    cancel: CancellationToken = Depends(request_cancellation)
+):
+    etag, digest, bank_profile, selected_fields = upload_etag
+    # Mismo PDF y mismas opciones (sin importar el nombre): se analiza una sola vez
+    flight_key = flight_key_for(make_etag(
+        digest, "download-pdf", bank_profile, fields=selected_fields, low_memory=low_memory, memory_limit_mb=memory_limit_mb
+    ), progress_id, profiler)
+
+    temp_path = temp_upload_path(file.filename)
+    file_name = f"temp/{file.filename}"[8:-4].strip().replace(" ", "_")
+    tracker = get_memory_tracker(low_memory, memory_limit_mb)
+    progress = get_progress_channel(progress_id)
+    on_page = chain_page_callbacks(tracker.check, progress.page, cancel.check)
     try:
-        with open(temp_path, "wb") as f:
-            shutil.copyfileobj(file.file, f)
+        with tracker, progress:
+            with tracker.stage("upload"):
+                with open(temp_path, "wb") as f:
+                    shutil.copyfileobj(file.file, f)
 
-        start_time = time.time()
-        movimientos = process_pdf_file(temp_path)
-        execution_time = time.time() - start_time
-        
-        file_name = temp_path[8:-4].strip().replace(" ", "_")
+            start_time = time.time()
+            with tracker.stage("parse"):
+                movimientos, release = await run_single_flight(
+                    flight_key, lambda path: cleanup_files(path),
+                    profiler.run, process_pdf_file, temp_path, on_page, bank_profile, progress.record,
+                    not low_memory, selected_fields, request=request, cancel=cancel
+                )
+            execution_time = time.time() - start_time
         
+        shadow_runner.schedule(background_tasks, "download-pdf", temp_path, "full", bank_profile, selected_fields)
+
         # Programar eliminación de archivos temporales
-        background_tasks.add_task(cleanup_files, temp_path, movimientos)
+        background_tasks.add_task(cleanup_files, temp_path)
+        background_tasks.add_task(release)
         
-        return {
+        result = {
             "file": FileResponse(
                 movimientos,
                 filename=f"{file_name}.json",
@@ -52,77 +311,172 @@ async def upload_pdf(file: UploadFile = File(...), background_tasks: BackgroundT
             ),
             "execution_time": execution_time
         }
+        if low_memory:
+            result["memory_peak_mb"] = tracker.report()
+        response.headers["ETag"] = etag
+        return result
     
+    except MemoryLimitExceeded as me:
+        # Descartar la salida parcial
+        cleanup_files(temp_path, pdf_json_path(temp_path))
+        raise HTTPException(status_code=413, detail=str(me))
+    except RequestCancelled as rc:
+        cleanup_files(temp_path, pdf_json_path(temp_path))
+        raise cancelled_response(request, rc)
     except ValueError as ve:
+        cleanup_files(temp_path)
         raise HTTPException(status_code=422, detail=f"Error al procesar el PDF: {ve}")
     except Exception as e:
+        cleanup_files(temp_path)
         raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
     
 
-@router.post("/download-csv")
-async def upload_csv(file: UploadFile = File(...), background_tasks: BackgroundTasks = None):
+def download_csv_etag(
+    request: Request,
+    file: UploadFile = File(...),
+    profile: str = Query(None, description="Perfil de banco en app/config/bank_profiles.json (default: bbva)"),
+    fields: str = Query(None, description="Campos a regresar separados por coma (default: todos)")
+):
+    return statement_etag(
+        request, file, "download-csv", resolve_profile(profile, "full"), fields=resolve_fields(fields, FULL_FIELDS)
+    )
 
-    temp_path = f"temp/{file.filename}"
-    os.makedirs("temp", exist_ok=True)
+@router.post("/download-csv", dependencies=[Depends(download_csv_etag), Depends(statement_admission)])
+async def upload_csv(
+    request: Request,
+    file: UploadFile = File(...),
+    background_tasks: BackgroundTasks = None,
+    low_memory: bool = Query(False, description="Procesa página por página con techo de memoria y reporta picos por etapa"),
+    memory_limit_mb: float = Query(None, description="Techo de memoria en MB para low_memory (default: MEMORY_LIMIT_MB)"),
+    progress_id: str = Query(None, description="Publica el avance en GET /progress/{progress_id} (SSE)"),
+    upload_etag: UploadEtag = Depends(download_csv_etag),
+    profiler: RequestProfiler = Depends(request_profiling),
+    cancel: CancellationToken = Depends(request_cancellation)
+):
+    etag, digest, bank_profile, selected_fields = upload_etag
+    flight_key = flight_key_for(make_etag(
+        digest, "download-csv", bank_profile, fields=selected_fields, low_memory=low_memory, memory_limit_mb=memory_limit_mb
+    ), progress_id, profiler)
+    # ABONOS se calcula siempre para el total del header X-json
+    parser_fields = selected_fields if "ABONOS" in selected_fields else selected_fields + ("ABONOS",)
 
-    if not file.filename.endswith(".pdf"):
-        raise HTTPException(status_code=400, detail="Solo se permiten archivos PDF.")
-    
+    temp_path = temp_upload_path(file.filename)
+    file_name = f"temp/{file.filename}"[8:-4].strip().replace(" ", "_")
+    csv_path = f"{temp_path[:-4]}.csv"
+    tracker = get_memory_tracker(low_memory, memory_limit_mb)
+    progress = get_progress_channel(progress_id)
+    on_page = chain_page_callbacks(tracker.check, progress.page, cancel.check)
     try:
-        with open(temp_path, "wb") as f:
-            shutil.copyfileobj(file.file, f)
+        with tracker, progress:
+            with tracker.stage("upload"):
+                with open(temp_path, "wb") as f:
+                    shutil.copyfileobj(file.file, f)
 
-        start_time = time.time()
-        movimientos_json_path = process_pdf_file(temp_path)
-        execution_time = time.time() - start_time
+            if low_memory:
+                def parse_and_write():
+                    # Del parser directo al CSV, sin el JSON intermedio ni la lista completa
+                    totals = {"abonos": 0.0}
+
+                    def with_totals(records):
+                        for item in records:
+                            totals["abonos"] += float(item.get('ABONOS', 0))
+                            yield item
+
+                    records = iter_statement_records(
+                        temp_path, on_page, bank_profile, progress.record, False, parser_fields
+                    )
+                    total_count = write_csv(with_totals(records), csv_path, selected_fields)
+                    return csv_path, total_count, totals["abonos"], (csv_path,)
+            else:
+                def parse_and_write():
+                    movimientos_json_path = process_pdf_file(
+                        temp_path, on_page, bank_profile, progress.record, True, parser_fields
+                    )
+
+                    # Read JSON data
+                    with open(movimientos_json_path, "r", encoding="utf-8") as json_file:
+                        data = json.load(json_file)
 
-        # Read JSON data
-        with open(movimientos_json_path, "r", encoding="utf-8") as json_file:
-            data = json.load(json_file)
+                    total_abonos = sum(float(item.get('ABONOS', 0)) for item in data if isinstance(item, dict))
+                    total_count = write_csv(data, csv_path, selected_fields) if isinstance(data, list) else 0
+                    return csv_path, total_count, total_abonos, (movimientos_json_path, csv_path)
 
-        # Prepare CSV path
-        file_name = temp_path[8:-4].strip().replace(" ", "_")
-        csv_path = f"temp/{file_name}.csv"
+            start_time = time.time()
+            with tracker.stage("parse"):
+                (shared_csv_path, total_count, total_abonos, _), release = await run_single_flight(
+                    flight_key, lambda result: cleanup_files(*result[3]), profiler.run, parse_and_write,
+                    request=request, cancel=cancel
+                )
+            execution_time = time.time() - start_time
 
-        total_abonos = sum(float(item.get('ABONOS', 0)) for item in data if isinstance(item, dict))
-        print(f"Total ABONOS: ${total_abonos}")
+        logger.info("CSV generado", extra={"fields": {"total_abonos": total_abonos, "total_count": total_count}})
         
-        # Write CSV
-        if isinstance(data, list) and data:
-            keys = data[0].keys()
-            with open(csv_path, "w", newline="", encoding="utf-8") as csv_file:
-                writer = csv.DictWriter(csv_file, fieldnames=keys)
-                writer.writeheader()
-                writer.writerows(data)
-        else:
+        if not total_count:
+            cleanup_files(temp_path)
+            release()
             raise HTTPException(status_code=422, detail="El archivo JSON no contiene datos válidos para CSV.")
 
+        shadow_runner.schedule(background_tasks, "download-csv", temp_path, "full", bank_profile, parser_fields)
+
         # Programar eliminación de archivos temporales
-        background_tasks.add_task(cleanup_files, temp_path, movimientos_json_path, csv_path)
+        background_tasks.add_task(cleanup_files, temp_path)
+        background_tasks.add_task(release)
 
         response = FileResponse(
-            csv_path,
+            shared_csv_path,
             filename=f"{file_name}.csv",
             media_type="text/csv"
         )
-        po = json.dumps({"execution_time": execution_time, "total_count": len(data), "income_month": total_abonos})
+        po = json.dumps({"execution_time": execution_time, "total_count": total_count, "income_month": total_abonos})
 
         response.headers["X-json"] = po
+        response.headers["X-Total-Count"] = str(total_count)
+        response.headers["ETag"] = etag
+        if low_memory:
+            response.headers["X-Memory-Peak"] = json.dumps(tracker.report())
         return response
     
+    except MemoryLimitExceeded as me:
+        # Descartar la salida parcial
+        cleanup_files(temp_path, csv_path)
+        raise HTTPException(status_code=413, detail=str(me))
+    except RequestCancelled as rc:
+        cleanup_files(temp_path, pdf_json_path(temp_path), csv_path)
+        raise cancelled_response(request, rc)
     except ValueError as ve:
+        cleanup_files(temp_path)
         raise HTTPException(status_code=422, detail=f"Error al procesar el PDF: {ve}")
     except Exception as e:
+        cleanup_files(temp_path)
         raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
 
 
 
 
-@router.post("/extract-partial-json")
+def extract_partial_json_etag(
+    request: Request,
+    file: UploadFile = File(...),
+    output_format: str = Query("json", description="Formato de salida: ndjson o json", regex="^(ndjson|json)$"),
+    profile: str = Query(None, description="Perfil de banco en app/config/bank_profiles.json (default: partial)"),
+    fields: str = Query(None, description="Campos a regresar separados por coma (default: fecha,concepto,folio,cargo,abono,saldo; raw_lines solo si se pide)")
+):
+    return statement_etag(
+        request, file, "extract-partial-json", resolve_profile(profile, "partial"),
+        fields=resolve_json_fields(fields, "partial"), output_format=output_format
+    )
+
+@router.post("/extract-partial-json", dependencies=[Depends(extract_partial_json_etag), Depends(statement_admission)])
 async def extract_transactions_json(
+    request: Request,
     file: UploadFile = File(...),
     background_tasks: BackgroundTasks = None,
-    output_format: str = Query("json", description="Formato de salida: ndjson o json", regex="^(ndjson|json)$")
+    output_format: str = Query("json", description="Formato de salida: ndjson o json", regex="^(ndjson|json)$"),
+    low_memory: bool = Query(False, description="Procesa página por página con techo de memoria y reporta picos por etapa"),
+    memory_limit_mb: float = Query(None, description="Techo de memoria en MB para low_memory (default: MEMORY_LIMIT_MB)"),
+    progress_id: str = Query(None, description="Publica el avance en GET /progress/{progress_id} (SSE)"),
+    upload_etag: UploadEtag = Depends(extract_partial_json_etag),
+    profiler: RequestProfiler = Depends(request_profiling),
+    cancel: CancellationToken = Depends(request_cancellation)
 ):
     """
     Extrae transacciones de un PDF de estado de cuenta bancario.
@@ -132,168 +486,106 @@ async def extract_transactions_json(
     - Línea 2: Fecha (dd-mm) + Montos ($ cargo $ abono $ saldo)
     - Línea 3: Información adicional (códigos, folios, etc.)
     """
-    temp_path = f"temp/{file.filename}"
-    os.makedirs("temp", exist_ok=True)
+    etag, digest, bank_profile, selected_fields = upload_etag
+    flight_key = flight_key_for(make_etag(
+        digest, "extract-partial-json", bank_profile, fields=selected_fields, output_format=output_format,
+        low_memory=low_memory, memory_limit_mb=memory_limit_mb
+    ), progress_id, profiler)
 
-    if not file.filename.endswith(".pdf"):
-        raise HTTPException(status_code=400, detail="Solo se permiten archivos PDF.")
+    temp_path = temp_upload_path(file.filename)
+    file_name = file.filename[:-4].strip().replace(" ", "_")
 
+    tracker = get_memory_tracker(low_memory, memory_limit_mb)
+    progress = get_progress_channel(progress_id)
+    on_page = chain_page_callbacks(tracker.check, progress.page, cancel.check)
     try:
-        with open(temp_path, "wb") as f:
-            shutil.copyfileobj(file.file, f)
+        with tracker, progress:
+            with tracker.stage("upload"):
+                with open(temp_path, "wb") as f:
+                    shutil.copyfileobj(file.file, f)
 
-        start_time = time.time()
-        results = []
-
-        # Expresiones regulares
-        money_re = re.compile(r"\$\s?[\d,]+\.\d{2}")
-        date_re = re.compile(r"^\s*\d{2}-\d{2}\b")
-        folio_re = re.compile(r"FOLIO[:\s]*[:#\-]?\s*([0-9]+)", re.IGNORECASE)
-
-        with open(temp_path, "rb") as f:
-            pdf = pdftotext.PDF(f, physical=True)
-            
-            # Unificar todas las líneas de todas las páginas
-            all_lines = []
-            for page in pdf:
-                all_lines.extend(page.split("\n"))
-            
-            # Procesar línea por línea
-            i = 0
-            while i < len(all_lines):
-                line = all_lines[i].strip()
-                
-                # Ignorar líneas vacías o encabezados
-                if not line or any(phrase in line for phrase in partial_phrases_to_ignore):
-                    i += 1
-                    continue
-                
-                # Buscar línea con fecha (indica una transacción)
-                date_match = date_re.search(line)
-                if not date_match:
-                    i += 1
-                    continue
-                
-                # === TRANSACCIÓN ENCONTRADA ===
-                fecha = date_match.group(0).strip()
-                
-                # Extraer montos de esta línea
-                amounts = [amt.replace(" ", "") for amt in money_re.findall(line)]
-                
-                # CONCEPTO: revisar línea ANTERIOR
-                concepto = None
-                if i > 0:
-                    prev = all_lines[i-1].strip()
-                    if prev and not date_re.search(prev) and not any(ph in prev for ph in partial_phrases_to_ignore):
-                        # Si tiene montos, tomar solo la parte antes del $
-                        concepto = prev.split('$')[0].strip() if '$' in prev else prev
-                
-                # Si no hay concepto anterior, buscar en la línea actual (después de fecha)
-                if not concepto:
-                    after_date = line[date_match.end():].strip()
-                    if after_date and '$' in after_date:
-                        concepto = after_date.split('$')[0].strip()
-                
-                # INFORMACIÓN ADICIONAL: revisar líneas SIGUIENTES (folios, códigos)
-                folio = None
-                next_info = []
-                j = i + 1
-                while j < len(all_lines) and len(next_info) < 2:
-                    nxt = all_lines[j].strip()
-                    if not nxt:
-                        j += 1
-                        continue
-                    # Si encontramos otra fecha, detenemos
-                    if date_re.search(nxt):
-                        break
-                    # Si no tiene montos, es información adicional
-                    if not money_re.search(nxt):
-                        next_info.append(nxt)
-                        # Buscar FOLIO
-                        fm = folio_re.search(nxt)
-                        if fm:
-                            folio = fm.group(1)
-                    j += 1
-                
-                # ASIGNAR MONTOS
-                cargo = abono = saldo = None
-                if len(amounts) == 1:
-                    abono = amounts[0]
-                elif len(amounts) == 2:
-                    # Determinar si es cargo o abono por palabras clave
-                    if concepto and any(k in concepto.upper() for k in ["CHEQUE", "PAGADO", "COMPRA", "CARGO"]):
-                        cargo, saldo = amounts
-                    else:
-                        abono, saldo = amounts
-                elif len(amounts) >= 3:
-                    cargo, abono, saldo = amounts[0], amounts[1], amounts[2]
-                
-                # Ajuste especial para cheques
-                if concepto and "CHEQUE PAGADO" in concepto.upper() and abono and not cargo:
-                    cargo = abono
-                    abono = None
-                
-                # RAW LINES para debugging
-                raw = []
-                if i > 0 and all_lines[i-1].strip():
-                    raw.append(all_lines[i-1].strip())
-                raw.append(line)
-                raw.extend(next_info)
-                
-                # Agregar transacción
-                results.append({
-                    "fecha": fecha,
-                    "concepto": concepto,
-                    "folio": folio,
-                    "cargo": cargo,
-                    "abono": abono,
-                    "saldo": saldo,
-                    "raw_lines": raw
-                })
-                
-                i += 1
-
-        # Guardar resultados según formato solicitado
-        file_name = temp_path[5:-4].strip().replace(" ", "_")
-        if output_format == "json":
-            array_path = f"temp/{file_name}_transactions_array.json"
-            with open(array_path, "w", encoding="utf-8") as jf:
-                json.dump(results, jf, ensure_ascii=False, indent=2)
-            
-            # Programar eliminación de archivos temporales
-            background_tasks.add_task(cleanup_files, temp_path, array_path)
-            
-            return FileResponse(
-                array_path,
-                filename=f"{file_name}_transactions.json",
-                media_type="application/json"
-            )
-        else:
-            ndjson_path = f"temp/{file_name}_transactions.json"
-            with open(ndjson_path, "w", encoding="utf-8") as out_f:
-                for obj in results:
-                    out_f.write(json.dumps(obj, ensure_ascii=False) + "\n")
-            
-            # Programar eliminación de archivos temporales
-            background_tasks.add_task(cleanup_files, temp_path, ndjson_path)
-            
-            return FileResponse(
-                ndjson_path,
-                filename=f"{file_name}_transactions.json",
-                media_type="application/x-ndjson"
-            )
+            start_time = time.time()
+            if output_format == "json":
+                output_path = f"{temp_path[:-4]}_transactions_array.json"
+                media_type = "application/json"
+            else:
+                output_path = f"{temp_path[:-4]}_transactions.json"
+                media_type = "application/x-ndjson"
+
+            def parse_and_write():
+                results = stream_partial_transactions(
+                    temp_path, on_page=on_page, profile=bank_profile, on_record=progress.record,
+                    use_cache=not low_memory, fields=selected_fields
+                )
+                if not low_memory:
+                    results = list(results)
 
+                # Guardar resultados según formato solicitado
+                if output_format == "json":
+                    return output_path, write_json_array(results, output_path, indent=2)
+                return output_path, write_ndjson(results, output_path)
+
+            with tracker.stage("parse"):
+                (shared_output_path, total_count), release = await run_single_flight(
+                    flight_key, lambda result: cleanup_files(result[0]), profiler.run, parse_and_write,
+                    request=request, cancel=cancel
+                )
+
+        shadow_runner.schedule(background_tasks, "extract-partial-json", temp_path, "partial", bank_profile, selected_fields)
+
+        # Programar eliminación de archivos temporales
+        background_tasks.add_task(cleanup_files, temp_path)
+        background_tasks.add_task(release)
+        
+        response = FileResponse(
+            shared_output_path,
+            filename=f"{file_name}_transactions.json",
+            media_type=media_type
+        )
+        response.headers["X-Total-Count"] = str(total_count)
+        response.headers["ETag"] = etag
+        if low_memory:
+            response.headers["X-Memory-Peak"] = json.dumps(tracker.report())
+        return response
+
+    except MemoryLimitExceeded as me:
+        # Descartar la salida parcial
+        cleanup_files(temp_path, output_path)
+        raise HTTPException(status_code=413, detail=str(me))
+    except RequestCancelled as rc:
+        cleanup_files(temp_path, output_path)
+        raise cancelled_response(request, rc)
     except ValueError as ve:
+        cleanup_files(temp_path)
         raise HTTPException(status_code=422, detail=f"Error al procesar el PDF: {ve}")
     except Exception as e:
+        cleanup_files(temp_path)
         raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
     
 
 
-@router.post("/extract-partial-csv")
+def extract_partial_csv_etag(
+    request: Request,
+    file: UploadFile = File(...),
+    profile: str = Query(None, description="Perfil de banco en app/config/bank_profiles.json (default: partial)"),
+    fields: str = Query(None, description="Campos a regresar separados por coma (default: fecha,concepto,folio,cargo,abono,saldo,numero_control)")
+):
+    return statement_etag(
+        request, file, "extract-partial-csv", resolve_profile(profile, "partial"),
+        fields=resolve_csv_fields(fields, "partial")
+    )
+
+@router.post("/extract-partial-csv", dependencies=[Depends(extract_partial_csv_etag), Depends(statement_admission)])
 async def extract_transactions_csv(
+    request: Request,
     file: UploadFile = File(...),
-    background_tasks: BackgroundTasks = None
+    background_tasks: BackgroundTasks = None,
+    low_memory: bool = Query(False, description="Procesa página por página con techo de memoria y reporta picos por etapa"),
+    memory_limit_mb: float = Query(None, description="Techo de memoria en MB para low_memory (default: MEMORY_LIMIT_MB)"),
+    progress_id: str = Query(None, description="Publica el avance en GET /progress/{progress_id} (SSE)"),
+    upload_etag: UploadEtag = Depends(extract_partial_csv_etag),
+    profiler: RequestProfiler = Depends(request_profiling),
+    cancel: CancellationToken = Depends(request_cancellation)
 ):
     """
     Extrae transacciones de un PDF de estado de cuenta bancario y retorna un archivo CSV.
@@ -303,164 +595,908 @@ async def extract_transactions_csv(
     - Línea 2: Fecha (dd-mm) + Montos ($ cargo $ abono $ saldo)
     - Línea 3: Información adicional (códigos, folios, etc.)
     """
-    temp_path = f"temp/{file.filename}"
-    os.makedirs("temp", exist_ok=True)
+    etag, digest, bank_profile, selected_fields = upload_etag
+    flight_key = flight_key_for(make_etag(
+        digest, "extract-partial-csv", bank_profile, fields=selected_fields, low_memory=low_memory,
+        memory_limit_mb=memory_limit_mb
+    ), progress_id, profiler)
 
-    if not file.filename.endswith(".pdf"):
-        raise HTTPException(status_code=400, detail="Solo se permiten archivos PDF.")
+    temp_path = temp_upload_path(file.filename)
+    file_name = file.filename[:-4].strip().replace(" ", "_")
 
+    tracker = get_memory_tracker(low_memory, memory_limit_mb)
+    progress = get_progress_channel(progress_id)
+    on_page = chain_page_callbacks(tracker.check, progress.page, cancel.check)
     try:
-        with open(temp_path, "wb") as f:
-            shutil.copyfileobj(file.file, f)
+        with tracker, progress:
+            with tracker.stage("upload"):
+                with open(temp_path, "wb") as f:
+                    shutil.copyfileobj(file.file, f)
 
-        start_time = time.time()
-        results = []
-
-        # Expresiones regulares
-        money_re = re.compile(r"\$\s?[\d,]+\.\d{2}")
-        date_re = re.compile(r"^\s*\d{2}-\d{2}\b")
-        folio_re = re.compile(r"FOLIO[:\s]*[:#\-]?\s*([0-9]+)", re.IGNORECASE)
-
-        with open(temp_path, "rb") as f:
-            pdf = pdftotext.PDF(f, physical=True)
-            
-            # Unificar todas las líneas de todas las páginas
-            all_lines = []
-            for page in pdf:
-                all_lines.extend(page.split("\n"))
-            
-            # Procesar línea por línea
-            i = 0
-            while i < len(all_lines):
-                line = all_lines[i].strip()
-                
-                # Ignorar líneas vacías o encabezados
-                if not line or any(phrase in line for phrase in partial_phrases_to_ignore):
-                    i += 1
-                    continue
-                
-                # Buscar línea con fecha (indica una transacción)
-                date_match = date_re.search(line)
-                if not date_match:
-                    i += 1
-                    continue
-                
-                # === TRANSACCIÓN ENCONTRADA ===
-                fecha = date_match.group(0).strip()
-                
-                # Extraer montos de esta línea
-                amounts = [amt.replace(" ", "") for amt in money_re.findall(line)]
-                
-                # CONCEPTO: revisar línea ANTERIOR
-                concepto = None
-                numero_control = None
-                
-                if i > 0:
-                    prev = all_lines[i-1].strip()
-                    if prev and not date_re.search(prev) and not any(ph in prev for ph in partial_phrases_to_ignore):
-                        # Si tiene montos, tomar solo la parte antes del $
-                        concepto = prev.split('$')[0].strip() if '$' in prev else prev
-                
-                # Si no hay concepto anterior, buscar en la línea actual (después de fecha)
-                if not concepto:
-                    after_date = line[date_match.end():].strip()
-                    if after_date and '$' in after_date:
-                        concepto = after_date.split('$')[0].strip()
-                        # Buscar número de control en la misma línea (formato: 000ITCV21690056)
-                        nc_inline = re.search(r"(?:\d{3})?(?:ITCV)?(\d{2}69\d{4})", concepto)
-                        if nc_inline:
-                            numero_control = nc_inline.group(1)
-                            # Limpiar el número de control del concepto
-                            concepto = re.sub(r"/?\d{3}?ITCV?\d{2}69\d{4}", "", concepto).strip()
-                
-                # INFORMACIÓN ADICIONAL: revisar líneas SIGUIENTES (folios, códigos)
-                folio = None
-                next_info = []
-                j = i + 1
-                while j < len(all_lines) and len(next_info) < 2:
-                    nxt = all_lines[j].strip()
-                    
-                    # Buscar número de control en las líneas siguientes
-                    # Patrón 1: ITCV21690160 (con prefijo ITCV)
-                    # Patrón 2: 23690586 (solo dígitos con 69 en medio)
-                    if not numero_control:
-                        nc = re.search(r"(?:ITCV)?(\d{2}69\d{4})", nxt)
-                        if nc:
-                            numero_control = nc.group(1)
-                    
-                    if not nxt:
-                        j += 1
-                        continue
-                    # Si encontramos otra fecha, detenemos
-                    if date_re.search(nxt):
-                        break
-                    # Si no tiene montos, es información adicional
-                    if not money_re.search(nxt):
-                        next_info.append(nxt)
-                        # Buscar FOLIO
-                        fm = folio_re.search(nxt)
-                        if fm:
-                            folio = fm.group(1)
-                    j += 1
-                
-                # ASIGNAR MONTOS
-                cargo = abono = saldo = None
-                if len(amounts) == 1:
-                    abono = amounts[0]
-                elif len(amounts) == 2:
-                    # Determinar si es cargo o abono por palabras clave
-                    if concepto and any(k in concepto.upper() for k in ["CHEQUE", "PAGADO", "COMPRA", "CARGO"]):
-                        cargo, saldo = amounts
-                    else:
-                        abono, saldo = amounts
-                elif len(amounts) >= 3:
-                    cargo, abono, saldo = amounts[0], amounts[1], amounts[2]
-                
-                # Ajuste especial para cheques
-                if concepto and "CHEQUE PAGADO" in concepto.upper() and abono and not cargo:
-                    cargo = abono
-                    abono = None
-                
-                # Agregar transacción (sin raw_lines para CSV)
-                results.append({
-                    "fecha": fecha,
-                    "concepto": concepto,
-                    "folio": folio,
-                    "cargo": cargo,
-                    "abono": abono,
-                    "saldo": saldo,
-                    "numero_control": numero_control
-                })
-                
-                i += 1
-
-        # Guardar resultados en formato CSV
-        file_name = temp_path[5:-4].strip().replace(" ", "_")
-        csv_path = f"temp/{file_name}_transactions.csv"
-        
-        if results:
-            keys = results[0].keys()
-            with open(csv_path, "w", newline="", encoding="utf-8") as csv_file:
-                writer = csv.DictWriter(csv_file, fieldnames=keys)
-                writer.writeheader()
-                writer.writerows(results)
-        else:
+            start_time = time.time()
+
+            # Guardar resultados en formato CSV
+            csv_path = f"{temp_path[:-4]}_transactions.csv"
+
+            def parse_and_write():
+                results = stream_partial_transactions(
+                    temp_path, on_page=on_page, profile=bank_profile, on_record=progress.record,
+                    use_cache=not low_memory, fields=selected_fields
+                )
+                if not low_memory:
+                    results = list(results)
+                return csv_path, write_csv(results, csv_path)
+
+            with tracker.stage("parse"):
+                (shared_csv_path, total_count), release = await run_single_flight(
+                    flight_key, lambda result: cleanup_files(result[0]), profiler.run, parse_and_write,
+                    request=request, cancel=cancel
+                )
+
+        if not total_count:
+            cleanup_files(temp_path)
+            release()
             raise HTTPException(status_code=422, detail="No se encontraron transacciones en el PDF.")
         
         execution_time = time.time() - start_time
         
+        shadow_runner.schedule(background_tasks, "extract-partial-csv", temp_path, "partial", bank_profile, selected_fields)
+
         # Programar eliminación de archivos temporales
-        background_tasks.add_task(cleanup_files, temp_path, csv_path)
+        background_tasks.add_task(cleanup_files, temp_path)
+        background_tasks.add_task(release)
         
         response = FileResponse(
-                csv_path,
+                shared_csv_path,
                 filename=f"{file_name}_transactions.csv",
                 media_type="text/csv"
             )
         response.headers["X-Execution-Time"] = str(execution_time)
+        response.headers["X-Total-Count"] = str(total_count)
+        response.headers["ETag"] = etag
+        if low_memory:
+            response.headers["X-Memory-Peak"] = json.dumps(tracker.report())
+        return response
+
+    except MemoryLimitExceeded as me:
+        # Descartar la salida parcial
+        cleanup_files(temp_path, csv_path)
+        raise HTTPException(status_code=413, detail=str(me))
+    except RequestCancelled as rc:
+        cleanup_files(temp_path, csv_path)
+        raise cancelled_response(request, rc)
+    except ValueError as ve:
+        cleanup_files(temp_path)
+        raise HTTPException(status_code=422, detail=f"Error al procesar el PDF: {ve}")
+    except Exception as e:
+        cleanup_files(temp_path)
+        raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
+
+
+def download_xlsx_etag(
+    request: Request,
+    file: UploadFile = File(...),
+    parser: str = Query("full", description="Parser a utilizar: full (download-pdf/csv) o partial (extract-partial)", regex="^(full|partial)$"),
+    profile: str = Query(None, description="Perfil de banco en app/config/bank_profiles.json (default según parser)"),
+    fields: str = Query(None, description="Campos a regresar separados por coma (default: los del endpoint equivalente en CSV)")
+):
+    # Débil: las entradas del ZIP del libro llevan la hora en que se escribieron
+    return statement_etag(
+        request, file, "download-xlsx", resolve_profile(profile, parser), weak=True,
+        parser=parser, fields=resolve_csv_fields(fields, parser)
+    )
+
+@router.post("/download-xlsx", dependencies=[Depends(download_xlsx_etag), Depends(statement_admission)])
+async def download_xlsx(
+    request: Request,
+    file: UploadFile = File(...),
+    background_tasks: BackgroundTasks = None,
+    parser: str = Query("full", description="Parser a utilizar: full (download-pdf/csv) o partial (extract-partial)", regex="^(full|partial)$"),
+    progress_id: str = Query(None, description="Publica el avance en GET /progress/{progress_id} (SSE)"),
+    upload_etag: UploadEtag = Depends(download_xlsx_etag),
+    profiler: RequestProfiler = Depends(request_profiling),
+    cancel: CancellationToken = Depends(request_cancellation)
+):
+    """
+    Exporta las transacciones a un libro de Excel (XLSX).
+
+    Los importes se escriben como números ("$1,000.00" -> 1000.00) y las fechas
+    como fechas de Excel usando el año del encabezado del estado de cuenta.
+    Las filas se escriben conforme el parser las reconoce, sin armar el libro en memoria.
+    """
+    etag, digest, bank_profile, selected_fields = upload_etag
+    flight_key = flight_key_for(
+        make_etag(digest, "download-xlsx", bank_profile, parser=parser, fields=selected_fields), progress_id, profiler
+    )
+
+    temp_path = temp_upload_path(file.filename)
+    file_name = file.filename[:-4].strip().replace(" ", "_")
+    xlsx_path = f"{temp_path[:-4]}.xlsx"
+    progress = get_progress_channel(progress_id)
+    on_page = chain_page_callbacks(progress.page, cancel.check)
+    try:
+        with progress:
+            with open(temp_path, "wb") as f:
+                shutil.copyfileobj(file.file, f)
+
+            def parse_and_write():
+                pdf = read_pdf(temp_path)
+                # El año de las fechas (dd/MMM o dd-mm) solo viene en el encabezado
+                period = extract_statement_period(pdf[0]) if len(pdf) else None
+                to_ordinal = (lambda fecha: date_to_ordinal(fecha, period)) if period else None
+
+                if parser == "full":
+                    records = iter_statement_records(
+                        temp_path, on_page, bank_profile, progress.record, True, selected_fields
+                    )
+                else:
+                    records = stream_partial_transactions(
+                        temp_path, on_page=on_page, profile=bank_profile, on_record=progress.record,
+                        use_cache=True, fields=selected_fields
+                    )
+                return xlsx_path, write_xlsx(records, xlsx_path, selected_fields, AMOUNT_FIELDS, DATE_VALUE_FIELDS, to_ordinal)
+
+            start_time = time.time()
+            (shared_xlsx_path, total_count), release = await run_single_flight(
+                flight_key, lambda result: cleanup_files(result[0]), profiler.run, parse_and_write,
+                request=request, cancel=cancel
+            )
+            execution_time = time.time() - start_time
+
+        if not total_count:
+            release()
+            raise HTTPException(status_code=422, detail="No se encontraron transacciones en el PDF.")
+
+        shadow_runner.schedule(background_tasks, "download-xlsx", temp_path, parser, bank_profile, selected_fields)
+
+        # Programar eliminación de archivos temporales
+        background_tasks.add_task(cleanup_files, temp_path)
+        background_tasks.add_task(release)
+
+        response = FileResponse(
+            shared_xlsx_path,
+            filename=f"{file_name}.xlsx",
+            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        )
+        response.headers["X-Execution-Time"] = str(execution_time)
+        response.headers["X-Total-Count"] = str(total_count)
+        response.headers["ETag"] = etag
+        return response
+
+    except HTTPException:
+        cleanup_files(temp_path, xlsx_path)
+        raise
+    except RequestCancelled as rc:
+        cleanup_files(temp_path, xlsx_path)
+        raise cancelled_response(request, rc)
+    except ValueError as ve:
+        cleanup_files(temp_path, xlsx_path)
+        raise HTTPException(status_code=422, detail=f"Error al procesar el PDF: {ve}")
+    except Exception as e:
+        cleanup_files(temp_path, xlsx_path)
+        raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
+
+
+def download_bundle_etag(
+    request: Request,
+    file: UploadFile = File(...),
+    parser: str = Query("full", description="Parser a utilizar: full (download-pdf/csv) o partial (extract-partial)", regex="^(full|partial)$"),
+    formats: str = Query("json,csv", description="Formatos a incluir separados por coma: json, ndjson, csv, xlsx"),
+    profile: str = Query(None, description="Perfil de banco en app/config/bank_profiles.json (default según parser)"),
+    fields: str = Query(None, description="Campos a regresar separados por coma (default: los del endpoint equivalente en CSV)")
+):
+    # Débil: summary.json incluye execution_time y el ZIP las fechas de sus entradas
+    return statement_etag(
+        request, file, "download-bundle", resolve_profile(profile, parser), weak=True,
+        parser=parser, fields=resolve_csv_fields(fields, parser), formats=sorted(resolve_formats(formats))
+    )
+
+@router.post("/download-bundle", dependencies=[Depends(download_bundle_etag), Depends(statement_admission)])
+async def download_bundle(
+    request: Request,
+    file: UploadFile = File(...),
+    background_tasks: BackgroundTasks = None,
+    parser: str = Query("full", description="Parser a utilizar: full (download-pdf/csv) o partial (extract-partial)", regex="^(full|partial)$"),
+    formats: str = Query("json,csv", description="Formatos a incluir separados por coma: json, ndjson, csv, xlsx"),
+    progress_id: str = Query(None, description="Publica el avance en GET /progress/{progress_id} (SSE)"),
+    upload_etag: UploadEtag = Depends(download_bundle_etag),
+    profiler: RequestProfiler = Depends(request_profiling),
+    cancel: CancellationToken = Depends(request_cancellation)
+):
+    """
+    Analiza el PDF una sola vez y regresa un ZIP con todos los formatos
+    solicitados más `summary.json` (total de transacciones, income_month y total de cargos).
+
+    Todos los formatos se generan a partir del mismo resultado en memoria.
+    """
+    etag, _, bank_profile, selected_fields = upload_etag
+    requested_formats = resolve_formats(formats)
+    # Abonos y cargos se calculan siempre para el resumen
+    parser_fields = selected_fields + tuple(f for f in SUMMARY_FIELDS[parser] if f not in selected_fields)
+    # El ZIP incluye el nombre del archivo, así que solo se agrupan cargas con el mismo nombre (el ETag)
+    flight_key = flight_key_for(etag, progress_id, profiler)
+
+    bundle_dir = f"temp/bundle_{uuid.uuid4().hex}"
+    os.makedirs(bundle_dir, exist_ok=True)
+    temp_path = f"{bundle_dir}/{os.path.basename(file.filename)}"
+    base_name = os.path.basename(file.filename)[:-4].strip().replace(" ", "_")
+    progress = get_progress_channel(progress_id)
+    on_page = chain_page_callbacks(progress.page, cancel.check)
+    try:
+        with progress:
+            with open(temp_path, "wb") as f:
+                shutil.copyfileobj(file.file, f)
+
+            def parse_and_bundle():
+                start_time = time.time()
+                if parser == "full":
+                    records = iter_statement_records(
+                        temp_path, on_page, bank_profile, progress.record, True, parser_fields
+                    )
+                else:
+                    records = stream_partial_transactions(
+                        temp_path, on_page=on_page, profile=bank_profile, on_record=progress.record,
+                        use_cache=True, fields=parser_fields
+                    )
+                records = list(records)
+                execution_time = time.time() - start_time
+                if not records:
+                    raise ValueError("No se encontraron transacciones en el PDF.")
+
+                pdf = read_pdf(temp_path)
+                period = extract_statement_period(pdf[0]) if len(pdf) else None
+                to_ordinal = (lambda fecha: date_to_ordinal(fecha, period)) if period else None
+                return write_bundle(
+                    records, bundle_dir, base_name, requested_formats, parser, selected_fields, to_ordinal,
+                    {"archivo": file.filename, "parser": parser, "execution_time": execution_time}
+                )
+
+            (zip_path, summary), release = await run_single_flight(
+                flight_key, lambda result: shutil.rmtree(os.path.dirname(result[0]), True),
+                profiler.run, parse_and_bundle, request=request, cancel=cancel
+            )
+
+        shadow_runner.schedule(background_tasks, "download-bundle", temp_path, parser, bank_profile, parser_fields)
+
+        # Programar eliminación de archivos temporales (el ZIP compartido se elimina al liberarlo)
+        if os.path.dirname(zip_path) != bundle_dir:
+            background_tasks.add_task(shutil.rmtree, bundle_dir, True)
+        else:
+            background_tasks.add_task(cleanup_files, temp_path)
+        background_tasks.add_task(release)
+
+        response = FileResponse(
+            zip_path,
+            filename=f"{base_name}.zip",
+            media_type="application/zip"
+        )
+        response.headers["X-json"] = json.dumps({
+            "execution_time": summary["execution_time"],
+            "total_count": summary["total_count"],
+            "income_month": summary["income_month"]
+        })
+        response.headers["X-Total-Count"] = str(summary["total_count"])
+        response.headers["ETag"] = etag
+        return response
+
+    except RequestCancelled as rc:
+        shutil.rmtree(bundle_dir, ignore_errors=True)
+        raise cancelled_response(request, rc)
+    except ValueError as ve:
+        shutil.rmtree(bundle_dir, ignore_errors=True)
+        raise HTTPException(status_code=422, detail=f"Error al procesar el PDF: {ve}")
+    except Exception as e:
+        shutil.rmtree(bundle_dir, ignore_errors=True)
+        raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
+
+
+def summarize_statement_etag(
+    request: Request,
+    file: UploadFile = File(...),
+    parser: str = Query("full", description="Parser a utilizar: full (download-pdf/csv) o partial (extract-partial)", regex="^(full|partial)$"),
+    group_by: str = Query("day", description="Agrupar por day, week (semana que inicia en lunes) o concept (tipo de movimiento)", regex=f"^({'|'.join(GROUP_BY)})$"),
+    profile: str = Query(None, description="Perfil de banco en app/config/bank_profiles.json (default según parser)")
+):
+    # Débil: el cuerpo incluye execution_time
+    return statement_etag(
+        request, file, "summarize-statement", resolve_profile(profile, parser), weak=True,
+        parser=parser, group_by=group_by
+    )
+
+@router.post("/summarize-statement", dependencies=[Depends(summarize_statement_etag), Depends(statement_admission)])
+async def summarize_statement(
+    request: Request,
+    file: UploadFile = File(...),
+    background_tasks: BackgroundTasks = None,
+    parser: str = Query("full", description="Parser a utilizar: full (download-pdf/csv) o partial (extract-partial)", regex="^(full|partial)$"),
+    group_by: str = Query("day", description="Agrupar por day, week (semana que inicia en lunes) o concept (tipo de movimiento)", regex=f"^({'|'.join(GROUP_BY)})$"),
+    progress_id: str = Query(None, description="Publica el avance en GET /progress/{progress_id} (SSE)"),
+    upload_etag: UploadEtag = Depends(summarize_statement_etag),
+    profiler: RequestProfiler = Depends(request_profiling),
+    cancel: CancellationToken = Depends(request_cancellation)
+):
+    """
+    Resumen de entradas y salidas por día, semana o tipo de movimiento.
+
+    Regresa solo la tabla agregada (movimientos, suma de cargos y abonos, saldo
+    mínimo y máximo por grupo) en lugar de la lista completa de transacciones.
+    """
+    etag, digest, bank_profile, _ = upload_etag
+    # Solo se calculan las columnas que usa el resumen
+    selected_fields = summary_fields(parser, group_by)
+
+    flight_key = flight_key_for(
+        make_etag(digest, "summarize-statement", bank_profile, parser=parser, group_by=group_by), progress_id, profiler
+    )
+
+    temp_path = temp_upload_path(file.filename)
+    progress = get_progress_channel(progress_id)
+    on_page = chain_page_callbacks(progress.page, cancel.check)
+    shadowed = False
+    try:
+        with progress:
+            with open(temp_path, "wb") as f:
+                shutil.copyfileobj(file.file, f)
+
+            def parse_and_summarize():
+                to_ordinal = None
+                if group_by != "concept":
+                    pdf = read_pdf(temp_path)
+                    # El año de las fechas (dd/MMM o dd-mm) solo viene en el encabezado
+                    period = extract_statement_period(pdf[0]) if len(pdf) else None
+                    to_ordinal = (lambda fecha: date_to_ordinal(fecha, period)) if period else None
+
+                if parser == "full":
+                    records = iter_statement_records(
+                        temp_path, on_page, bank_profile, progress.record, True, selected_fields
+                    )
+                else:
+                    records = stream_partial_transactions(
+                        temp_path, on_page=on_page, profile=bank_profile, on_record=progress.record,
+                        use_cache=True, fields=selected_fields
+                    )
+                return summarize_movements(records, parser, group_by, bank_profile, to_ordinal)
+
+            start_time = time.time()
+            groups, _ = await run_single_flight(
+                flight_key, None, profiler.run, parse_and_summarize, request=request, cancel=cancel
+            )
+            execution_time = time.time() - start_time
+
+        if not groups:
+            raise HTTPException(status_code=422, detail="No se encontraron transacciones en el PDF.")
+
+        total_count = sum(group["movimientos"] for group in groups)
+        body = {
+            "archivo": file.filename,
+            "parser": parser,
+            "group_by": group_by,
+            "groups": groups,
+            "totals": {
+                "movimientos": total_count,
+                "cargos": round(sum(group["cargos"] for group in groups), 2),
+                "abonos": round(sum(group["abonos"] for group in groups), 2),
+            },
+            "execution_time": execution_time,
+        }
+        shadowed = shadow_runner.schedule(
+            background_tasks, "summarize-statement", temp_path, parser, bank_profile, selected_fields
+        )
+        if shadowed:
+            # El PDF se elimina después de copiarlo para el análisis en sombra
+            background_tasks.add_task(cleanup_files, temp_path)
+        return JSONResponse(body, headers={"X-Total-Count": str(total_count), "ETag": etag})
+
+    except HTTPException:
+        raise
+    except RequestCancelled as rc:
+        raise cancelled_response(request, rc)
+    except ValueError as ve:
+        raise HTTPException(status_code=422, detail=f"Error al procesar el PDF: {ve}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
+    finally:
+        if not shadowed:
+            cleanup_files(temp_path)
+
+
+def extract_vouchers_etag(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    output_format: str = Query("csv", description="Formato de salida: csv o json", regex="^(csv|json)$"),
+    profile: str = Query(None, description="Perfil de voucher en app/config/bank_profiles.json (default: voucher)"),
+    fields: str = Query(None, description="Campos a regresar separados por coma (default: todos)")
+):
+    for file in files:
+        if not file.filename.endswith(".pdf"):
+            raise HTTPException(status_code=400, detail=f"Solo se permiten archivos PDF: {file.filename}")
+    digest = uploads_digest(f.file for f in files)
+    voucher_profile = resolve_profile(profile, "voucher")
+    selected_fields = resolve_fields(fields, VOUCHER_FIELDS)
+    # En JSON el cuerpo incluye execution_time: ETag débil
+    etag = precondition(request, make_etag(
+        digest, "extract-vouchers", voucher_profile, output_format == "json",
+        filenames=[f.filename for f in files], fields=selected_fields, output_format=output_format
+    ))
+    return UploadEtag(etag, digest, voucher_profile, selected_fields)
+
+@router.post("/extract-vouchers", dependencies=[Depends(extract_vouchers_etag), Depends(parse_admission)])
+async def extract_vouchers(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    background_tasks: BackgroundTasks = None,
+    output_format: str = Query("csv", description="Formato de salida: csv o json", regex="^(csv|json)$"),
+    profile: str = Query(None, description="Perfil de voucher en app/config/bank_profiles.json (default: voucher)"),
+    upload_etag: UploadEtag = Depends(extract_vouchers_etag),
+    profiler: RequestProfiler = Depends(request_profiling)
+):
+    """
+    Extrae número de control, monto y fecha de muchos vouchers (comprobantes de pago) a la vez.
+
+    Los PDFs se reparten en lotes entre los procesos del pool y el resultado
+    se regresa como una sola tabla, en el mismo orden en que se recibieron.
+    """
+    etag, _, _, selected_fields = upload_etag
+
+    batch_dir = f"temp/vouchers_{uuid.uuid4().hex}"
+    os.makedirs(batch_dir, exist_ok=True)
+
+    try:
+        vouchers = []
+        for idx, file in enumerate(files):
+            # Prefijo con el índice para que nombres repetidos no se sobrescriban
+            temp_path = f"{batch_dir}/{idx}_{os.path.basename(file.filename)}"
+            with open(temp_path, "wb") as f:
+                shutil.copyfileobj(file.file, f)
+            vouchers.append((file.filename, temp_path))
+
+        start_time = time.time()
+        table = await run_in_threadpool(
+            profiler.run, process_vouchers, vouchers, profile_name=profile, fields=selected_fields
+        )
+        execution_time = time.time() - start_time
+
+        if output_format == "json":
+            shutil.rmtree(batch_dir, ignore_errors=True)
+            return JSONResponse({
+                "vouchers": table,
+                "total_count": len(table),
+                "execution_time": execution_time
+            }, headers={"ETag": etag})
+
+        csv_path = f"{batch_dir}/vouchers.csv"
+        with open(csv_path, "w", newline="", encoding="utf-8") as csv_file:
+            writer = csv.DictWriter(csv_file, fieldnames=list(selected_fields))
+            writer.writeheader()
+            writer.writerows(table)
+
+        # Programar eliminación de archivos temporales
+        background_tasks.add_task(shutil.rmtree, batch_dir, True)
+
+        response = FileResponse(
+            csv_path,
+            filename="vouchers.csv",
+            media_type="text/csv"
+        )
+        response.headers["X-Execution-Time"] = str(execution_time)
+        response.headers["X-Total-Count"] = str(len(table))
+        response.headers["ETag"] = etag
+        return response
+
+    except ValueError as ve:
+        shutil.rmtree(batch_dir, ignore_errors=True)
+        raise HTTPException(status_code=422, detail=f"Error al procesar los vouchers: {ve}")
+    except Exception as e:
+        shutil.rmtree(batch_dir, ignore_errors=True)
+        raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
+
+
+def aggregate_statements_etag(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    parser: str = Query("full", description="Parser a utilizar: full (download-pdf/csv) o partial (extract-partial)", regex="^(full|partial)$"),
+    output_format: str = Query("csv", description="Formato de salida: csv o json", regex="^(csv|json)$"),
+    profile: str = Query(None, description="Perfil de banco en app/config/bank_profiles.json (default según parser)"),
+    fields: str = Query(None, description="Campos a regresar separados por coma (default: todos)")
+):
+    for file in files:
+        if not file.filename.endswith(".pdf"):
+            raise HTTPException(status_code=400, detail=f"Solo se permiten archivos PDF: {file.filename}")
+    digest = uploads_digest(f.file for f in files)
+    bank_profile = resolve_profile(profile, parser)
+    if fields is not None:
+        parser_fields = FULL_FIELDS if parser == "full" else PARTIAL_FIELDS
+        fields = resolve_fields(fields, PERIOD_FIELDS + parser_fields)
+    # En JSON el cuerpo incluye execution_time: ETag débil
+    etag = precondition(request, make_etag(
+        digest, "aggregate-statements", bank_profile, output_format == "json",
+        filenames=[f.filename for f in files], parser=parser, fields=fields, output_format=output_format
+    ))
+    return UploadEtag(etag, digest, bank_profile, fields)
+
+@router.post("/aggregate-statements", dependencies=[Depends(aggregate_statements_etag), Depends(parse_admission)])
+async def aggregate_statements_endpoint(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    background_tasks: BackgroundTasks = None,
+    parser: str = Query("full", description="Parser a utilizar: full (download-pdf/csv) o partial (extract-partial)", regex="^(full|partial)$"),
+    output_format: str = Query("csv", description="Formato de salida: csv o json", regex="^(csv|json)$"),
+    profile: str = Query(None, description="Perfil de banco en app/config/bank_profiles.json (default según parser)"),
+    fields: str = Query(None, description="Campos a regresar separados por coma (default: todos)"),
+    upload_etag: UploadEtag = Depends(aggregate_statements_etag),
+    profiler: RequestProfiler = Depends(request_profiling)
+):
+    """
+    Combina varios estados de cuenta (p. ej. 12 meses) en un solo libro ordenado cronológicamente.
+
+    Cada estado se procesa en paralelo; el año de las fechas (dd/MMM o dd-mm) se toma
+    del encabezado de cada estado y se agregan las columnas `estado_cuenta` y `fecha_iso`.
+    """
+    # Los workers cargan el perfil por nombre; aquí solo se validó
+    etag, _, _, fields = upload_etag
+
+    batch_dir = f"temp/period_{uuid.uuid4().hex}"
+    os.makedirs(batch_dir, exist_ok=True)
+
+    ledger = None
+    try:
+        statements = []
+        for idx, file in enumerate(files):
+            temp_path = f"{batch_dir}/{idx}_{os.path.basename(file.filename)}"
+            with open(temp_path, "wb") as f:
+                shutil.copyfileobj(file.file, f)
+            statements.append((file.filename, temp_path))
+
+        start_time = time.time()
+        # Los resultados de los workers llegan en segmentos de memoria compartida;
+        # se serializan directo del segmento y se liberan al terminar la respuesta
+        ledger = await run_in_threadpool(profiler.run, open_ledger, statements, parser, profile, fields)
+        execution_time = time.time() - start_time
+        background_tasks.add_task(ledger.close)
+
+        if output_format == "json":
+            shutil.rmtree(batch_dir, ignore_errors=True)
+            return StreamingResponse(
+                stream_ledger_json(ledger, execution_time),
+                media_type="application/json",
+                headers={"ETag": etag, "X-Total-Count": str(len(ledger))}
+            )
+
+        if not len(ledger):
+            raise ValueError("No se encontraron transacciones en los PDFs.")
+
+        csv_path = f"{batch_dir}/periodo.csv"
+        await run_in_threadpool(write_ledger_csv, ledger, csv_path)
+        ledger.close()
+
+        # Programar eliminación de archivos temporales
+        background_tasks.add_task(shutil.rmtree, batch_dir, True)
+
+        response = FileResponse(
+            csv_path,
+            filename="periodo.csv",
+            media_type="text/csv"
+        )
+        response.headers["X-Execution-Time"] = str(execution_time)
+        response.headers["X-Total-Count"] = str(len(ledger))
+        response.headers["ETag"] = etag
         return response
 
+    except ValueError as ve:
+        if ledger is not None:
+            ledger.close()
+        shutil.rmtree(batch_dir, ignore_errors=True)
+        raise HTTPException(status_code=422, detail=f"Error al procesar los estados de cuenta: {ve}")
+    except Exception as e:
+        if ledger is not None:
+            ledger.close()
+        shutil.rmtree(batch_dir, ignore_errors=True)
+        raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
+
+
+def stream_ledger_json(ledger, execution_time, batch_size=500):
+    """
+    Cuerpo JSON del libro generado fila por fila desde la memoria compartida.
+    Los bytes son idénticos a JSONResponse({"transactions": [...], ...}).
+    """
+    dumps = lambda value: json.dumps(value, ensure_ascii=False, allow_nan=False, separators=(",", ":"))
+    try:
+        yield '{"transactions":['
+        batch = []
+        count = 0
+        for row in ledger:
+            batch.append(dumps(row))
+            count += 1
+            if len(batch) == batch_size:
+                yield ("," if count > batch_size else "") + ",".join(batch)
+                batch = []
+        if batch:
+            yield ("," if count > len(batch) else "") + ",".join(batch)
+        yield f'],"total_count":{count},"execution_time":{dumps(execution_time)}}}'
+    finally:
+        ledger.close()
+
+
+def write_ledger_csv(ledger, csv_path):
+    """Escribe el CSV del libro leyendo las filas directo de la memoria compartida."""
+    with open(csv_path, "w", newline="", encoding="utf-8") as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=ledger.fieldnames, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(ledger)
+
+
+def result_page_response(result_id, records, total, offset, limit, **extra):
+    """Respuesta de una página de resultados con X-Total-Count."""
+    body = {
+        "result_id": result_id,
+        "total_count": total,
+        "offset": offset,
+        "limit": limit,
+        "transactions": records,
+        **extra
+    }
+    return JSONResponse(body, headers={"X-Total-Count": str(total), "X-Result-Id": result_id})
+
+
+# Sin ETag: cada POST retiene un resultado nuevo con su propio result_id (en el
+# cuerpo), así que dos respuestas nunca son iguales; las páginas se validan con
+# el ETag de GET /results/{result_id}
+@router.post("/results", dependencies=[Depends(statement_admission)])
+async def create_result(
+    request: Request,
+    file: UploadFile = File(...),
+    background_tasks: BackgroundTasks = None,
+    parser: str = Query("full", description="Parser a utilizar: full (download-pdf/csv) o partial (extract-partial)", regex="^(full|partial)$"),
+    limit: int = Query(100, ge=1, le=1000, description="Transacciones en la primera página"),
+    profile: str = Query(None, description="Perfil de banco en app/config/bank_profiles.json (default según parser)"),
+    fields: str = Query(None, description="Campos a regresar separados por coma (default: los del endpoint equivalente)"),
+    progress_id: str = Query(None, description="Publica el avance en GET /progress/{progress_id} (SSE)"),
+    profiler: RequestProfiler = Depends(request_profiling),
+    cancel: CancellationToken = Depends(request_cancellation)
+):
+    """
+    Analiza un PDF y retiene el resultado para paginarlo con GET /results/{result_id}.
+
+    Responde con la primera página y el `result_id`; el total de transacciones va
+    en `X-Total-Count`. El resultado se descarta tras RESULT_TTL_SECONDS sin consultas.
+    """
+    if not file.filename.endswith(".pdf"):
+        raise HTTPException(status_code=400, detail="Solo se permiten archivos PDF.")
+    bank_profile = resolve_profile(profile, parser)
+    selected_fields = resolve_json_fields(fields, parser)
+
+    flight_key = flight_key_for(
+        make_etag(upload_digest(file.file), "results", bank_profile, parser=parser, fields=selected_fields),
+        progress_id, profiler
+    )
+    temp_path = temp_upload_path(file.filename)
+    progress = get_progress_channel(progress_id)
+    on_page = chain_page_callbacks(progress.page, cancel.check)
+    shadowed = False
+    try:
+        with progress:
+            with open(temp_path, "wb") as f:
+                shutil.copyfileobj(file.file, f)
+
+            def parse():
+                if parser == "full":
+                    records = iter_statement_records(
+                        temp_path, on_page, bank_profile, progress.record, True, selected_fields
+                    )
+                else:
+                    records = stream_partial_transactions(
+                        temp_path, on_page=on_page, profile=bank_profile, on_record=progress.record,
+                        use_cache=True, fields=selected_fields
+                    )
+                return list(records)
+
+            start_time = time.time()
+            records, _ = await run_single_flight(flight_key, None, profiler.run, parse, request=request, cancel=cancel)
+            execution_time = time.time() - start_time
+
+        result_id = result_store.put(records, {"archivo": file.filename, "parser": parser})
+        shadowed = shadow_runner.schedule(background_tasks, "results", temp_path, parser, bank_profile, selected_fields)
+        if shadowed:
+            # El PDF se elimina después de copiarlo para el análisis en sombra
+            background_tasks.add_task(cleanup_files, temp_path)
+        return result_page_response(
+            result_id, records[:limit], len(records), 0, limit, execution_time=execution_time
+        )
+
+    except RequestCancelled as rc:
+        raise cancelled_response(request, rc)
     except ValueError as ve:
         raise HTTPException(status_code=422, detail=f"Error al procesar el PDF: {ve}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
+    finally:
+        if not shadowed:
+            cleanup_files(temp_path)
+
+
+@router.get("/results/{result_id}")
+async def get_result_page(
+    request: Request,
+    result_id: str,
+    offset: int = Query(0, ge=0, description="Índice de la primera transacción"),
+    limit: int = Query(100, ge=1, le=1000, description="Transacciones por página")
+):
+    """Página de un resultado retenido por POST /results, sin volver a analizar el PDF."""
+    # Un resultado retenido no cambia: la página solo depende del id, offset y limit
+    etag = make_etag(result_id, "results", offset=offset, limit=limit)
+    if result_store.exists(result_id):
+        cached = not_modified(request, etag)
+        if cached:
+            return cached
+
+    page = result_store.page(result_id, offset, limit)
+    if page is None:
+        raise HTTPException(status_code=404, detail="El resultado no existe o ya expiró.")
+    records, total, meta = page
+    response = result_page_response(result_id, records, total, offset, limit, **meta)
+    response.headers["ETag"] = etag
+    return response
+
+
+@router.delete("/results/{result_id}")
+async def delete_result(result_id: str):
+    """Libera un resultado antes de que expire."""
+    if not result_store.discard(result_id):
+        raise HTTPException(status_code=404, detail="El resultado no existe o ya expiró.")
+    return {"result_id": result_id, "deleted": True}
+
+
+def diff_statements_etag(
+    request: Request,
+    old_file: UploadFile = File(None, description="Versión anterior del estado de cuenta (PDF)"),
+    new_file: UploadFile = File(None, description="Versión nueva del estado de cuenta (PDF)"),
+    old_result: str = Query(None, description="result_id de POST /results en lugar de old_file"),
+    new_result: str = Query(None, description="result_id de POST /results en lugar de new_file"),
+    parser: str = Query("full", description="Parser a utilizar: full (download-pdf/csv) o partial (extract-partial)", regex="^(full|partial)$"),
+    profile: str = Query(None, description="Perfil de banco en app/config/bank_profiles.json (default según parser)"),
+    fields: str = Query(None, description="Campos a comparar separados por coma (default: los del endpoint equivalente)")
+):
+    sides = (("old", old_file, old_result), ("new", new_file, new_result))
+    for side, upload, result_id in sides:
+        if (upload is None) == (result_id is None):
+            raise HTTPException(status_code=400, detail=f"Envíe {side}_file o {side}_result (solo uno).")
+        if upload is not None and not upload.filename.endswith(".pdf"):
+            raise HTTPException(status_code=400, detail="Solo se permiten archivos PDF.")
+    digest = uploads_digest(upload.file for _, upload, _ in sides if upload is not None)
+    bank_profile = resolve_profile(profile, parser)
+    selected_fields = resolve_json_fields(fields, parser)
+    # Débil: el cuerpo incluye execution_time. Un resultado retenido no cambia, así
+    # que basta su id; si ya expiró no hay 304 (el endpoint responde 404)
+    etag = make_etag(
+        digest, "diff-statements", bank_profile, True, old_result=old_result, new_result=new_result,
+        parser=parser, fields=selected_fields
+    )
+    if all(result_store.exists(result_id) for _, _, result_id in sides if result_id is not None):
+        etag = precondition(request, etag)
+    return UploadEtag(etag, digest, bank_profile, selected_fields)
+
+@router.post("/diff-statements", dependencies=[Depends(diff_statements_etag), Depends(parse_admission)])
+async def diff_statements_endpoint(
+    response: Response,
+    old_file: UploadFile = File(None, description="Versión anterior del estado de cuenta (PDF)"),
+    new_file: UploadFile = File(None, description="Versión nueva del estado de cuenta (PDF)"),
+    old_result: str = Query(None, description="result_id de POST /results en lugar de old_file"),
+    new_result: str = Query(None, description="result_id de POST /results en lugar de new_file"),
+    parser: str = Query("full", description="Parser a utilizar: full (download-pdf/csv) o partial (extract-partial)", regex="^(full|partial)$"),
+    upload_etag: UploadEtag = Depends(diff_statements_etag),
+    profiler: RequestProfiler = Depends(request_profiling)
+):
+    """
+    Compara dos versiones de un estado de cuenta (dos PDFs, dos resultados
+    retenidos con POST /results o uno de cada uno).
+
+    Cada transacción se normaliza (montos como número, textos sin espacios
+    repetidos) y se compara por hash; responde solo las filas agregadas,
+    eliminadas y modificadas, más un resumen con los conteos.
+    """
+    etag, _, bank_profile, selected_fields = upload_etag
+    sides = (("old", old_file, old_result), ("new", new_file, new_result))
+
+    # Los resultados retenidos se comparan tal como se guardaron (mismos campos que el parser pidió)
+    stored = {}
+    for side, upload, result_id in sides:
+        if result_id is None:
+            continue
+        entry = result_store.get(result_id)
+        if entry is None:
+            raise HTTPException(status_code=404, detail=f"El resultado {side}_result no existe o ya expiró.")
+        records, meta = entry
+        if meta.get("parser") != parser:
+            raise HTTPException(
+                status_code=400,
+                detail=f"El resultado {side}_result se generó con el parser {meta.get('parser')}, no {parser}."
+            )
+        stored[side] = [{k: v for k, v in row.items() if k in selected_fields} for row in records]
+
+    temp_paths = {}
+    try:
+        for side, upload, _ in sides:
+            if upload is not None:
+                temp_paths[side] = temp_upload_path(upload.filename)
+                with open(temp_paths[side], "wb") as f:
+                    shutil.copyfileobj(upload.file, f)
+
+        def parse(path):
+            # Con la caché de páginas, las páginas que no cambiaron entre versiones no se vuelven a analizar
+            if parser == "full":
+                records = iter_statement_records(path, profile=bank_profile, use_cache=True, fields=selected_fields)
+            else:
+                records = stream_partial_transactions(
+                    path, profile=bank_profile, use_cache=True, fields=selected_fields
+                )
+            return list(records)
+
+        def compare():
+            rows = {side: stored[side] if side in stored else parse(temp_paths[side]) for side in ("old", "new")}
+            return diff_statements(rows["old"], rows["new"], parser)
+
+        start_time = time.time()
+        diff = await run_in_threadpool(profiler.run, compare)
+        execution_time = time.time() - start_time
+
+        response.headers["ETag"] = etag
+        return {
+            "parser": parser,
+            "fields": list(selected_fields),
+            "execution_time": execution_time,
+            **diff
+        }
+
+    except ValueError as ve:
+        raise HTTPException(status_code=422, detail=f"Error al procesar el PDF: {ve}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
+    finally:
+        cleanup_files(*temp_paths.values())
+
+
+@router.get("/admin/profiles/{profile_id}")
+async def download_profile(
+    profile_id: str,
+    format: str = Query("text", description="text (resumen de pstats) o pstats (archivo para snakeviz/pstats)", regex="^(text|pstats)$"),
+    sort: str = Query("cumulative", description="Orden del resumen: cumulative, tottime, calls", regex="^(cumulative|tottime|calls)$"),
+    x_admin_token: str = Header(None)
+):
+    """Perfil de una petición hecha con `profiling=true`."""
+    require_admin(x_admin_token)
+    path = profile_path(profile_id)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="El perfil no existe.")
+    if format == "pstats":
+        return FileResponse(path, filename=f"{profile_id}.pstats", media_type="application/octet-stream")
+    summary = await run_in_threadpool(profile_summary, profile_id, 40, sort)
+    return PlainTextResponse(summary)
+
+
+@router.get("/admin/shadow")
+async def shadow_report(x_admin_token: str = Header(None)):
+    """Resultados del modo sombra por endpoint: coincidencias, campos con diferencias y latencias."""
+    require_admin(x_admin_token)
+    return JSONResponse(shadow_runner.report())
+
+
+@router.get("/progress/{progress_id}")
+async def stream_progress(
+    progress_id: str,
+    stream_rows: bool = Query(False, description="Envía también cada transacción en cuanto se reconoce")
+):
+    """
+    Avance de un análisis como Server-Sent Events.
+
+    Abrir antes de subir el PDF con el mismo `progress_id` (p. ej. un UUID generado por el cliente).
+    Eventos: `progress` (páginas, transacciones, tiempo restante estimado), `transaction`
+    (si `stream_rows=true`), y al final `done` o `error`.
+    """
+    channel = progress_registry.get_or_create(progress_id)
+    if channel is None:
+        raise HTTPException(status_code=503, detail="Hay demasiados canales de progreso abiertos; intente más tarde.")
+    return StreamingResponse(
+        channel.subscribe(stream_rows),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
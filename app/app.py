@@ -1,8 +1,23 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from app.api.routes_transacciones import router as transacciones_router # type: ignore
 from fastapi.middleware.cors import CORSMiddleware
+from app.services.workers import shutdown_process_pool
+from app.services.profiling import ProfileHeaderMiddleware
+from app.utils.log import RequestIdMiddleware, setup_logging, shutdown_logging
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    setup_logging()
+    yield
+    shutdown_process_pool()
+    shutdown_logging()
+
+app = FastAPI(lifespan=lifespan)
+
+app.add_middleware(ProfileHeaderMiddleware)
+app.add_middleware(RequestIdMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -10,7 +25,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-    expose_headers=["X-Execution-Time", "X-Total-Count", "X-Json"],
+    expose_headers=["X-Execution-Time", "X-Total-Count", "X-Json", "X-Memory-Peak", "Retry-After", "X-Result-Id", "X-Profile-Id", "X-Request-Id", "ETag"],
 
 )
 
@@ -0,0 +1,238 @@
+"""
+Procesamiento por lotes de estados de cuenta sin pasar por HTTP.
+
+Analiza todos los PDFs de un directorio o patrón glob repartiéndolos en un pool
+de procesos, con los mismos parsers de los endpoints, y escribe los formatos
+pedidos en el directorio de salida. Es reanudable: los PDFs ya procesados
+(mismo contenido y mismas opciones) se omiten usando el manifiesto del directorio.
+
+    python -m app.cli estados/ --out salida/ --formats json,csv
+    python -m app.cli "estados/**/*.pdf" --out salida/ --parser partial --formats xlsx --workers 8
+
+Al terminar imprime el resumen de throughput (archivos, páginas y transacciones por segundo).
+"""
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sys
+import time
+
+from app.utils.bank_profiles import get_profile
+from app.utils.functions import extract_statement_period, date_to_ordinal
+from app.utils.log import setup_worker_logging
+from app.services.bundle import BUNDLE_FORMATS, write_formats
+from app.services.projection import FULL_FIELDS, PARTIAL_FIELDS, parse_fields
+from app.services.statement_processor import read_pdf, iter_statement_records, stream_partial_transactions
+
+MANIFEST_NAME = ".manifest.json"
+
+
+def collect_pdfs(inputs):
+    """Expande directorios y patrones glob en una lista ordenada de PDFs sin repetir."""
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            matches = glob.glob(os.path.join(item, "*.pdf"))
+        else:
+            matches = glob.glob(item, recursive=True)
+        paths.extend(p for p in matches if p.lower().endswith(".pdf") and os.path.isfile(p))
+    return sorted(set(os.path.abspath(p) for p in paths))
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_manifest(out_dir):
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(out_dir, manifest):
+    """Reescribe el manifiesto de forma atómica (un corte a la mitad no lo corrompe)."""
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def is_done(entry, options, formats, out_dir):
+    """Un PDF está hecho si se procesó con las mismas opciones y existen todas sus salidas."""
+    if not entry or entry.get("options") != options:
+        return False
+    if not set(formats) <= set(entry.get("formats", [])):
+        return False
+    return all(os.path.exists(os.path.join(out_dir, name)) for name in entry.get("outputs", []))
+
+
+def process_file(task):
+    """
+    Analiza un PDF dentro de un worker y escribe sus formatos.
+    Retorna un dict con el resultado (o el error) para el manifiesto y el resumen.
+    """
+    pdf_path, base_name, out_dir, parser, formats, profile_name, fields = task
+    start_time = time.perf_counter()
+    try:
+        profile = get_profile(profile_name, parser=parser)
+        pdf = read_pdf(pdf_path)
+        pages = len(pdf)
+        # El año de las fechas (dd/MMM o dd-mm) solo viene en el encabezado
+        period = extract_statement_period(pdf[0]) if pages else None
+        to_ordinal = (lambda fecha: date_to_ordinal(fecha, period)) if period else None
+
+        if parser == "full":
+            records = list(iter_statement_records(pdf_path, profile=profile, fields=fields))
+        else:
+            records = list(stream_partial_transactions(pdf_path, profile=profile, fields=fields))
+
+        outputs = write_formats(records, out_dir, base_name, formats, parser, fields, to_ordinal)
+        return {
+            "archivo": pdf_path,
+            "outputs": [os.path.basename(p) for p in outputs],
+            "transactions": len(records),
+            "pages": pages,
+            "seconds": time.perf_counter() - start_time,
+            "error": None,
+        }
+    except Exception as e:
+        return {
+            "archivo": pdf_path,
+            "outputs": [],
+            "transactions": 0,
+            "pages": 0,
+            "seconds": time.perf_counter() - start_time,
+            "error": str(e),
+        }
+
+
+def output_names(pdfs, hashes):
+    """Nombre base de salida por PDF; si dos PDFs se llaman igual se agrega el inicio del hash."""
+    stems = [os.path.splitext(os.path.basename(p))[0].strip().replace(" ", "_") for p in pdfs]
+    repeated = {s for s in stems if stems.count(s) > 1}
+    return [f"{s}_{h[:8]}" if s in repeated else s for s, h in zip(stems, hashes)]
+
+
+def print_summary(summary, stream=sys.stdout):
+    print(
+        f"\nArchivos: {summary['processed']} procesados, {summary['skipped']} omitidos "
+        f"(ya hechos), {summary['failed']} con error",
+        file=stream
+    )
+    print(
+        f"Páginas: {summary['pages']}  Transacciones: {summary['transactions']}  "
+        f"Datos: {summary['mb']:.1f} MB",
+        file=stream
+    )
+    print(
+        f"Tiempo: {summary['elapsed_s']:.2f}s  ->  {summary['files_per_s']:.2f} archivos/s, "
+        f"{summary['pages_per_s']:.1f} páginas/s, {summary['transactions_per_s']:.0f} transacciones/s, "
+        f"{summary['mb_per_s']:.2f} MB/s",
+        file=stream
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Procesa por lotes un directorio de estados de cuenta en PDF")
+    parser.add_argument("inputs", nargs="+", help="Directorios o patrones glob (entre comillas) con los PDFs")
+    parser.add_argument("--out", required=True, help="Directorio de salida")
+    parser.add_argument("--parser", choices=["full", "partial"], default="full",
+                        help="full (download-pdf/csv) o partial (extract-partial)")
+    parser.add_argument("--formats", default="json", help=f"Formatos separados por coma: {', '.join(BUNDLE_FORMATS)}")
+    parser.add_argument("--profile", default=None, help="Perfil de banco (default según parser)")
+    parser.add_argument("--fields", default=None, help="Campos a exportar separados por coma")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Procesos en paralelo")
+    parser.add_argument("--force", action="store_true", help="Reprocesa aunque el manifiesto diga que ya están hechos")
+    parser.add_argument("--summary-json", default=None, help="Guarda el resumen de throughput en JSON")
+    args = parser.parse_args(argv)
+
+    formats = [f.strip() for f in args.formats.split(",") if f.strip()]
+    unknown = set(formats) - set(BUNDLE_FORMATS)
+    if unknown or not formats:
+        parser.error(f"Formatos no válidos: {', '.join(sorted(unknown)) or args.formats}")
+    try:
+        get_profile(args.profile, parser=args.parser)
+        if args.parser == "full":
+            fields = parse_fields(args.fields, FULL_FIELDS)
+        else:
+            fields = parse_fields(args.fields, PARTIAL_FIELDS, tuple(f for f in PARTIAL_FIELDS if f != "raw_lines"))
+    except ValueError as e:
+        parser.error(str(e))
+
+    pdfs = collect_pdfs(args.inputs)
+    if not pdfs:
+        parser.error("No se encontraron PDFs en las rutas indicadas.")
+    os.makedirs(args.out, exist_ok=True)
+
+    start_time = time.perf_counter()
+    manifest = load_manifest(args.out)
+    options = {"parser": args.parser, "profile": args.profile, "fields": list(fields)}
+    hashes = [file_sha256(p) for p in pdfs]
+    names = output_names(pdfs, hashes)
+
+    tasks = []
+    skipped = 0
+    for pdf_path, sha, name in zip(pdfs, hashes, names):
+        if not args.force and is_done(manifest.get(sha), options, formats, args.out):
+            skipped += 1
+            continue
+        tasks.append((sha, (pdf_path, name, args.out, args.parser, formats, args.profile, fields)))
+
+    print(f"{len(pdfs)} PDFs, {skipped} ya procesados, {len(tasks)} por procesar con {args.workers} procesos")
+
+    processed = failed = pages = transactions = 0
+    total_bytes = 0
+    with ProcessPoolExecutor(max_workers=max(1, args.workers), initializer=setup_worker_logging) as pool:
+        futures = {pool.submit(process_file, task): (sha, task[0]) for sha, task in tasks}
+        for future in as_completed(futures):
+            sha, pdf_path = futures[future]
+            result = future.result()
+            if result["error"]:
+                failed += 1
+                print(f"ERROR {pdf_path}: {result['error']}", file=sys.stderr)
+                continue
+
+            processed += 1
+            pages += result["pages"]
+            transactions += result["transactions"]
+            total_bytes += os.path.getsize(pdf_path)
+            print(f"OK {os.path.basename(pdf_path)}: {result['transactions']} transacciones en {result['seconds']:.2f}s")
+
+            # El manifiesto se guarda tras cada archivo para poder reanudar si se interrumpe
+            manifest[sha] = {**result, "options": options, "formats": formats}
+            save_manifest(args.out, manifest)
+
+    elapsed = time.perf_counter() - start_time
+    per_s = lambda value: value / elapsed if elapsed > 0 else 0.0
+    summary = {
+        "processed": processed,
+        "skipped": skipped,
+        "failed": failed,
+        "pages": pages,
+        "transactions": transactions,
+        "mb": total_bytes / 1e6,
+        "elapsed_s": elapsed,
+        "files_per_s": per_s(processed),
+        "pages_per_s": per_s(pages),
+        "transactions_per_s": per_s(transactions),
+        "mb_per_s": per_s(total_bytes / 1e6),
+    }
+    print_summary(summary)
+    if args.summary_json:
+        with open(args.summary_json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
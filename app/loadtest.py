@@ -0,0 +1,238 @@
+"""
+Prueba de carga de los endpoints de estados de cuenta.
+
+Envía N cargas multipart concurrentes a cada endpoint usando un directorio de PDFs
+de prueba y reporta throughput y latencias p50/p95/p99 por endpoint. Por defecto
+usa la aplicación en el mismo proceso (ASGI); con --url se prueba un uvicorn local.
+
+    python -m app.loadtest --corpus fixtures/ --concurrency 8 --requests 32 --output carga.json
+    python -m app.loadtest --corpus fixtures/ --url http://localhost:8000 --baseline carga.json
+
+Si el corpus tiene subdirectorios `full/` y `partial/`, los PDFs de `full/` se usan en
+download-pdf/csv y los de `partial/` en extract-partial-json/csv.
+
+Con --no-cache se desactivan las cachés de páginas y de estados de cuenta y el
+agrupamiento de cargas idénticas, para medir el análisis en frío (el corpus se
+repite entre peticiones). Con --url hay que arrancar el servidor con
+PAGE_CACHE_MAX_ENTRIES=0 STATEMENT_CACHE_MAX_ENTRIES=0 SINGLE_FLIGHT_ENABLED=0.
+"""
+import argparse
+import asyncio
+import glob
+import hashlib
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import httpx
+
+# Variables que desactivan las cachés y el agrupamiento (--no-cache)
+NO_CACHE_ENV = {
+    "PAGE_CACHE_MAX_ENTRIES": "0",
+    "STATEMENT_CACHE_MAX_ENTRIES": "0",
+    "SINGLE_FLIGHT_ENABLED": "0",
+}
+
+ENDPOINTS = {
+    "download-pdf": ("/api/v1/download-pdf", "full"),
+    "download-csv": ("/api/v1/download-csv", "full"),
+    "extract-partial-json": ("/api/v1/extract-partial-json", "partial"),
+    "extract-partial-csv": ("/api/v1/extract-partial-csv", "partial"),
+}
+
+
+def load_corpus(corpus_dir):
+    """Retorna {"full": [(nombre, bytes)], "partial": [...]} con los PDFs del corpus."""
+    corpus = {}
+    for layout in ("full", "partial"):
+        paths = sorted(glob.glob(os.path.join(corpus_dir, layout, "*.pdf")))
+        if not paths:
+            paths = sorted(glob.glob(os.path.join(corpus_dir, "*.pdf")))
+        corpus[layout] = [(os.path.basename(p), open(p, "rb").read()) for p in paths]
+    return corpus
+
+
+def corpus_digest(corpus):
+    """Hash del contenido del corpus, para saber si dos corridas son comparables."""
+    digest = hashlib.sha256()
+    for layout in sorted(corpus):
+        for name, content in corpus[layout]:
+            digest.update(name.encode())
+            digest.update(hashlib.sha256(content).digest())
+    return digest.hexdigest()[:16]
+
+
+def percentile(sorted_values, pct):
+    """Percentil por rango más cercano sobre una lista ya ordenada."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def run_endpoint(client, path, files, total_requests, concurrency):
+    """Lanza `total_requests` cargas con a lo más `concurrency` en vuelo a la vez."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one(i):
+        nonlocal errors
+        name, content = files[i % len(files)]
+        # Nombre distinto por petición, para distinguirlas en los logs
+        upload_name = f"{os.path.splitext(name)[0]}_{i}.pdf"
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                response = await client.post(path, files={"file": (upload_name, content, "application/pdf")})
+                await response.aread()
+                ok = response.status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            elapsed = time.perf_counter() - start
+        if ok:
+            latencies.append(elapsed)
+        else:
+            errors += 1
+
+    wall_start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total_requests)))
+    wall = time.perf_counter() - wall_start
+
+    latencies.sort()
+    ms = lambda v: round(v * 1000, 2) if v is not None else None
+    return {
+        "requests": total_requests,
+        "errors": errors,
+        "concurrency": concurrency,
+        "wall_time_s": round(wall, 3),
+        "throughput_rps": round(len(latencies) / wall, 3) if wall else None,
+        "mean_ms": ms(sum(latencies) / len(latencies)) if latencies else None,
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p95_ms": ms(percentile(latencies, 95)),
+        "p99_ms": ms(percentile(latencies, 99)),
+        "max_ms": ms(latencies[-1]) if latencies else None,
+    }
+
+
+async def run_load_test(corpus, endpoints, concurrency, total_requests, url=None, warmup=1, timeout=300):
+    if url:
+        client = httpx.AsyncClient(base_url=url, timeout=timeout)
+        async with client:
+            return await run_endpoints(client, corpus, endpoints, concurrency, total_requests, warmup)
+
+    from app.app import app
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://loadtest", timeout=timeout)
+    # ASGITransport no envía los eventos de lifespan: se corre aquí, como lo haría
+    # uvicorn (logging al arrancar; pool de procesos y logging se cierran al final)
+    async with app.router.lifespan_context(app), client:
+        return await run_endpoints(client, corpus, endpoints, concurrency, total_requests, warmup)
+
+
+async def run_endpoints(client, corpus, endpoints, concurrency, total_requests, warmup):
+    results = {}
+    for name in endpoints:
+        path, layout = ENDPOINTS[name]
+        files = corpus[layout]
+        if not files:
+            raise SystemExit(f"No hay PDFs en el corpus para {name}")
+        # Calentamiento: imports perezosos, pool de procesos, caches
+        for i in range(warmup):
+            await client.post(path, files={"file": (f"warmup_{i}.pdf", files[0][1], "application/pdf")})
+        results[name] = await run_endpoint(client, path, files, total_requests, concurrency)
+    return results
+
+
+def print_report(report, baseline=None):
+    print(f"commit {report['commit']}  corpus {report['corpus']}  target {report['target']}  "
+          f"cache {'on' if report['cache'] else 'off'}  "
+          f"concurrency {report['concurrency']}  requests {report['requests_per_endpoint']}")
+    header = f"{'endpoint':<22}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}"
+    print(header)
+    print("-" * len(header))
+    for name, r in report["endpoints"].items():
+        print(f"{name:<22}{r['throughput_rps'] or 0:>9.2f}{r['p50_ms'] or 0:>10.1f}"
+              f"{r['p95_ms'] or 0:>10.1f}{r['p99_ms'] or 0:>10.1f}{r['errors']:>8}")
+        if baseline and name in baseline["endpoints"]:
+            b = baseline["endpoints"][name]
+            deltas = []
+            for key in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms"):
+                if r[key] and b.get(key):
+                    deltas.append(f"{key} {100 * (r[key] - b[key]) / b[key]:+.1f}%")
+            print(f"{'  vs ' + baseline['commit']:<22}{'  '.join(deltas)}")
+
+    if baseline and baseline.get("corpus") != report["corpus"]:
+        print("AVISO: el corpus del baseline es distinto, las cifras no son comparables")
+    if baseline and baseline.get("cache", True) != report["cache"]:
+        print("AVISO: el baseline se corrió con otro modo de caché, las cifras no son comparables")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prueba de carga de los endpoints de estados de cuenta")
+    parser.add_argument("--corpus", required=True, help="Directorio con los PDFs de prueba")
+    parser.add_argument("--concurrency", type=int, default=8, help="Cargas en vuelo a la vez por endpoint")
+    parser.add_argument("--requests", type=int, default=None, help="Cargas por endpoint (default: 4 x concurrency)")
+    parser.add_argument("--endpoints", nargs="+", choices=list(ENDPOINTS), default=list(ENDPOINTS))
+    parser.add_argument("--url", default=None, help="URL de un uvicorn local; sin ella se usa ASGI en proceso")
+    parser.add_argument("--warmup", type=int, default=1, help="Peticiones de calentamiento por endpoint")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Sin cachés de páginas/estados de cuenta ni agrupamiento de cargas idénticas")
+    parser.add_argument("--output", default=None, help="Guarda el reporte en JSON")
+    parser.add_argument("--baseline", default=None, help="Reporte JSON previo contra el cual comparar")
+    args = parser.parse_args(argv)
+
+    corpus = load_corpus(args.corpus)
+    total_requests = args.requests or args.concurrency * 4
+    if args.no_cache:
+        if args.url:
+            print("AVISO: --no-cache con --url solo se registra en el reporte; arranque el servidor con "
+                  + " ".join(f"{k}={v}" for k, v in NO_CACHE_ENV.items()))
+        else:
+            # Antes de importar la aplicación (y de crear el pool de procesos, que las hereda)
+            os.environ.update(NO_CACHE_ENV)
+
+    endpoints = asyncio.run(run_load_test(
+        corpus, args.endpoints, args.concurrency, total_requests, url=args.url, warmup=args.warmup
+    ))
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "target": args.url or "asgi",
+        "cache": not args.no_cache,
+        "corpus": corpus_digest(corpus),
+        "concurrency": args.concurrency,
+        "requests_per_endpoint": total_requests,
+        "endpoints": endpoints,
+    }
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=4)
+
+    return 0 if all(r["errors"] == 0 for r in endpoints.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,3 @@
 # services/__init__.py
 from .statement_processor import process_pdf_file
-
-
+from .voucher_processor import process_vouchers
@@ -0,0 +1,142 @@
+import asyncio
+import math
+import os
+from collections import deque
+
+# Límite de análisis (pdftotext + parser) en vuelo por proceso
+ADMISSION_MAX_CONCURRENT = int(os.getenv("ADMISSION_MAX_CONCURRENT", os.cpu_count() or 1))
+# Peticiones que pueden esperar turno en total y por cliente antes de responder 503
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", 64))
+ADMISSION_MAX_QUEUE_PER_CLIENT = int(os.getenv("ADMISSION_MAX_QUEUE_PER_CLIENT", 32))
+# Carril lento para estados de cuenta grandes (ver services/preflight.py): análisis
+# simultáneos y cola propios, para que no ocupen los lugares de las cargas normales
+ADMISSION_SLOW_MAX_CONCURRENT = int(os.getenv("ADMISSION_SLOW_MAX_CONCURRENT", 1))
+ADMISSION_SLOW_MAX_QUEUE = int(os.getenv("ADMISSION_SLOW_MAX_QUEUE", 16))
+# Pesos por cliente: "clave1=4,clave2=2" (default 1). Un peso mayor recibe más turnos.
+ADMISSION_CLIENT_WEIGHTS = os.getenv("ADMISSION_CLIENT_WEIGHTS", "")
+
+
+def parse_weights(spec):
+    """Convierte "clave1=4,clave2=2" en {"clave1": 4.0, "clave2": 2.0}."""
+    weights = {}
+    for item in spec.split(","):
+        if "=" in item:
+            client, weight = item.rsplit("=", 1)
+            weights[client.strip()] = max(float(weight), 0.01)
+    return weights
+
+
+class AdmissionRejected(Exception):
+    """La cola está llena; `retry_after` es la espera sugerida en segundos."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Cola de análisis llena, reintentar en {retry_after} s")
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Control de admisión con cola justa ponderada por cliente.
+
+    Solo `max_concurrent` análisis corren a la vez. Los demás esperan en una cola
+    por cliente; cada petición recibe una etiqueta de fin virtual
+    (max(tiempo_virtual, última_etiqueta_del_cliente) + 1/peso) y se atiende primero la
+    etiqueta menor. Así un cliente que sube decenas de estados no retrasa la única
+    carga de otro: ambos avanzan a la par (o según su peso).
+
+    Se ejecuta dentro del event loop, por lo que no necesita locks. El estado es por
+    proceso: con varios workers de uvicorn cada uno aplica su propio límite.
+    """
+
+    def __init__(self, max_concurrent=ADMISSION_MAX_CONCURRENT, max_queue=ADMISSION_MAX_QUEUE,
+                 max_queue_per_client=ADMISSION_MAX_QUEUE_PER_CLIENT, weights=None):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max_queue
+        self.max_queue_per_client = max_queue_per_client
+        self.weights = weights if weights is not None else parse_weights(ADMISSION_CLIENT_WEIGHTS)
+        self.in_flight = 0
+        self.queued = 0
+        self._queues = {}
+        self._last_tag = {}
+        self._virtual_time = 0.0
+        # Promedio móvil de la duración de un análisis (segundos)
+        self._avg_duration = None
+
+    def retry_after(self):
+        """Estimación (segundos) de cuándo se liberará lugar según la tasa observada."""
+        avg = self._avg_duration if self._avg_duration is not None else 1.0
+        waiting = self.queued + self.in_flight
+        return max(1, math.ceil(waiting * avg / self.max_concurrent))
+
+    async def acquire(self, client):
+        """Espera turno para `client`. Lanza AdmissionRejected si la cola está llena."""
+        if self.in_flight < self.max_concurrent and self.queued == 0:
+            self.in_flight += 1
+            return
+
+        queue = self._queues.setdefault(client, deque())
+        if self.queued >= self.max_queue or len(queue) >= self.max_queue_per_client:
+            raise AdmissionRejected(self.retry_after())
+
+        if len(self._last_tag) > 1024:
+            # Las etiquetas ya alcanzadas por el tiempo virtual no influyen en el orden
+            self._last_tag = {c: t for c, t in self._last_tag.items() if t > self._virtual_time}
+
+        weight = self.weights.get(client, 1.0)
+        start_tag = max(self._virtual_time, self._last_tag.get(client, 0.0))
+        finish_tag = start_tag + 1.0 / weight
+        self._last_tag[client] = finish_tag
+
+        entry = (finish_tag, start_tag, asyncio.get_running_loop().create_future())
+        queue.append(entry)
+        self.queued += 1
+        try:
+            await entry[2]
+        except asyncio.CancelledError:
+            if entry[2].done() and not entry[2].cancelled():
+                # Ya se le había dado turno: devolverlo
+                self.release()
+            else:
+                queue.remove(entry)
+                self.queued -= 1
+            raise
+
+    def release(self, duration=None):
+        """Libera un lugar y registra la duración del análisis para estimar Retry-After."""
+        if duration is not None:
+            if self._avg_duration is None:
+                self._avg_duration = duration
+            else:
+                self._avg_duration = 0.8 * self._avg_duration + 0.2 * duration
+        self.in_flight -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        while self.in_flight < self.max_concurrent and self.queued:
+            client = min(
+                (c for c, q in self._queues.items() if q),
+                key=lambda c: self._queues[c][0][0]
+            )
+            finish_tag, start_tag, future = self._queues[client].popleft()
+            self.queued -= 1
+            if not self._queues[client]:
+                del self._queues[client]
+            self._virtual_time = start_tag
+            self.in_flight += 1
+            future.set_result(None)
+
+    def stats(self):
+        return {
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "clients_waiting": len(self._queues),
+            "avg_parse_s": round(self._avg_duration, 3) if self._avg_duration is not None else None,
+        }
+
+
+admission = AdmissionController()
+slow_admission = AdmissionController(
+    max_concurrent=ADMISSION_SLOW_MAX_CONCURRENT,
+    max_queue=ADMISSION_SLOW_MAX_QUEUE,
+    max_queue_per_client=ADMISSION_SLOW_MAX_QUEUE,
+)
@@ -0,0 +1,75 @@
+from .exporters import parse_amount, write_csv, write_json_array, write_ndjson, write_xlsx
+from .projection import AMOUNT_FIELDS, DATE_VALUE_FIELDS, iter_projected
+
+import json
+import os
+import zipfile
+
+BUNDLE_FORMATS = ("json", "ndjson", "csv", "xlsx")
+# Columnas de abonos y cargos según el parser, para el resumen
+SUMMARY_FIELDS = {
+    "full": ("ABONOS", "CARGOS"),
+    "partial": ("abono", "cargo"),
+}
+
+
+def summarize(records, parser):
+    """Totales del estado de cuenta (mismo income_month que el header X-json de download-csv)."""
+    abono_field, cargo_field = SUMMARY_FIELDS[parser]
+    income = charges = 0.0
+    for record in records:
+        income += parse_amount(record.get(abono_field)) or 0.0
+        charges += parse_amount(record.get(cargo_field)) or 0.0
+    return {
+        "total_count": len(records),
+        "income_month": income,
+        "total_cargos": charges,
+    }
+
+
+def write_formats(records, out_dir, base_name, formats, parser, fields, date_to_ordinal=None):
+    """
+    Escribe cada formato solicitado (json, ndjson, csv, xlsx) en `out_dir` a partir
+    de la misma lista de registros ya analizada.
+    `fields` son las columnas a exportar (los registros pueden traer más).
+    Retorna la lista de archivos escritos.
+    """
+    outputs = []
+
+    if "json" in formats:
+        path = os.path.join(out_dir, f"{base_name}.json")
+        write_json_array(iter_projected(records, fields), path, indent=4 if parser == "full" else 2)
+        outputs.append(path)
+    if "ndjson" in formats:
+        path = os.path.join(out_dir, f"{base_name}.ndjson")
+        write_ndjson(iter_projected(records, fields), path)
+        outputs.append(path)
+    if "csv" in formats:
+        path = os.path.join(out_dir, f"{base_name}.csv")
+        if write_csv(records, path, fields):
+            outputs.append(path)
+    if "xlsx" in formats:
+        path = os.path.join(out_dir, f"{base_name}.xlsx")
+        if write_xlsx(records, path, fields, AMOUNT_FIELDS, DATE_VALUE_FIELDS, date_to_ordinal):
+            outputs.append(path)
+    return outputs
+
+
+def write_bundle(records, bundle_dir, base_name, formats, parser, fields, date_to_ordinal=None, summary_extra=None):
+    """
+    Escribe cada formato solicitado con write_formats y los empaqueta junto con
+    summary.json en un ZIP. Retorna (ruta_zip, resumen).
+    """
+    summary = {**summarize(records, parser), **(summary_extra or {})}
+    outputs = write_formats(records, bundle_dir, base_name, formats, parser, fields, date_to_ordinal)
+
+    summary_path = os.path.join(bundle_dir, "summary.json")
+    with open(summary_path, "w", encoding="utf-8") as summary_file:
+        json.dump(summary, summary_file, ensure_ascii=False, indent=2)
+    outputs.append(summary_path)
+
+    zip_path = os.path.join(bundle_dir, f"{base_name}.zip")
+    with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_DEFLATED) as bundle:
+        for path in outputs:
+            bundle.write(path, arcname=os.path.basename(path))
+    return zip_path, summary
@@ -0,0 +1,111 @@
+import asyncio
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+
+# Tiempo máximo de análisis por petición en segundos (0 = sin límite)
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", 300))
+# Cada cuánto se revisa si el cliente cerró la conexión
+DISCONNECT_POLL_SECONDS = float(os.getenv("DISCONNECT_POLL_SECONDS", 0.5))
+
+# 499: el cliente cerró la conexión antes de la respuesta (convención de nginx)
+CLIENT_CLOSED_REQUEST = 499
+
+
+class RequestCancelled(Exception):
+    """Se canceló el análisis; `status_code` es la respuesta HTTP sugerida."""
+
+    def __init__(self, message, status_code=CLIENT_CLOSED_REQUEST):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class CancellationToken:
+    """
+    Cancelación cooperativa de un análisis.
+
+    El event loop la activa (cliente desconectado o plazo vencido) y el parser,
+    que corre en un hilo del threadpool, la revisa entre páginas con `check`:
+
+        on_page = chain_page_callbacks(tracker.check, progress.page, cancel.check)
+    """
+
+    def __init__(self, deadline_seconds=REQUEST_DEADLINE_SECONDS):
+        self.deadline = time.monotonic() + deadline_seconds if deadline_seconds else None
+        self.error = None
+        self._flag = threading.Event()
+        self._event = asyncio.Event()
+
+    @property
+    def cancelled(self):
+        return self._flag.is_set()
+
+    def expired(self):
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def cancel(self, message, status_code=CLIENT_CLOSED_REQUEST):
+        """Activa la cancelación (desde el event loop); las siguientes llamadas no la cambian."""
+        if self.cancelled:
+            return
+        self.error = RequestCancelled(message, status_code)
+        self._flag.set()
+        self._event.set()
+
+    def check(self, *args):
+        """
+        Lanza RequestCancelled si el análisis se canceló o venció el plazo.
+        Acepta argumentos para poder usarse como callback `on_page`.
+        """
+        if not self.cancelled and self.expired():
+            raise RequestCancelled("Se agotó el tiempo máximo de análisis de la petición.", 504)
+        if self.cancelled:
+            raise RequestCancelled(str(self.error), self.error.status_code)
+
+    async def wait(self):
+        await self._event.wait()
+
+
+async def until_cancelled(awaitable, cancel):
+    """
+    Espera `awaitable` pero se rinde en cuanto se cancela la petición
+    (lanza RequestCancelled). `awaitable` debe protegerse con asyncio.shield
+    si otras peticiones dependen de él.
+    """
+    if cancel is None:
+        return await awaitable
+    task = asyncio.ensure_future(awaitable)
+    stop = asyncio.ensure_future(cancel.wait())
+    try:
+        await asyncio.wait({task, stop}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        stop.cancel()
+    if task.done():
+        return task.result()
+    task.cancel()
+    cancel.check()
+
+
+@asynccontextmanager
+async def watch_cancellation(request, cancel):
+    """
+    Mientras dura el bloque, activa `cancel` si el cliente se desconecta o
+    vence el plazo de la petición.
+    """
+    async def watch():
+        while not cancel.cancelled:
+            if await request.is_disconnected():
+                cancel.cancel("El cliente cerró la conexión.")
+            elif cancel.expired():
+                cancel.cancel("Se agotó el tiempo máximo de análisis de la petición.", 504)
+            else:
+                wait = DISCONNECT_POLL_SECONDS
+                if cancel.deadline is not None:
+                    wait = min(wait, max(cancel.deadline - time.monotonic(), 0))
+                await asyncio.sleep(wait)
+
+    watcher = asyncio.create_task(watch())
+    try:
+        yield cancel
+    finally:
+        watcher.cancel()
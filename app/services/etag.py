@@ -0,0 +1,66 @@
+from .page_cache import PARSER_VERSION
+
+import hashlib
+import json
+
+# Tamaño de bloque para calcular el hash de las cargas sin leerlas completas a memoria
+_CHUNK_SIZE = 1 << 20
+
+
+def upload_digest(fileobj):
+    """sha256 del contenido subido; deja el archivo al inicio para copiarlo después."""
+    digest = hashlib.sha256()
+    fileobj.seek(0)
+    for chunk in iter(lambda: fileobj.read(_CHUNK_SIZE), b""):
+        digest.update(chunk)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+
+def make_etag(content_digest, endpoint, profile=None, weak=False, **options):
+    """
+    ETag de la respuesta de un endpoint de análisis: depende del contenido
+    subido, de la versión de los parsers, del perfil de banco (su huella cambia al
+    recargarlo) y de las opciones que afectan la salida (formato, campos...).
+
+    Con `weak=True` regresa un ETag débil (W/"..."), para respuestas que
+    incluyen datos de la ejecución (execution_time, picos de memoria) y no son
+    idénticas byte por byte.
+    """
+    payload = json.dumps({
+        "content": content_digest,
+        "parser_version": PARSER_VERSION,
+        "endpoint": endpoint,
+        "profile": profile.fingerprint if profile is not None else None,
+        "options": options,
+    }, sort_keys=True, default=list)
+    etag = '"' + hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32] + '"'
+    return "W/" + etag if weak else etag
+
+
+def etag_matches(if_none_match, etag):
+    """
+    Compara el header If-None-Match con el ETag (comparación débil, RFC 9110):
+    acepta '*', listas separadas por coma y el prefijo W/ en ambos lados.
+    """
+    if not if_none_match:
+        return False
+    if etag.startswith("W/"):
+        etag = etag[2:]
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def uploads_digest(fileobjs):
+    """Hash combinado de varias cargas, en el orden recibido."""
+    digest = hashlib.sha256()
+    for fileobj in fileobjs:
+        digest.update(upload_digest(fileobj).encode())
+    return digest.hexdigest()
@@ -0,0 +1,233 @@
+from datetime import date
+from xml.sax.saxutils import escape
+import csv
+import io
+import json
+import math
+import re
+import textwrap
+import zipfile
+
+
+def write_json_array(records, path, indent=2):
+    """
+    Escribe un arreglo JSON registro por registro, sin construir la lista completa.
+    El archivo resultante es idéntico al de json.dump(lista, indent=indent).
+    Retorna el número de registros escritos.
+    """
+    count = 0
+    pad = " " * indent
+    with open(path, "w", encoding="utf-8") as out_f:
+        for obj in records:
+            out_f.write("[\n" if count == 0 else ",\n")
+            out_f.write(textwrap.indent(json.dumps(obj, ensure_ascii=False, indent=indent), pad))
+            count += 1
+        out_f.write("\n]" if count else "[]")
+    return count
+
+
+def write_ndjson(records, path):
+    """Escribe un objeto JSON por línea. Retorna el número de registros escritos."""
+    count = 0
+    with open(path, "w", encoding="utf-8") as out_f:
+        for obj in records:
+            out_f.write(json.dumps(obj, ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+
+def write_csv(records, path, fieldnames=None):
+    """
+    Escribe los registros en CSV conforme llegan. Si no se indican columnas se
+    toman las llaves del primer registro. Si no hay registros no se crea el archivo.
+    Retorna el número de registros escritos.
+    """
+    records = iter(records)
+    first = next(records, None)
+    if first is None:
+        return 0
+
+    count = 0
+    with open(path, "w", newline="", encoding="utf-8") as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=fieldnames or list(first.keys()), extrasaction="ignore")
+        writer.writeheader()
+        writer.writerow(first)
+        count += 1
+        for row in records:
+            writer.writerow(row)
+            count += 1
+    return count
+
+
+# Partes fijas del libro XLSX (una sola hoja, sin tabla de cadenas compartidas)
+_XLSX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '</Types>'
+)
+_XLSX_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+_XLSX_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{name}" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+_XLSX_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '<Relationship Id="rId2" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+    'Target="styles.xml"/>'
+    '</Relationships>'
+)
+# Estilos: 0 = general, 1 = importe, 2 = fecha, 3 = encabezado en negritas
+_XLSX_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<numFmts count="2">'
+    '<numFmt numFmtId="164" formatCode="#,##0.00"/>'
+    '<numFmt numFmtId="165" formatCode="dd/mm/yyyy"/>'
+    '</numFmts>'
+    '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="4">'
+    '<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="165" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/>'
+    '</cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+# Excel cuenta los días desde el 30/12/1899
+_EXCEL_EPOCH = date(1899, 12, 30).toordinal()
+_XML_INVALID_RE = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def _column_letter(index):
+    """0 -> A, 25 -> Z, 26 -> AA..."""
+    letters = ""
+    index += 1
+    while index:
+        index, rem = divmod(index - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+def parse_amount(value):
+    """Convierte montos (1000.0, "$1,000.00") a número; None si no es un monto."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return value if math.isfinite(value) else None
+    if isinstance(value, str):
+        cleaned = value.replace("$", "").replace(",", "").replace(" ", "")
+        try:
+            number = float(cleaned)
+        except ValueError:
+            return None
+        return number if math.isfinite(number) else None
+    return None
+
+
+def _string_cell(ref, value, style=0):
+    if isinstance(value, (list, tuple)):
+        value = " | ".join(str(v) for v in value)
+    text = escape(_XML_INVALID_RE.sub("", str(value)))
+    style_attr = f' s="{style}"' if style else ""
+    return f'<c r="{ref}" t="inlineStr"{style_attr}><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def write_xlsx(records, path, fieldnames=None, number_fields=(), date_fields=(), date_to_ordinal=None,
+               sheet_name="Transacciones"):
+    """
+    Escribe los registros en un libro XLSX conforme llegan, con memoria constante:
+    la hoja se comprime fila por fila dentro del ZIP y los textos van en línea
+    (sin tabla de cadenas compartidas).
+
+    - number_fields: columnas que se escriben como número con formato de importe
+    - date_fields: columnas que se escriben como fecha si `date_to_ordinal(valor)`
+      regresa un ordinal (date.toordinal); si no, se dejan como texto
+
+    Si no hay registros no se crea el archivo. Retorna el número de registros escritos.
+    """
+    records = iter(records)
+    first = next(records, None)
+    if first is None:
+        return 0
+
+    fieldnames = list(fieldnames or first.keys())
+    columns = [_column_letter(idx) for idx in range(len(fieldnames))]
+    number_fields = set(number_fields)
+    date_fields = set(date_fields) if date_to_ordinal else set()
+
+    def row_xml(row_number, record):
+        cells = []
+        for column, name in zip(columns, fieldnames):
+            value = record.get(name)
+            if value is None or value == "":
+                continue
+            ref = f"{column}{row_number}"
+            if name in number_fields:
+                number = parse_amount(value)
+                if number is not None:
+                    cells.append(f'<c r="{ref}" s="1"><v>{number!r}</v></c>')
+                    continue
+            elif name in date_fields:
+                ordinal = date_to_ordinal(value)
+                if ordinal is not None:
+                    cells.append(f'<c r="{ref}" s="2"><v>{ordinal - _EXCEL_EPOCH}</v></c>')
+                    continue
+            cells.append(_string_cell(ref, value))
+        return f'<row r="{row_number}">{"".join(cells)}</row>'
+
+    count = 0
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as workbook:
+        workbook.writestr("[Content_Types].xml", _XLSX_CONTENT_TYPES)
+        workbook.writestr("_rels/.rels", _XLSX_ROOT_RELS)
+        workbook.writestr("xl/workbook.xml", _XLSX_WORKBOOK.format(name=escape(sheet_name[:31])))
+        workbook.writestr("xl/_rels/workbook.xml.rels", _XLSX_WORKBOOK_RELS)
+        workbook.writestr("xl/styles.xml", _XLSX_STYLES)
+
+        with workbook.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as raw, \
+                io.TextIOWrapper(raw, encoding="utf-8") as sheet:
+            sheet.write(
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                '<sheetViews><sheetView workbookViewId="0">'
+                '<pane ySplit="1" topLeftCell="A2" activePane="bottomLeft" state="frozen"/>'
+                '</sheetView></sheetViews><sheetData>'
+            )
+            header = "".join(_string_cell(f"{c}1", name, style=3) for c, name in zip(columns, fieldnames))
+            sheet.write(f'<row r="1">{header}</row>')
+
+            sheet.write(row_xml(2, first))
+            count += 1
+            for record in records:
+                count += 1
+                sheet.write(row_xml(count + 1, record))
+            sheet.write("</sheetData></worksheet>")
+    return count
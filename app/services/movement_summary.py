@@ -0,0 +1,86 @@
+from datetime import date
+
+import numpy as np
+
+from .exporters import parse_amount
+
+GROUP_BY = ("day", "week", "concept")
+# Columnas de cada parser que se usan para el resumen
+SUMMARY_COLUMNS = {
+    "full": {"fecha": "FECHA_OPER", "concepto": "COD_DESCRIPCION", "cargo": "CARGOS", "abono": "ABONOS", "saldo": "LIQUIDACION"},
+    "partial": {"fecha": "fecha", "concepto": "concepto", "cargo": "cargo", "abono": "abono", "saldo": "saldo"},
+}
+
+
+def summary_fields(parser, group_by):
+    """Campos que debe regresar el parser para agrupar por `group_by`."""
+    columns = SUMMARY_COLUMNS[parser]
+    names = ["cargo", "abono", "saldo"] + (["concepto"] if group_by == "concept" else ["fecha"])
+    return tuple(columns[name] for name in names)
+
+
+def _amounts(values):
+    """Montos como arreglo de float; NaN donde no hay monto."""
+    parsed = (parse_amount(value) for value in values)
+    return np.fromiter((np.nan if v is None else v for v in parsed), dtype=np.float64)
+
+
+def summarize_movements(records, parser, group_by, profile, to_ordinal=None):
+    """
+    Agrega las transacciones por día, semana (inicia en lunes) o tipo de movimiento.
+
+    Por grupo calcula número de movimientos, suma de cargos y abonos y saldo mínimo
+    y máximo, con operaciones vectorizadas de NumPy sobre las columnas. Las filas
+    sin fecha interpretable se agrupan con `grupo` null.
+    """
+    columns = SUMMARY_COLUMNS[parser]
+    records = list(records)
+    if not records:
+        return []
+
+    cargos = np.nan_to_num(_amounts(row.get(columns["cargo"]) for row in records))
+    abonos = np.nan_to_num(_amounts(row.get(columns["abono"]) for row in records))
+    saldos = _amounts(row.get(columns["saldo"]) for row in records)
+    if parser == "full":
+        # El parser completo usa 0 cuando el movimiento no trae saldo
+        saldos[saldos == 0] = np.nan
+
+    if group_by == "concept":
+        # Categoría de la tabla de movimientos del perfil (OTROS si ninguna regla coincide)
+        classify = profile.movements.classify
+        keys = np.array([classify(row.get(columns["concepto"])).category for row in records], dtype=object)
+        labels, inverse = np.unique(keys, return_inverse=True)
+        labels = labels.tolist()
+    else:
+        ordinals = np.fromiter(
+            ((to_ordinal(row.get(columns["fecha"])) if to_ordinal else None) or 0 for row in records),
+            dtype=np.int64
+        )
+        if group_by == "week":
+            # El ordinal 1 (01/01/0001) es lunes
+            ordinals = np.where(ordinals > 0, ordinals - (ordinals - 1) % 7, 0)
+        uniques, inverse = np.unique(ordinals, return_inverse=True)
+        labels = [date.fromordinal(int(o)).isoformat() if o > 0 else None for o in uniques]
+
+    groups = len(labels)
+    counts = np.bincount(inverse, minlength=groups)
+    sum_cargos = np.bincount(inverse, weights=cargos, minlength=groups)
+    sum_abonos = np.bincount(inverse, weights=abonos, minlength=groups)
+    min_saldo = np.full(groups, np.nan)
+    max_saldo = np.full(groups, np.nan)
+    # fmin/fmax ignoran los NaN (movimientos sin saldo)
+    np.fmin.at(min_saldo, inverse, saldos)
+    np.fmax.at(max_saldo, inverse, saldos)
+
+    as_number = lambda value: None if np.isnan(value) else round(float(value), 2)
+    return [
+        {
+            "grupo": labels[i],
+            "movimientos": int(counts[i]),
+            "cargos": round(float(sum_cargos[i]), 2),
+            "abonos": round(float(sum_abonos[i]), 2),
+            "saldo_min": as_number(min_saldo[i]),
+            "saldo_max": as_number(max_saldo[i]),
+        }
+        for i in range(groups)
+    ]
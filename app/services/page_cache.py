@@ -0,0 +1,69 @@
+from collections import OrderedDict
+import hashlib
+import os
+import threading
+
+# Entradas (páginas) a conservar por proceso; 0 desactiva la caché
+PAGE_CACHE_MAX_ENTRIES = int(os.getenv("PAGE_CACHE_MAX_ENTRIES", 5000))
+# Cambiar al modificar la lógica de los parsers para invalidar lo guardado
+PARSER_VERSION = "1"
+
+
+class PageCache:
+    """
+    Caché LRU de fragmentos de análisis por página.
+
+    La llave es un hash del texto extraído de la página más el contexto del que
+    depende su resultado (estado del parser al entrar, líneas vecinas, perfil),
+    así que un estado de cuenta reemitido con una o dos páginas distintas solo
+    vuelve a analizar esas páginas.
+    """
+
+    def __init__(self, max_entries=PAGE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    @staticmethod
+    def key(*parts):
+        digest = hashlib.sha256(PARSER_VERSION.encode())
+        for part in parts:
+            digest.update(b"\x1f")
+            digest.update(part.encode("utf-8") if isinstance(part, str) else repr(part).encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+page_cache = PageCache()
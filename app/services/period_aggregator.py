@@ -0,0 +1,168 @@
+from app.utils.bank_profiles import get_profile
+from app.utils.functions import extract_fields, extract_statement_period, date_to_ordinal
+from .statement_processor import extract_transactions_from_pages, extract_partial_transactions_from_pages
+from .projection import FULL_FIELDS, PARTIAL_FIELDS
+from .workers import pool_map
+from .shared_columns import pack_stream, segment_names, release_segment, SharedColumns
+
+from datetime import date
+from operator import itemgetter
+import heapq
+import pdftotext
+
+# Campo de fecha de operación según el parser utilizado
+DATE_FIELDS = {
+    "full": "FECHA_OPER",
+    "partial": "fecha",
+}
+
+
+def parse_statement_stream(statement):
+    """
+    Procesa un estado de cuenta dentro de un worker y retorna su periodo y
+    la lista [(ordinal, transacción), ...] ordenada por fecha.
+    `statement` es una tupla (nombre_original, ruta_temporal, parser, perfil, campos).
+    """
+    name, pdf_path, parser, profile_name, fields = statement
+    profile = get_profile(profile_name, parser=parser)
+
+    date_field = DATE_FIELDS[parser]
+    parser_fields = None
+    if fields is not None:
+        # Solo los campos del parser que se pidieron, más la fecha para ordenar
+        available = FULL_FIELDS if parser == "full" else PARTIAL_FIELDS
+        parser_fields = tuple(f for f in available if f in fields or f == date_field)
+    elif parser == "partial":
+        parser_fields = tuple(f for f in PARTIAL_FIELDS if f != "raw_lines")
+
+    with open(pdf_path, "rb") as file:
+        pdf = pdftotext.PDF(file, physical=True)
+        # El año solo viene en el encabezado de la primera página
+        period = extract_statement_period(pdf[0]) if len(pdf) else None
+        if period is None:
+            raise ValueError(f"No se encontró el periodo (año) en el encabezado de {name}")
+
+        if parser == "full":
+            rows = [extract_fields(data, profile, parser_fields) for data in extract_transactions_from_pages(pdf, profile)]
+        else:
+            rows = extract_partial_transactions_from_pages(pdf, profile=profile, fields=parser_fields)
+
+    # Las líneas sin fecha legible conservan la posición de la anterior
+    last_ordinal = date(period[0], period[1], 1).toordinal()
+    stream = []
+    is_sorted = True
+    for row in rows:
+        ordinal = date_to_ordinal(row.get(date_field), period)
+        if ordinal is None:
+            ordinal = last_ordinal
+        elif ordinal < last_ordinal:
+            is_sorted = False
+        last_ordinal = ordinal
+        row = {
+            "estado_cuenta": name,
+            "fecha_iso": date.fromordinal(ordinal).isoformat(),
+            **row
+        }
+        if fields is not None:
+            row = {f: row[f] for f in fields}
+        stream.append((ordinal, row))
+
+    if not is_sorted:
+        # sort estable: respeta el orden del PDF para movimientos del mismo día
+        stream.sort(key=itemgetter(0))
+
+    return period, stream
+
+
+def parse_statement_to_segment(task):
+    """
+    Worker: procesa un estado de cuenta y escribe su flujo en el segmento de
+    memoria compartida indicado. Solo regresa (periodo, descriptor) al proceso web.
+    """
+    statement, name = task
+    period, stream = parse_statement_stream(statement)
+    return period, pack_stream(stream, name)
+
+
+class Ledger:
+    """
+    Libro cronológico de varios estados de cuenta. Las filas se leen de los
+    segmentos de memoria compartida (o de la lista local si hubo un solo estado)
+    al recorrerlo; close() libera los segmentos y se puede llamar varias veces.
+    """
+
+    def __init__(self, streams):
+        # `streams` ya viene ordenado por periodo: en empates gana el estado más antiguo
+        self._streams = streams
+
+    def __len__(self):
+        return sum(len(stream) for stream in self._streams)
+
+    @property
+    def fieldnames(self):
+        """Columnas de la primera fila del libro (la que abriría el merge)."""
+        heads = [next(iter(stream)) for stream in self._streams if len(stream)]
+        if not heads:
+            return []
+        # min() conserva el primero en empates, igual que heapq.merge
+        return list(min(heads, key=itemgetter(0))[1].keys())
+
+    def __iter__(self):
+        for _, row in heapq.merge(*self._streams, key=itemgetter(0)):
+            yield row
+
+    def close(self):
+        for stream in self._streams:
+            if isinstance(stream, SharedColumns):
+                stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_ledger(statements, parser="full", profile_name=None, fields=None):
+    """
+    Procesa N estados de cuenta en paralelo y abre el libro combinado.
+    Con más de un estado cada worker deja su resultado en un segmento de
+    memoria compartida; el llamador debe cerrar el libro (o usarlo con `with`).
+    """
+    tasks = [(name, path, parser, profile_name, fields) for name, path in statements]
+    if len(tasks) <= 1:
+        parsed = [parse_statement_stream(task) for task in tasks]
+        parsed.sort(key=itemgetter(0))
+        return Ledger([stream for _, stream in parsed])
+
+    names = segment_names(len(tasks))
+    try:
+        parsed = pool_map(parse_statement_to_segment, list(zip(tasks, names)))
+    except BaseException:
+        # pool_map espera a todos los workers: los segmentos que alcanzaron a crear ya existen
+        for name in names:
+            release_segment(name)
+        raise
+
+    streams = []
+    try:
+        for period, handle in sorted(parsed, key=itemgetter(0)):
+            streams.append((period, SharedColumns(handle)))
+    except BaseException:
+        for _, stream in streams:
+            stream.close()
+        for name in names:
+            release_segment(name)
+        raise
+    return Ledger([stream for _, stream in streams])
+
+
+def aggregate_statements(statements, parser="full", profile_name=None, fields=None):
+    """
+    Procesa N estados de cuenta en paralelo y los combina en un solo libro
+    cronológico con un merge de k vías sobre los flujos ya ordenados.
+    `statements` es una lista de tuplas (nombre_original, ruta_temporal).
+    `fields` limita las columnas del libro (None = todas).
+    """
+    with open_ledger(statements, parser, profile_name, fields) as ledger:
+        return list(ledger)
@@ -0,0 +1,112 @@
+from collections import namedtuple
+from contextlib import ExitStack, contextmanager
+import io
+import os
+import tempfile
+
+import pymupdf
+
+# Páginas máximas que se aceptan; más allá se responde 413 sin analizar
+PREFLIGHT_MAX_PAGES = int(os.getenv("PREFLIGHT_MAX_PAGES", 1000))
+# A partir de cuántas páginas un estado de cuenta va al carril lento
+PREFLIGHT_LARGE_PAGES = int(os.getenv("PREFLIGHT_LARGE_PAGES", 60))
+# Páginas iniciales en las que se busca una capa de texto (fuentes)
+PREFLIGHT_TEXT_PAGES = int(os.getenv("PREFLIGHT_TEXT_PAGES", 3))
+
+PdfInfo = namedtuple("PdfInfo", ("pages", "size", "large"))
+
+
+class PreflightRejected(ValueError):
+    """El PDF no se puede analizar; `status_code` es la respuesta HTTP sugerida."""
+
+    def __init__(self, message, status_code=422):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _memory_buffer(fileobj):
+    """BytesIO con la carga si todavía está en memoria; None si está en disco."""
+    if isinstance(fileobj, tempfile.SpooledTemporaryFile):
+        # Las subidas chicas siguen en memoria hasta que algo las pasa a disco
+        return None if fileobj._rolled else fileobj._file
+    return fileobj if isinstance(fileobj, io.BytesIO) else None
+
+
+@contextmanager
+def _open_pdf(fileobj):
+    """
+    Abre el PDF con PyMuPDF sin copiar la carga.
+
+    Una subida que sigue en memoria se abre sobre su propio buffer (fileno() la
+    pasaría a disco). Una que ya está en disco se abre por su descriptor y MuPDF
+    solo lee lo que necesita (tabla de referencias cruzadas, árbol de páginas).
+    """
+    buffer = _memory_buffer(fileobj)
+    if buffer is not None:
+        view = buffer.getbuffer()
+        try:
+            with pymupdf.open(stream=view, filetype="pdf") as doc:
+                yield doc
+        finally:
+            # Mientras exista la vista el BytesIO no puede crecer ni cerrarse (BufferError)
+            view.release()
+        return
+
+    try:
+        path = f"/dev/fd/{fileobj.fileno()}"
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        path = None
+    if path is not None and os.path.exists(path):
+        with pymupdf.open(path, filetype="pdf") as doc:
+            yield doc
+        return
+    # Sin descriptor ni buffer: se lee completa
+    with pymupdf.open(stream=fileobj.read(), filetype="pdf") as doc:
+        yield doc
+
+
+def preflight_pdf(fileobj):
+    """
+    Revisión rápida del PDF antes de extraer el texto con pdftotext.
+
+    Solo lee el encabezado, la tabla de referencias cruzadas y los recursos de
+    las primeras páginas (sin renderizar nada ni copiar la carga a memoria) para
+    obtener el número de páginas, si está cifrado y si tiene capa de texto. Lanza
+    PreflightRejected si el archivo no se puede analizar; regresa el puntero del
+    archivo al inicio.
+    """
+    fileobj.seek(0)
+    # El encabezado %PDF- debe estar dentro del primer KB
+    head = fileobj.read(1024)
+    size = fileobj.seek(0, os.SEEK_END)
+    fileobj.seek(0)
+    if b"%PDF-" not in head:
+        raise PreflightRejected("El archivo no es un PDF.", 400)
+
+    with ExitStack() as stack:
+        try:
+            doc = stack.enter_context(_open_pdf(fileobj))
+        except Exception:
+            # El mensaje de MuPDF puede incluir la ruta /dev/fd interna; no se expone
+            fileobj.seek(0)
+            raise PreflightRejected("El PDF está dañado o no se puede leer.")
+
+        if doc.needs_pass:
+            raise PreflightRejected("El PDF está protegido con contraseña.")
+        pages = doc.page_count
+        if pages == 0:
+            raise PreflightRejected("El PDF no tiene páginas.")
+        if pages > PREFLIGHT_MAX_PAGES:
+            raise PreflightRejected(
+                f"El PDF tiene {pages} páginas; el máximo es {PREFLIGHT_MAX_PAGES}.", 413
+            )
+        # Un PDF escaneado (solo imágenes) no tiene fuentes: pdftotext no obtendría texto
+        sample = range(min(pages, PREFLIGHT_TEXT_PAGES))
+        if not any(doc.get_page_fonts(page) for page in sample):
+            raise PreflightRejected(
+                "El PDF no tiene texto (parece escaneado); se requiere el estado de cuenta original del banco."
+            )
+
+    # En algunos sistemas /dev/fd comparte la posición con la carga
+    fileobj.seek(0)
+    return PdfInfo(pages, size, pages >= PREFLIGHT_LARGE_PAGES)
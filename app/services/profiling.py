@@ -0,0 +1,146 @@
+from contextvars import ContextVar
+import cProfile
+import glob
+import io
+import marshal
+import os
+import pstats
+import threading
+import uuid
+
+# Token para habilitar el perfilado por petición; sin token el perfilado está deshabilitado
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+PROFILES_DIR = os.getenv("PROFILES_DIR", "temp/profiles")
+# Perfiles que se conservan en disco; al excederse se borran los más antiguos
+PROFILES_MAX_FILES = int(os.getenv("PROFILES_MAX_FILES", 20))
+
+# Perfilador de la petición en curso (visible en el hilo que ejecuta el análisis)
+_active_profiler = ContextVar("request_profiler", default=None)
+
+
+class _MarshaledStats:
+    """Adaptador para cargar en pstats.Stats las estadísticas enviadas por un worker."""
+
+    def __init__(self, data):
+        self.stats = marshal.loads(data)
+
+    def create_stats(self):
+        pass
+
+
+class RequestProfiler:
+    """
+    Perfil determinista (cProfile) de una sola petición.
+
+    `run(fn, ...)` ejecuta la función en el hilo actual con el perfilador activo;
+    el trabajo enviado al pool de procesos con workers.pool_map se perfila dentro
+    de cada worker y se combina aquí. Cada llamada guarda el perfil acumulado en
+    PROFILES_DIR/<profile_id>.pstats.
+    """
+
+    def __init__(self):
+        self.profile_id = uuid.uuid4().hex
+        self.stats = None
+        self._lock = threading.Lock()
+
+    @property
+    def path(self):
+        return profile_path(self.profile_id)
+
+    def run(self, fn, *args, **kwargs):
+        token = _active_profiler.set(self)
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(fn, *args, **kwargs)
+        finally:
+            _active_profiler.reset(token)
+            self._merge(pstats.Stats(profiler))
+            self.save()
+
+    def merge_marshaled(self, data):
+        """Agrega las estadísticas (marshal) de un worker del pool de procesos."""
+        self._merge(pstats.Stats(_MarshaledStats(data)))
+
+    def _merge(self, stats):
+        with self._lock:
+            if self.stats is None:
+                self.stats = stats
+            else:
+                self.stats.add(stats)
+
+    def save(self):
+        with self._lock:
+            if self.stats is None:
+                return
+            os.makedirs(PROFILES_DIR, exist_ok=True)
+            self.stats.dump_stats(self.path)
+        _prune_profiles()
+
+
+class NullRequestProfiler:
+    """Sustituto sin costo cuando la petición no pidió perfilado."""
+    profile_id = None
+
+    def run(self, fn, *args, **kwargs):
+        return fn(*args, **kwargs)
+
+
+def get_active_profiler():
+    return _active_profiler.get()
+
+
+def run_profiled(fn, task):
+    """
+    Ejecuta `fn(task)` dentro de un worker con cProfile y regresa
+    (resultado, estadísticas serializadas con marshal).
+    """
+    profiler = cProfile.Profile()
+    result = profiler.runcall(fn, task)
+    profiler.create_stats()
+    return result, marshal.dumps(profiler.stats)
+
+
+def profile_path(profile_id):
+    return os.path.join(PROFILES_DIR, f"{os.path.basename(profile_id)}.pstats")
+
+
+def profile_summary(profile_id, limit=40, sort="cumulative"):
+    """Texto de pstats con las funciones más costosas del perfil."""
+    stream = io.StringIO()
+    stats = pstats.Stats(profile_path(profile_id), stream=stream)
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+    return stream.getvalue()
+
+
+def _prune_profiles():
+    files = sorted(glob.glob(os.path.join(PROFILES_DIR, "*.pstats")), key=os.path.getmtime)
+    for path in files[:-PROFILES_MAX_FILES] if PROFILES_MAX_FILES > 0 else files:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class ProfileHeaderMiddleware:
+    """
+    Middleware ASGI que agrega `X-Profile-Id` a las respuestas de peticiones
+    perfiladas (la dependencia deja el id en request.state).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_profile(message):
+            if message["type"] == "http.response.start":
+                profile_id = scope.get("state", {}).get("profile_id")
+                if profile_id:
+                    message.setdefault("headers", [])
+                    message["headers"] = list(message["headers"]) + [(b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        await self.app(scope, receive, send_with_profile)
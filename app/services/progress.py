@@ -0,0 +1,181 @@
+import asyncio
+import json
+import os
+import time
+
+# Segundos que se conserva un canal terminado para quien se conecte tarde
+PROGRESS_RETENTION_SECONDS = 60
+# Canales abiertos a la vez por proceso (cada GET /progress con un id nuevo abre uno)
+PROGRESS_MAX_CHANNELS = int(os.getenv("PROGRESS_MAX_CHANNELS", 1000))
+
+
+class ProgressChannel:
+    """
+    Canal de progreso de un análisis, publicado como Server-Sent Events.
+
+    El parser corre en un hilo del threadpool y llama a `page()` y `record()`;
+    esos métodos solo agendan el evento en el event loop (call_soon_threadsafe),
+    de modo que el estado y las colas de los suscriptores solo se tocan desde el loop.
+    """
+
+    def __init__(self, progress_id, loop):
+        self.progress_id = progress_id
+        self.loop = loop
+        self.subscribers = []
+        # Un análisis publica en el canal; sin él, el canal vive mientras haya suscriptores
+        self.has_job = False
+        self.expired = False
+        self.started = time.monotonic()
+        self.state = {
+            "status": "pending",
+            "pages_done": 0,
+            "total_pages": None,
+            "transactions": 0,
+            "elapsed_s": 0.0,
+            "eta_s": None,
+        }
+
+    def __enter__(self):
+        self.started = time.monotonic()
+        self._update({"status": "running", "pages_done": 0, "total_pages": None, "transactions": 0, "eta_s": None})
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is None:
+            self.finish()
+        else:
+            self.finish(error=str(exc))
+        return False
+
+    # --- llamados desde el hilo del parser ---
+
+    def page(self, page_number, total_pages=None):
+        """Callback `on_page`: una página más terminada."""
+        self.loop.call_soon_threadsafe(self._on_page, page_number + 1, total_pages)
+
+    def record(self, record):
+        """Callback `on_record`: una transacción reconocida."""
+        self.loop.call_soon_threadsafe(self._on_record, record)
+
+    def finish(self, error=None):
+        if error:
+            self.loop.call_soon_threadsafe(self._update, {"status": "error", "error": error}, "error")
+        else:
+            self.loop.call_soon_threadsafe(self._update, {"status": "done", "eta_s": 0}, "done")
+
+    # --- event loop ---
+
+    def _on_page(self, pages_done, total_pages):
+        elapsed = time.monotonic() - self.started
+        eta = None
+        if total_pages:
+            eta = round(elapsed / pages_done * (total_pages - pages_done), 2)
+        self._update({"pages_done": pages_done, "total_pages": total_pages, "eta_s": eta})
+
+    def _on_record(self, record):
+        self.state["transactions"] += 1
+        self._deliver("transaction", record, rows_only=True)
+
+    def _update(self, changes, event="progress"):
+        self.state.update(changes)
+        self.state["elapsed_s"] = round(time.monotonic() - self.started, 3)
+        self._deliver(event, dict(self.state))
+        if event in ("done", "error"):
+            self.loop.call_later(PROGRESS_RETENTION_SECONDS, self._expire)
+
+    def _expire(self):
+        self.expired = True
+        progress_registry.discard(self.progress_id, self)
+
+    def _deliver(self, event, data, rows_only=False):
+        for queue, wants_rows in self.subscribers:
+            if rows_only and not wants_rows:
+                continue
+            queue.put_nowait((event, data))
+
+    async def subscribe(self, stream_rows=False):
+        """Genera los eventos SSE hasta que el análisis termina."""
+        queue = asyncio.Queue()
+        subscriber = (queue, stream_rows)
+        self.subscribers.append(subscriber)
+        try:
+            # Estado actual para quien se conecta a mitad del análisis
+            yield format_sse("progress", dict(self.state))
+            if self.state["status"] in ("done", "error"):
+                yield format_sse(self.state["status"], dict(self.state))
+                return
+            while True:
+                event, data = await queue.get()
+                yield format_sse(event, data)
+                if event in ("done", "error"):
+                    return
+        finally:
+            self.subscribers.remove(subscriber)
+            # El último suscriptor se fue: si ningún análisis usa el canal (o ya
+            # pasó su retención) no queda nadie que lo descarte
+            if not self.subscribers and (self.expired or not self.has_job):
+                progress_registry.discard(self.progress_id, self)
+
+
+class NullProgressChannel:
+    """Misma interfaz que ProgressChannel para peticiones sin progress_id."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def page(self, page_number, total_pages=None):
+        pass
+
+    # None en lugar de un método vacío: el parser omite la llamada por transacción
+    record = None
+
+    def finish(self, error=None):
+        pass
+
+
+class ProgressRegistry:
+    """Canales de progreso activos del proceso, por progress_id."""
+
+    def __init__(self, max_channels=PROGRESS_MAX_CHANNELS):
+        self.max_channels = max_channels
+        self.channels = {}
+
+    def get_or_create(self, progress_id, job=False):
+        """
+        Canal del progress_id, o None si hay que abrir uno nuevo y ya hay
+        `max_channels` abiertos. Con `job=True` lo usa un análisis.
+        """
+        channel = self.channels.get(progress_id)
+        if channel is None:
+            if len(self.channels) >= self.max_channels:
+                return None
+            channel = ProgressChannel(progress_id, asyncio.get_running_loop())
+            self.channels[progress_id] = channel
+        if job:
+            channel.has_job = True
+        return channel
+
+    def discard(self, progress_id, channel):
+        if self.channels.get(progress_id) is channel and not channel.subscribers:
+            del self.channels[progress_id]
+
+
+def format_sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+progress_registry = ProgressRegistry()
+
+
+def get_progress_channel(progress_id):
+    """
+    Canal de progreso de la petición; sin progress_id (o sin lugar para abrir
+    otro canal) no se publica nada y el análisis sigue igual.
+    """
+    channel = progress_registry.get_or_create(progress_id, job=True) if progress_id else None
+    if channel is None:
+        return NullProgressChannel()
+    return channel
@@ -0,0 +1,47 @@
+# Campos que puede regresar cada parser, en el orden en que se emiten por defecto
+FULL_FIELDS = (
+    "FECHA_OPER", "FECHA_LIQ", "COD_DESCRIPCION", "CARGOS", "ABONOS",
+    "OPERACION", "LIQUIDACION", "NUMERO_CONTROL",
+)
+PARTIAL_FIELDS = ("fecha", "concepto", "folio", "cargo", "abono", "saldo", "raw_lines", "numero_control")
+VOUCHER_FIELDS = ("archivo", "numero_control", "monto", "fecha", "error")
+# Columnas que agrega /aggregate-statements antes de las del parser
+PERIOD_FIELDS = ("estado_cuenta", "fecha_iso")
+# Columnas que se exportan como importe o como fecha en XLSX
+AMOUNT_FIELDS = ("CARGOS", "ABONOS", "OPERACION", "LIQUIDACION", "cargo", "abono", "saldo", "monto")
+DATE_VALUE_FIELDS = ("FECHA_OPER", "FECHA_LIQ", "fecha")
+
+
+def parse_fields(value, available, default=None):
+    """
+    Convierte el parámetro `fields` ("fecha,abono,saldo") en una tupla de campos.
+    Si no se especifica regresa `default` (o todos los disponibles).
+    Lanza ValueError si algún campo no existe para el endpoint.
+    """
+    if value is None or not value.strip():
+        return tuple(default if default is not None else available)
+
+    fields = []
+    for name in value.split(","):
+        name = name.strip()
+        if not name or name in fields:
+            continue
+        if name not in available:
+            raise ValueError(f"Campo '{name}' no disponible. Campos válidos: {', '.join(available)}")
+        fields.append(name)
+    if not fields:
+        raise ValueError("El parámetro fields no contiene campos.")
+    return tuple(fields)
+
+
+def project(record, fields):
+    """Regresa solo los campos solicitados del registro, en el orden pedido."""
+    if fields is None:
+        return record
+    return {name: record.get(name) for name in fields}
+
+
+def iter_projected(records, fields):
+    """Versión en streaming de project para listas o generadores de registros."""
+    for record in records:
+        yield project(record, fields)
@@ -0,0 +1,86 @@
+from collections import OrderedDict
+import os
+import threading
+import time
+import uuid
+
+# Segundos sin consultas tras los cuales se descarta un resultado
+RESULT_TTL_SECONDS = int(os.getenv("RESULT_TTL_SECONDS", 600))
+# Resultados retenidos por proceso; al excederse se descarta el menos reciente
+RESULT_STORE_MAX_ENTRIES = int(os.getenv("RESULT_STORE_MAX_ENTRIES", 32))
+
+
+class ResultStore:
+    """
+    Resultados de análisis retenidos por poco tiempo para paginarlos sin volver
+    a subir ni analizar el PDF. Cada consulta renueva el plazo del resultado.
+    """
+
+    def __init__(self, ttl=RESULT_TTL_SECONDS, max_entries=RESULT_STORE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, records, meta=None):
+        """Guarda la lista de registros y retorna su result_id."""
+        result_id = uuid.uuid4().hex
+        with self._lock:
+            self._purge()
+            self._entries[result_id] = {
+                "records": records,
+                "meta": meta or {},
+                "expires": time.monotonic() + self.ttl,
+            }
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return result_id
+
+    def page(self, result_id, offset=0, limit=100):
+        """
+        Retorna (registros[offset:offset + limit], total, meta) o None si el
+        resultado no existe o ya expiró.
+        """
+        with self._lock:
+            self._purge()
+            entry = self._entries.get(result_id)
+            if entry is None:
+                return None
+            entry["expires"] = time.monotonic() + self.ttl
+            self._entries.move_to_end(result_id)
+            records = entry["records"]
+            return records[offset:offset + limit], len(records), entry["meta"]
+
+    def get(self, result_id):
+        """Retorna (registros, meta) completos o None si no existe o ya expiró."""
+        with self._lock:
+            self._purge()
+            entry = self._entries.get(result_id)
+            if entry is None:
+                return None
+            entry["expires"] = time.monotonic() + self.ttl
+            self._entries.move_to_end(result_id)
+            return entry["records"], entry["meta"]
+
+    def exists(self, result_id):
+        """Indica si el resultado sigue disponible (renueva su plazo)."""
+        with self._lock:
+            self._purge()
+            entry = self._entries.get(result_id)
+            if entry is None:
+                return False
+            entry["expires"] = time.monotonic() + self.ttl
+            return True
+
+    def discard(self, result_id):
+        with self._lock:
+            return self._entries.pop(result_id, None) is not None
+
+    def _purge(self):
+        now = time.monotonic()
+        expired = [key for key, entry in self._entries.items() if entry["expires"] <= now]
+        for key in expired:
+            del self._entries[key]
+
+
+result_store = ResultStore()
@@ -0,0 +1,362 @@
+"""
+Modo sombra: corre un motor de análisis alterno junto al actual sin afectar la respuesta.
+
+En una muestra configurable de las peticiones, después de responder se envía
+una copia del PDF al pool de procesos, donde se analiza con el motor actual
+("legacy", exactamente lo que regresan extract_fields y los ciclos del parser
+parcial) y con el motor alterno. Se comparan campo por campo y se registran las
+diferencias y la latencia de cada motor por endpoint (GET /admin/shadow), para
+decidir con evidencia en qué endpoints se puede cambiar de motor.
+"""
+from collections import Counter, deque
+import os
+import random
+import shutil
+import threading
+import time
+import uuid
+
+import pymupdf
+
+from app.utils.bank_profiles import get_profile
+from app.utils.functions import extract_fields
+from app.utils.log import get_logger
+from .statement_processor import (
+    extract_transactions_from_pages,
+    iter_page_lines,
+    iter_partial_transactions,
+    iter_statement_records,
+    stream_partial_transactions,
+)
+from .workers import get_process_pool
+
+logger = get_logger(__name__)
+
+# Fracción de peticiones que se analizan en sombra (0 = desactivado)
+SHADOW_SAMPLE_RATE = float(os.getenv("SHADOW_SAMPLE_RATE", 0))
+# Fracción por endpoint: "extract-partial-csv=0.5,download-csv=0.1" (reemplaza a la general)
+SHADOW_SAMPLE_RATES = os.getenv("SHADOW_SAMPLE_RATES", "")
+# Motor alterno a evaluar
+SHADOW_ENGINE = os.getenv("SHADOW_ENGINE", "pymupdf")
+# Análisis en sombra pendientes como máximo; los demás se descartan
+SHADOW_MAX_PENDING = int(os.getenv("SHADOW_MAX_PENDING", 2))
+# Diferencias de ejemplo y latencias que se conservan por endpoint
+SHADOW_MISMATCH_SAMPLES = 20
+SHADOW_LATENCY_SAMPLES = 500
+# Tolerancia vertical (puntos) para considerar dos palabras en el mismo renglón
+LINE_TOLERANCE = 2.0
+
+
+def parse_rates(spec):
+    """Convierte "endpoint1=0.5,endpoint2=0.1" en {"endpoint1": 0.5, "endpoint2": 0.1}."""
+    rates = {}
+    for item in spec.split(","):
+        if "=" in item:
+            endpoint, rate = item.rsplit("=", 1)
+            rates[endpoint.strip()] = min(max(float(rate), 0.0), 1.0)
+    return rates
+
+
+# --- motores (corren dentro de los workers) ---
+
+def legacy_engine(pdf_path, parser, profile, fields):
+    """Motor actual: pdftotext + parsers, sin cachés (para medir su latencia real)."""
+    if parser == "full":
+        return list(iter_statement_records(pdf_path, profile=profile, fields=fields))
+    return list(stream_partial_transactions(pdf_path, profile=profile, fields=fields))
+
+
+def pymupdf_page_text(page):
+    """
+    Texto de la página en modo físico armado con las palabras de PyMuPDF: cada
+    renglón conserva la columna aproximada de cada palabra, como `pdftotext -layout`.
+    """
+    words = page.get_text("words")
+    if not words:
+        return ""
+    char_width = sum(w[2] - w[0] for w in words) / max(sum(len(w[4]) for w in words), 1)
+
+    rows = []
+    for x0, _, x1, y1, text, *_ in sorted(words, key=lambda w: (w[3], w[0])):
+        if rows and y1 - rows[-1][0] <= LINE_TOLERANCE:
+            rows[-1][1].append((x0, x1, text))
+        else:
+            rows.append((y1, [(x0, x1, text)]))
+
+    lines = []
+    for _, row in rows:
+        line = ""
+        prev_x1 = None
+        for x0, x1, text in sorted(row):
+            if prev_x1 is not None and x0 - prev_x1 < 1.5 * char_width:
+                # Palabras de una misma frase: un solo espacio
+                line += " " + text
+            else:
+                column = int(round(x0 / char_width))
+                line += " " * max(column - len(line), 1 if line else 0) + text
+            prev_x1 = x1
+        lines.append(line)
+    return "\n".join(lines) + "\n"
+
+
+def pymupdf_engine(pdf_path, parser, profile, fields):
+    """Motor alterno: texto de PyMuPDF (sin poppler) con los mismos parsers."""
+    with pymupdf.open(pdf_path) as doc:
+        pages = [pymupdf_page_text(page) for page in doc]
+    if parser == "full":
+        return [extract_fields(data, profile, fields) for data in extract_transactions_from_pages(pages, profile)]
+    return list(iter_partial_transactions(iter_page_lines(pages), profile=profile, fields=fields))
+
+
+ENGINES = {
+    "legacy": legacy_engine,
+    "pymupdf": pymupdf_engine,
+}
+
+
+def register_engine(name, fn):
+    """
+    Registra un motor `fn(pdf_path, parser, profile, fields) -> [registros]`.
+    Debe ser una función de módulo para poder enviarse al pool de procesos.
+    """
+    ENGINES[name] = fn
+
+
+_MISSING = object()
+
+
+def compare_records(legacy, candidate):
+    """
+    Compara los registros en orden, campo por campo.
+    Retorna [(índice, campo, valor_legacy, valor_alterno), ...]; un registro que
+    solo existe en uno de los motores se reporta con el campo "__row__".
+    """
+    mismatches = []
+    for index in range(max(len(legacy), len(candidate))):
+        old = legacy[index] if index < len(legacy) else None
+        new = candidate[index] if index < len(candidate) else None
+        if old is None or new is None:
+            mismatches.append((index, "__row__", old, new))
+            continue
+        for field in dict.fromkeys([*old, *new]):
+            old_value = old.get(field, _MISSING)
+            new_value = new.get(field, _MISSING)
+            if old_value != new_value:
+                mismatches.append((
+                    index, field,
+                    None if old_value is _MISSING else old_value,
+                    None if new_value is _MISSING else new_value,
+                ))
+    return mismatches
+
+
+def run_shadow_job(job):
+    """
+    Worker: analiza el PDF con ambos motores y regresa solo el resumen de la
+    comparación (no los registros). Elimina la copia del PDF al terminar.
+    """
+    engine, pdf_path, parser, profile_name, fields = job
+    try:
+        profile = get_profile(profile_name, parser=parser)
+        start = time.perf_counter()
+        legacy = legacy_engine(pdf_path, parser, profile, fields)
+        legacy_s = time.perf_counter() - start
+        start = time.perf_counter()
+        candidate = ENGINES[engine](pdf_path, parser, profile, fields)
+        candidate_s = time.perf_counter() - start
+    finally:
+        _remove(pdf_path)
+
+    mismatches = compare_records(legacy, candidate)
+    return {
+        "legacy_s": legacy_s,
+        "candidate_s": candidate_s,
+        "legacy_rows": len(legacy),
+        "candidate_rows": len(candidate),
+        "mismatches": len(mismatches),
+        "fields": Counter(field for _, field, _, _ in mismatches),
+        "samples": mismatches[:SHADOW_MISMATCH_SAMPLES],
+    }
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+
+class ShadowRecorder:
+    """Resultados acumulados del modo sombra por endpoint (en el proceso web)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def _stats(self, endpoint):
+        stats = self._endpoints.get(endpoint)
+        if stats is None:
+            stats = self._endpoints[endpoint] = {
+                "runs": 0, "matches": 0, "mismatched_runs": 0, "errors": 0, "dropped": 0,
+                "field_mismatches": Counter(), "legacy_s": 0.0, "candidate_s": 0.0,
+                "deltas": deque(maxlen=SHADOW_LATENCY_SAMPLES),
+                "samples": deque(maxlen=SHADOW_MISMATCH_SAMPLES), "last_error": None,
+            }
+        return stats
+
+    def record(self, endpoint, engine, result):
+        with self._lock:
+            stats = self._stats(endpoint)
+            stats["engine"] = engine
+            stats["runs"] += 1
+            stats["legacy_s"] += result["legacy_s"]
+            stats["candidate_s"] += result["candidate_s"]
+            stats["deltas"].append(result["candidate_s"] - result["legacy_s"])
+            if result["mismatches"]:
+                stats["mismatched_runs"] += 1
+                stats["field_mismatches"].update(result["fields"])
+                stats["samples"].extend(
+                    {"row": index, "field": field, "legacy": old, "candidate": new}
+                    for index, field, old, new in result["samples"]
+                )
+            else:
+                stats["matches"] += 1
+
+    def error(self, endpoint, message):
+        with self._lock:
+            stats = self._stats(endpoint)
+            stats["errors"] += 1
+            stats["last_error"] = message
+
+    def dropped(self, endpoint):
+        with self._lock:
+            self._stats(endpoint)["dropped"] += 1
+
+    def report(self):
+        """Resumen por endpoint: coincidencias, campos con diferencias y latencias en ms."""
+        with self._lock:
+            report = {}
+            for endpoint, stats in self._endpoints.items():
+                runs = stats["runs"]
+                deltas = list(stats["deltas"])
+                report[endpoint] = {
+                    "engine": stats.get("engine"),
+                    "runs": runs,
+                    "matches": stats["matches"],
+                    "mismatched_runs": stats["mismatched_runs"],
+                    "match_rate": round(stats["matches"] / runs, 4) if runs else None,
+                    "errors": stats["errors"],
+                    "dropped": stats["dropped"],
+                    "field_mismatches": dict(stats["field_mismatches"].most_common()),
+                    "legacy_ms_avg": round(stats["legacy_s"] / runs * 1000, 2) if runs else None,
+                    "candidate_ms_avg": round(stats["candidate_s"] / runs * 1000, 2) if runs else None,
+                    "delta_ms_p50": round(_percentile(deltas, 0.5) * 1000, 2) if deltas else None,
+                    "delta_ms_p95": round(_percentile(deltas, 0.95) * 1000, 2) if deltas else None,
+                    "samples": list(stats["samples"]),
+                    "last_error": stats["last_error"],
+                }
+            return report
+
+    def clear(self):
+        with self._lock:
+            self._endpoints.clear()
+
+
+class ShadowRunner:
+    """
+    Decide qué peticiones van a sombra y envía los análisis al pool de procesos.
+    Nunca bloquea ni falla la petición: si hay demasiados pendientes se descarta.
+    """
+
+    def __init__(self, rate=SHADOW_SAMPLE_RATE, rates=None, engine=SHADOW_ENGINE, max_pending=SHADOW_MAX_PENDING):
+        self.rate = rate
+        self.rates = rates if rates is not None else parse_rates(SHADOW_SAMPLE_RATES)
+        self.engine = engine
+        self.max_pending = max_pending
+        self.recorder = ShadowRecorder()
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def sampled(self, endpoint):
+        rate = self.rates.get(endpoint, self.rate)
+        return rate > 0 and random.random() < rate
+
+    def schedule(self, background_tasks, endpoint, pdf_path, parser, profile, fields):
+        """
+        Si la petición cae en la muestra, agrega a `background_tasks` el envío a
+        sombra (copia del PDF y envío al pool), que corre en el threadpool después
+        de responder. Debe llamarse antes de programar la eliminación de `pdf_path`.
+        Retorna True si se programó.
+        """
+        if not self.sampled(endpoint):
+            return False
+        background_tasks.add_task(self.submit, endpoint, pdf_path, parser, profile, fields)
+        return True
+
+    def submit(self, endpoint, pdf_path, parser, profile, fields):
+        """Copia el PDF y lo envía al pool de procesos. Retorna True si se envió."""
+        if self.engine not in ENGINES:
+            self.recorder.error(endpoint, f"Motor desconocido: {self.engine}")
+            return False
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.recorder.dropped(endpoint)
+                return False
+            self._pending += 1
+
+        # Copia propia: el PDF de la petición se elimina al terminar la respuesta
+        shadow_path = f"temp/shadow_{uuid.uuid4().hex}.pdf"
+        try:
+            try:
+                os.link(pdf_path, shadow_path)
+            except OSError:
+                shutil.copyfile(pdf_path, shadow_path)
+            job = (self.engine, shadow_path, parser, profile.name, tuple(fields) if fields is not None else None)
+            future = get_process_pool().submit(run_shadow_job, job)
+        except Exception as e:
+            _remove(shadow_path)
+            self._done()
+            self.recorder.error(endpoint, str(e))
+            return False
+        future.add_done_callback(lambda f: self._collect(f, endpoint, job))
+        return True
+
+    def _done(self):
+        with self._lock:
+            self._pending -= 1
+
+    def _collect(self, future, endpoint, job):
+        self._done()
+        if future.cancelled():
+            _remove(job[1])
+            return
+        error = future.exception()
+        if error is not None:
+            self.recorder.error(endpoint, str(error))
+            logger.warning("Error en análisis en sombra", extra={"fields": {"endpoint": endpoint, "error": str(error)}})
+            return
+        result = future.result()
+        self.recorder.record(endpoint, job[0], result)
+        if result["mismatches"]:
+            logger.warning("Diferencias en análisis en sombra", extra={"fields": {
+                "endpoint": endpoint, "engine": job[0], "mismatches": result["mismatches"],
+                "fields": dict(result["fields"]), "legacy_rows": result["legacy_rows"],
+                "candidate_rows": result["candidate_rows"],
+            }})
+
+    def report(self):
+        return {
+            "engine": self.engine,
+            "sample_rate": self.rate,
+            "sample_rates": self.rates,
+            "pending": self._pending,
+            "endpoints": self.recorder.report(),
+        }
+
+
+shadow_runner = ShadowRunner()
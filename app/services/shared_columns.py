@@ -0,0 +1,259 @@
+"""
+Transporte columnar de resultados entre los workers y el proceso web por memoria compartida.
+
+El worker escribe las filas en un segmento de `multiprocessing.shared_memory` y
+solo regresa un descriptor pequeño (nombre del segmento y posición de cada
+columna), en lugar de serializar con pickle miles de dicts. El proceso web lee
+los valores directamente del segmento al escribir la respuesta.
+
+Codificación por columna (cada una con un arreglo de etiquetas uint8):
+- number: importes como centavos enteros (int64); se conserva si era int o float
+- date: fechas ISO (aaaa-mm-dd) como ordinales (int32)
+- text: textos en un solo buffer UTF-8 con offsets (int64); las listas de
+  textos (raw_lines) se unen con un separador y los demás valores van como JSON
+
+El proceso web es dueño del segmento: lo libera (unlink) al cerrar el
+resultado. Los nombres se generan en el proceso web para poder liberarlos
+aunque el worker falle antes de regresar el descriptor.
+"""
+from array import array
+from datetime import date
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+import json
+import math
+import uuid
+
+SEGMENT_PREFIX = "bmcols"
+
+TAG_NONE, TAG_INT, TAG_FLOAT, TAG_STR, TAG_LIST, TAG_JSON, TAG_MISSING = range(7)
+LIST_SEPARATOR = "\x1e"
+# Enteros que caben en int64 como centavos sin perder precisión
+_MAX_INT = 2 ** 53
+_MISSING = object()
+
+
+def segment_names(count):
+    """Nombres únicos para los segmentos de una petición."""
+    token = uuid.uuid4().hex[:16]
+    return [f"{SEGMENT_PREFIX}_{token}_{i}" for i in range(count)]
+
+
+def _encode_number(values):
+    tags = array("B", bytes(len(values)))
+    cents = array("q", bytes(8 * len(values)))
+    for i, value in enumerate(values):
+        if value is None:
+            tags[i] = TAG_NONE
+        elif value is _MISSING:
+            tags[i] = TAG_MISSING
+        elif isinstance(value, bool) or not isinstance(value, (int, float)):
+            return None
+        elif isinstance(value, int):
+            if abs(value) >= _MAX_INT:
+                return None
+            tags[i] = TAG_INT
+            cents[i] = value * 100
+        else:
+            if not math.isfinite(value) or abs(value) >= _MAX_INT:
+                return None
+            rounded = round(value * 100)
+            if rounded / 100 != value:
+                # Más de dos decimales: no es un importe
+                return None
+            tags[i] = TAG_FLOAT
+            cents[i] = rounded
+    return tags, cents
+
+
+def _iso_ordinal(value):
+    if not isinstance(value, str) or len(value) != 10:
+        return None
+    try:
+        parsed = date.fromisoformat(value)
+    except ValueError:
+        return None
+    return parsed.toordinal() if parsed.isoformat() == value else None
+
+
+def _encode_date(values):
+    tags = array("B", bytes(len(values)))
+    ordinals = array("i", bytes(4 * len(values)))
+    for i, value in enumerate(values):
+        if value is None:
+            tags[i] = TAG_NONE
+        elif value is _MISSING:
+            tags[i] = TAG_MISSING
+        else:
+            ordinal = _iso_ordinal(value)
+            if ordinal is None:
+                return None
+            tags[i] = TAG_STR
+            ordinals[i] = ordinal
+    return tags, ordinals
+
+
+def _encode_text(values):
+    tags = array("B", bytes(len(values)))
+    offsets = array("q", bytes(8 * (len(values) + 1)))
+    parts = []
+    position = 0
+    for i, value in enumerate(values):
+        if value is None:
+            tags[i] = TAG_NONE
+            encoded = b""
+        elif value is _MISSING:
+            tags[i] = TAG_MISSING
+            encoded = b""
+        elif isinstance(value, str):
+            tags[i] = TAG_STR
+            encoded = value.encode("utf-8")
+        elif (isinstance(value, list) and value and all(isinstance(v, str) for v in value)
+              and not any(LIST_SEPARATOR in v for v in value)):
+            tags[i] = TAG_LIST
+            encoded = LIST_SEPARATOR.join(value).encode("utf-8")
+        else:
+            tags[i] = TAG_JSON
+            encoded = json.dumps(value, ensure_ascii=False).encode("utf-8")
+        parts.append(encoded)
+        position += len(encoded)
+        offsets[i + 1] = position
+    return tags, offsets, b"".join(parts)
+
+
+def _encode_column(values):
+    """Elige la codificación más compacta que conserva los valores exactos."""
+    number = _encode_number(values)
+    if number is not None:
+        return "number", number
+    dates = _encode_date(values)
+    if dates is not None:
+        return "date", dates
+    return "text", _encode_text(values)
+
+
+def pack_stream(stream, name):
+    """
+    Escribe `stream` ([(ordinal, fila), ...]) en el segmento `name` y retorna su
+    descriptor. Se llama dentro del worker; el segmento queda a cargo del proceso web.
+    """
+    columns = []
+    for _, row in stream:
+        for key in row:
+            if key not in columns:
+                columns.append(key)
+
+    blocks = [array("q", (ordinal for ordinal, _ in stream))]
+    layout = []
+    for column in columns:
+        kind, arrays = _encode_column([row.get(column, _MISSING) for _, row in stream])
+        layout.append((column, kind, len(blocks)))
+        blocks.extend(arrays)
+
+    # Cada bloque inicia alineado a 8 bytes
+    offsets = []
+    size = 0
+    for block in blocks:
+        offsets.append(size)
+        nbytes = len(block) * block.itemsize if isinstance(block, array) else len(block)
+        size += (nbytes + 7) & ~7
+
+    shm = SharedMemory(name=name, create=True, size=max(size, 1))
+    try:
+        for block, offset in zip(blocks, offsets):
+            data = block.tobytes() if isinstance(block, array) else block
+            shm.buf[offset:offset + len(data)] = data
+    finally:
+        shm.close()
+    # El proceso web libera el segmento; el worker no debe reclamarlo al terminar
+    resource_tracker.unregister(shm._name, "shared_memory")
+
+    spans = []
+    for block, offset in zip(blocks, offsets):
+        nbytes = len(block) * block.itemsize if isinstance(block, array) else len(block)
+        spans.append((offset, nbytes, block.typecode if isinstance(block, array) else None))
+    return {"name": name, "rows": len(stream), "columns": layout, "blocks": spans}
+
+
+class SharedColumns:
+    """
+    Resultado columnar abierto en el proceso web. Los valores se leen del
+    segmento al recorrer las filas; close() libera el segmento (idempotente).
+    """
+
+    def __init__(self, handle):
+        self.name = handle["name"]
+        self.rows = handle["rows"]
+        self.columns = handle["columns"]
+        self._shm = SharedMemory(name=self.name)
+        self._slices = [self._shm.buf[offset:offset + nbytes] for offset, nbytes, _ in handle["blocks"]]
+        self._views = [
+            view.cast(typecode) if typecode else view
+            for view, (_, _, typecode) in zip(self._slices, handle["blocks"])
+        ]
+
+    @property
+    def fieldnames(self):
+        return [column for column, _, _ in self.columns]
+
+    @property
+    def ordinals(self):
+        return self._views[0]
+
+    def row(self, i):
+        """Reconstruye la fila `i` leyendo cada columna del segmento."""
+        views = self._views
+        row = {}
+        for column, kind, index in self.columns:
+            tag = views[index][i]
+            if tag == TAG_MISSING:
+                continue
+            if tag == TAG_NONE:
+                row[column] = None
+            elif kind == "number":
+                cents = views[index + 1][i]
+                row[column] = cents // 100 if tag == TAG_INT else cents / 100
+            elif kind == "date":
+                row[column] = date.fromordinal(views[index + 1][i]).isoformat()
+            else:
+                offsets = views[index + 1]
+                text = str(views[index + 2][offsets[i]:offsets[i + 1]], "utf-8")
+                if tag == TAG_LIST:
+                    row[column] = text.split(LIST_SEPARATOR)
+                elif tag == TAG_JSON:
+                    row[column] = json.loads(text)
+                else:
+                    row[column] = text
+        return row
+
+    def __len__(self):
+        return self.rows
+
+    def __iter__(self):
+        ordinals = self.ordinals
+        for i in range(self.rows):
+            yield ordinals[i], self.row(i)
+
+    def close(self):
+        if self._shm is None:
+            return
+        # Las vistas deben soltarse antes de cerrar el segmento
+        for view in self._views + self._slices:
+            view.release()
+        self._views = self._slices = []
+        try:
+            self._shm.close()
+            self._shm.unlink()
+        except FileNotFoundError:
+            pass
+        self._shm = None
+
+
+def release_segment(name):
+    """Libera un segmento por nombre si sigue existiendo (limpieza tras un error)."""
+    try:
+        shm = SharedMemory(name=name)
+    except FileNotFoundError:
+        return
+    shm.close()
+    shm.unlink()
@@ -0,0 +1,112 @@
+import asyncio
+import os
+import threading
+
+from .cancellation import RequestCancelled, until_cancelled
+
+
+# 0 desactiva el agrupamiento (p. ej. para medir el análisis en frío con app.loadtest)
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "1") != "0"
+
+
+class _Call:
+    __slots__ = ("future", "holders", "cleanup")
+
+    def __init__(self, future, cleanup):
+        self.future = future
+        self.holders = 1
+        self.cleanup = cleanup
+
+
+class SingleFlight:
+    """
+    Agrupa peticiones idénticas simultáneas (doble clic, dos personas subiendo el
+    mismo estado de cuenta): la primera hace el trabajo y las demás esperan el
+    mismo futuro en lugar de volver a extraer y analizar el PDF.
+
+    Los archivos que produce el trabajo se comparten entre todas las peticiones
+    agrupadas; `cleanup(resultado)` se ejecuta cuando la última los libera.
+    """
+
+    def __init__(self, enabled=SINGLE_FLIGHT_ENABLED):
+        self.enabled = enabled
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    async def run(self, key, fn, *args, cleanup=None, cancel=None):
+        """
+        Ejecuta `await fn(*args)` una sola vez por clave a la vez.
+        Retorna (resultado, release); `release()` se llama cuando la petición ya
+        no necesita el resultado (p. ej. después de enviar el archivo).
+
+        Con `cancel` (CancellationToken) una petición agrupada deja de esperar
+        si se cancela, sin detener el trabajo de las demás. Con `key=None` la
+        petición no se agrupa con ninguna otra.
+        """
+        if not self.enabled:
+            key = None
+        while key is not None:
+            call = self._calls.get(key)
+            if call is None:
+                break
+            with self._lock:
+                call.holders += 1
+                self.coalesced += 1
+            try:
+                result = await until_cancelled(asyncio.shield(call.future), cancel)
+            except asyncio.CancelledError:
+                if not call.future.cancelled():
+                    # La cancelación es de esta petición, no del trabajo compartido
+                    call.future.add_done_callback(lambda _: self._releaser(call)())
+                    raise
+                # Se canceló la petición que hacía el trabajo: se vuelve a intentar
+                continue
+            except RequestCancelled:
+                if not call.future.done():
+                    call.future.add_done_callback(lambda _: self._releaser(call)())
+                    raise
+                # La petición que hacía el trabajo se desconectó o venció su plazo
+                continue
+            return result, self._releaser(call)
+
+        call = _Call(asyncio.get_running_loop().create_future(), cleanup)
+        if key is not None:
+            self._calls[key] = call
+        try:
+            result = await fn(*args)
+        except asyncio.CancelledError:
+            call.future.cancel()
+            raise
+        except BaseException as e:
+            call.future.set_exception(e)
+            # Evita el aviso de "excepción nunca recuperada" si nadie más esperaba
+            call.future.exception()
+            raise
+        else:
+            call.future.set_result(result)
+            return result, self._releaser(call)
+        finally:
+            if key is not None:
+                self._calls.pop(key, None)
+
+    def _releaser(self, call):
+        released = []
+
+        def release():
+            # Las tareas en segundo plano pueden correr en el threadpool
+            with self._lock:
+                if released:
+                    return
+                released.append(True)
+                call.holders -= 1
+                last = call.holders == 0
+            if last and call.cleanup and not call.future.cancelled() and call.future.exception() is None:
+                call.cleanup(call.future.result())
+        return release
+
+    def in_flight(self):
+        return len(self._calls)
+
+
+single_flight = SingleFlight()
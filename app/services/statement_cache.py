@@ -0,0 +1,120 @@
+import hashlib
+import os
+import re
+
+from app.utils.utils import statement_period_re
+from app.utils.functions import extract_statement_period
+from .page_cache import PageCache
+
+# Estados de cuenta completos a conservar por proceso; 0 desactiva la caché
+STATEMENT_CACHE_MAX_ENTRIES = int(os.getenv("STATEMENT_CACHE_MAX_ENTRIES", 128))
+# Páginas iniciales en las que se buscan el número de cuenta y el periodo
+FINGERPRINT_PAGES = int(os.getenv("FINGERPRINT_PAGES", 2))
+
+# Fecha y hora en que el portal generó el PDF, sola en su línea: "05/03/2024 - 10:42:01"
+generation_stamp_re = re.compile(r"\d{2}/\d{2}/\d{4} - \d{2}:\d{2}(:\d{2})?")
+
+
+def is_generation_stamp(line):
+    """
+    Línea con la fecha y hora en que el portal generó el PDF ("05/03/2024 - 10:42").
+    Cambia en cada descarga, así que no forma parte de la huella.
+    """
+    return generation_stamp_re.fullmatch(line.strip()) is not None
+
+
+def movement_lines(page, profile, first_page=False):
+    """
+    Líneas de la página normalizadas (espacios), sin encabezados ignorados ni,
+    en la primera página, la hora de generación.
+    """
+    for line in page.split("\n"):
+        line = " ".join(line.split())
+        if line and not profile.ignores(line) and not (first_page and is_generation_stamp(line)):
+            yield line
+
+
+def statement_fingerprint(pages, profile):
+    """
+    Huella semántica del estado de cuenta: número de cuenta, periodo, número de
+    páginas y hash de las líneas de movimientos de todas las páginas. Dos
+    descargas del mismo estado (bytes distintos, misma información) tienen la
+    misma huella; cualquier movimiento distinto, en cualquier página, la cambia.
+
+    El número de cuenta y el periodo se buscan en las primeras FINGERPRINT_PAGES
+    páginas. Retorna None si no se encuentran; sin ellos no es seguro reutilizar
+    un resultado.
+
+    Lee el texto de todas las páginas: `pages` debe ser la lista ya renderizada
+    que después recibe el parser, para no extraer cada página dos veces.
+    """
+    total_pages = len(pages)
+    if not total_pages:
+        return None
+
+    account = None
+    period = None
+    digest = hashlib.sha256()
+    for index, text in enumerate(pages):
+        if index == 0:
+            match = statement_period_re.search(text)
+            if match:
+                period = "/".join(group.upper() for group in match.groups())
+            else:
+                period = extract_statement_period(text)
+        if account is None and index < FINGERPRINT_PAGES:
+            account = profile.find_account(text)
+        if index + 1 == FINGERPRINT_PAGES and (not account or not period):
+            return None
+        digest.update(f"\x1epage {index}\x1e".encode())
+        for line in movement_lines(text, profile, first_page=index == 0):
+            digest.update(line.encode("utf-8"))
+            digest.update(b"\n")
+    if not account or not period:
+        return None
+    return f"{account}|{period}|{total_pages}|{digest.hexdigest()}"
+
+
+class StatementCache(PageCache):
+    """
+    Caché LRU de resultados completos por huella semántica del estado de cuenta.
+
+    A diferencia de la caché de páginas (que reutiliza el resultado de cada
+    página), una nueva descarga del mismo estado se reconoce solo con el texto
+    normalizado de sus páginas y se responde sin volver a analizarlas.
+    """
+
+    def __init__(self, max_entries=STATEMENT_CACHE_MAX_ENTRIES):
+        super().__init__(max_entries)
+
+
+statement_cache = StatementCache()
+
+
+def cached_statement_records(pages, profile, parser, fields, parse, on_page=None):
+    """
+    Registros del estado de cuenta desde la caché por huella o, si no están,
+    los de `parse()` (generador, que debe leer la misma lista `pages`), que se
+    guardan al terminar de recorrerlos.
+    Con un acierto se notifica `on_page` una sola vez con la última página.
+    """
+    fingerprint = statement_fingerprint(pages, profile) if statement_cache.enabled else None
+    if fingerprint is None:
+        yield from parse()
+        return
+
+    key = statement_cache.key(parser, profile.fingerprint, fields, fingerprint)
+    records = statement_cache.get(key)
+    if records is not None:
+        if on_page:
+            on_page(len(pages) - 1, len(pages))
+        for record in records:
+            yield dict(record)
+        return
+
+    stored = []
+    for record in parse():
+        stored.append(dict(record))
+        yield record
+    # Solo se guarda un análisis completo (no uno cancelado o interrumpido)
+    statement_cache.put(key, stored)
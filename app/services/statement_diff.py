@@ -0,0 +1,122 @@
+from collections import Counter, defaultdict, deque
+import hashlib
+import json
+import re
+
+from .exporters import parse_amount
+from .projection import AMOUNT_FIELDS
+
+# Campos que identifican "el mismo movimiento" entre dos versiones de un estado:
+# fecha + número de control/folio, o la descripción si no hay número
+IDENTITY_FIELDS = {
+    "full": ("FECHA_OPER", "NUMERO_CONTROL", "COD_DESCRIPCION"),
+    "partial": ("fecha", "folio", "concepto"),
+}
+# Campos que no describen el movimiento (depuración) y no se comparan
+IGNORED_FIELDS = {"raw_lines"}
+
+_SPACES_RE = re.compile(r"\s+")
+
+
+def normalize_value(name, value):
+    """Normaliza un campo para comparar: montos como número y textos sin espacios repetidos."""
+    if name in AMOUNT_FIELDS:
+        number = parse_amount(value)
+        if number is not None:
+            return round(number, 2)
+    if isinstance(value, str):
+        return _SPACES_RE.sub(" ", value).strip().upper() or None
+    return value
+
+
+def normalize_row(row):
+    return {name: normalize_value(name, value) for name, value in row.items() if name not in IGNORED_FIELDS}
+
+
+def row_digest(normalized):
+    """Hash del contenido normalizado de una transacción."""
+    payload = json.dumps(normalized, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).digest()
+
+
+def identity_key(normalized, parser):
+    date_field, number_field, text_field = IDENTITY_FIELDS[parser]
+    number = normalized.get(number_field)
+    if number and number != "NA":
+        return date_field, normalized.get(date_field), number
+    return date_field, normalized.get(date_field), normalized.get(text_field)
+
+
+def diff_statements(old_rows, new_rows, parser):
+    """
+    Compara dos listas de transacciones en tiempo lineal.
+
+    1. Las filas idénticas (mismo hash normalizado) se descartan como multiconjunto.
+    2. De las restantes, las que comparten identidad (fecha + número de control/folio,
+       o fecha + descripción) son modificaciones; el resto son altas o bajas.
+
+    Retorna un resumen y solo las filas que cambiaron.
+    """
+    old_norm = [normalize_row(row) for row in old_rows]
+    new_norm = [normalize_row(row) for row in new_rows]
+    old_hashes = [row_digest(row) for row in old_norm]
+    new_hashes = [row_digest(row) for row in new_norm]
+
+    # Paso 1: coincidencias exactas
+    available = Counter(old_hashes)
+    matched = Counter()
+    new_left = []
+    for idx, digest in enumerate(new_hashes):
+        if available[digest] > 0:
+            available[digest] -= 1
+            matched[digest] += 1
+        else:
+            new_left.append(idx)
+    unchanged = len(new_hashes) - len(new_left)
+
+    # Filas viejas sin pareja exacta (las primeras apariciones se emparejaron), agrupadas por identidad
+    old_by_identity = defaultdict(deque)
+    for idx, digest in enumerate(old_hashes):
+        if matched[digest] > 0:
+            matched[digest] -= 1
+        else:
+            old_by_identity[identity_key(old_norm[idx], parser)].append(idx)
+
+    # Paso 2: modificaciones y altas
+    added, modified = [], []
+    for idx in new_left:
+        candidates = old_by_identity.get(identity_key(new_norm[idx], parser))
+        if candidates:
+            old_idx = candidates.popleft()
+            changed = sorted(
+                name for name in set(old_norm[old_idx]) | set(new_norm[idx])
+                if old_norm[old_idx].get(name) != new_norm[idx].get(name)
+            )
+            modified.append({
+                "old_index": old_idx,
+                "new_index": idx,
+                "changed": changed,
+                "before": old_rows[old_idx],
+                "after": new_rows[idx],
+            })
+        else:
+            added.append({"new_index": idx, "row": new_rows[idx]})
+
+    removed = sorted(
+        ({"old_index": idx, "row": old_rows[idx]} for rows in old_by_identity.values() for idx in rows),
+        key=lambda item: item["old_index"]
+    )
+
+    return {
+        "summary": {
+            "old_count": len(old_rows),
+            "new_count": len(new_rows),
+            "unchanged": unchanged,
+            "added": len(added),
+            "removed": len(removed),
+            "modified": len(modified),
+        },
+        "added": added,
+        "removed": removed,
+        "modified": modified,
+    }
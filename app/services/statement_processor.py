@@ -1,79 +1,222 @@
-from app.utils.utils import pattern_date, phrases_to_ignore, partial_phrases_to_ignore
+from app.utils.bank_profiles import get_profile, match_value
+from app.utils.log import get_logger
 from app.utils.functions import clean_total_movements_line, extract_fields
+from .exporters import write_json_array
+from .page_cache import page_cache
+from .statement_cache import cached_statement_records, statement_cache
+from .projection import PARTIAL_FIELDS
  
+from collections import deque
 import re 
 import json
+import logging
 import pdftotext
 
+logger = get_logger(__name__)
+
 data = []
 
-def extract_transactions_from_pdf(pdf_name):
-    analyze = False
-    data = []
+def read_pdf(pdf_name):
+    """
+    Abre el PDF con pdftotext en modo físico. Las páginas se renderizan al
+    iterarlas, por lo que solo el texto de la página actual vive en memoria.
+    """
+    with open(pdf_name, "rb") as file:
+        return pdftotext.PDF(file, physical=True)
+
+def iter_page_lines(pages, on_page=None):
+    """
+    Recorre las líneas de todas las páginas sin unificarlas en una sola lista.
+    `on_page(numero_pagina, total_paginas)` se invoca al terminar cada página.
+    """
+    total_pages = len(pages) if hasattr(pages, "__len__") else None
+    for page_number, page in enumerate(pages):
+        for line in page.split("\n"):
+            yield line
+        if on_page:
+            on_page(page_number, total_pages)
+
+def chain_page_callbacks(*callbacks):
+    """Combina varios callbacks `on_page` (memoria, progreso...) en uno solo."""
+    callbacks = [cb for cb in callbacks if cb]
+    if not callbacks:
+        return None
+    if len(callbacks) == 1:
+        return callbacks[0]
+
+    def on_page(page_number, total_pages=None):
+        for cb in callbacks:
+            cb(page_number, total_pages)
+    return on_page
+
+def extract_transactions_from_pdf(pdf_name, profile=None):
+    return extract_transactions_from_pages(read_pdf(pdf_name), profile)
+
+def extract_transactions_from_pages(pages, profile=None):
+    """Agrupa las líneas de cada transacción a partir del texto de las páginas."""
+    return list(iter_transactions_from_pages(pages, profile=profile))
+
+def iter_transactions_from_pages(pages, on_page=None, profile=None):
+    """
+    Versión en streaming de extract_transactions_from_pages: genera cada
+    transacción (líneas concatenadas) en cuanto se completa.
+    """
+    if profile is None:
+        profile = get_profile(parser="full")
+
+    pending = None
+    for data_line in _iter_raw_transactions(pages, on_page, profile):
+        if pending is not None:
+            yield pending
+        pending = data_line
+
+    if pending is None:
+        return
+
+    yield trim_last_record(pending, profile)
+
+def trim_last_record(data_line, profile):
+    """El último registro arrastra el texto del pie de página después de la referencia."""
+    match_last_ref = profile.last_record_re.search(data_line)
+    if match_last_ref:
+        return data_line[:match_last_ref.end()]
+    return data_line
+
+def _iter_raw_transactions(pages, on_page, profile):
     analyze = False
     data_line = []
+    total_pages = len(pages) if hasattr(pages, "__len__") else None
 
-    with open(pdf_name, "rb") as file:
-        pdf = pdftotext.PDF(file, physical=True)
-        for page in pdf:
-            lines = page.split("\n")
+    for page_number, page in enumerate(pages):
+        completed, analyze, data_line = scan_statement_page(page, analyze, data_line, profile)
+        yield from completed
 
-            for line in lines:
-                line = line.strip() 
+        if on_page:
+            on_page(page_number, total_pages)
 
-                if any(phrase in line for phrase in phrases_to_ignore):
-                    continue
+    if data_line:
+        yield data_line
 
-                if "FECHA" in line:
-                    analyze = True
-                    continue
+def scan_statement_page(page, analyze, data_line, profile):
+    """
+    Procesa una página con la máquina de estados del parser completo.
 
-                if "TOTAL MOVIMIENTOS ABONOS" in line:
-                    analyze = True
-                    movements = clean_total_movements_line(line)
-                    break
+    Recibe el estado con el que se entra a la página (`analyze` y la transacción
+    en curso) y retorna (transacciones completadas en la página, analyze, data_line).
+    El resultado depende solo de estos argumentos, lo que permite cachearlo por página.
+    """
+    completed = []
+    for line in page.split("\n"):
+        line = line.strip() 
 
-                if analyze:
-                    line = line.replace(',', '') 
-                    if re.match(pattern_date, line):  
-                        if data_line: 
-                            data.append(data_line)
-                        data_line = line  
-                    else:
-                        if data_line: 
-                            data_line += " " + line
+        if profile.ignores(line):
+            continue
 
-    if data_line:
-        data.append(data_line)
+        if profile.start_marker in line:
+            analyze = True
+            continue
 
-    last_record = data[-1]
-    match_last_ref = re.search(r"Ref\. \**\d+", last_record)
-    if match_last_ref:
-        text_cleaned = last_record[:match_last_ref.end()]
-        data[-1] = text_cleaned
+        if profile.end_marker in line:
+            analyze = True
+            movements = clean_total_movements_line(line)
+            break
+
+        if analyze:
+            line = line.replace(',', '') 
+            if profile.transaction_start_re.match(line):  
+                if data_line: 
+                    completed.append(data_line)
+                data_line = line  
+            else:
+                if data_line: 
+                    data_line += " " + line
+
+    return completed, analyze, data_line
+
+def iter_statement_records(pdf_path, on_page=None, profile=None, on_record=None, use_cache=False, fields=None):
+    """
+    Genera los campos (extract_fields) de cada transacción conforme se leen las páginas.
+    `on_record(registro)` se invoca por cada transacción reconocida.
+    Con `use_cache` un estado de cuenta ya visto (misma huella) se toma de la
+    caché de estados y las páginas ya vistas de la caché de páginas.
+    `fields` limita los campos calculados (None = todos).
+    """
+    if profile is None:
+        profile = get_profile(parser="full")
+    pages = read_pdf(pdf_path)
+    if use_cache and statement_cache.enabled:
+        # La huella lee todas las páginas: se renderizan una sola vez para la huella y el análisis
+        pages = list(pages)
+    if use_cache and page_cache.enabled:
+        parse = lambda: _iter_cached_statement_records(pages, on_page, profile, fields)
     else:
-        text_cleaned = last_record
+        parse = lambda: (
+            extract_fields(data, profile, fields) for data in iter_transactions_from_pages(pages, on_page, profile)
+        )
+    records = cached_statement_records(pages, profile, "full", fields, parse, on_page) if use_cache else parse()
+    for record in records:
+        if on_record:
+            on_record(record)
+        yield record
 
-    return data
+def _iter_cached_statement_records(pages, on_page, profile, fields=None):
+    """
+    Igual que iter_transactions_from_pages + extract_fields, pero reutilizando el
+    resultado de cada página cuando su texto y el estado de entrada coinciden.
+    """
+    analyze = False
+    data_line = ""
+    total_pages = len(pages) if hasattr(pages, "__len__") else None
+    pending = None
 
-def process_pdf_file(pdf_path):
-    file_name = pdf_path[8:-4].strip().replace(" ", "_")
-    print(f"Processing PDF file: {pdf_path[8:-4]}")
-    json_result = []
+    for page_number, page in enumerate(pages):
+        key = page_cache.key("full", profile.fingerprint, fields, analyze, data_line, page)
+        fragment = page_cache.get(key)
+        if fragment is None:
+            completed, analyze_out, data_line_out = scan_statement_page(page, analyze, data_line, profile)
+            fragment = ([(line, extract_fields(line, profile, fields)) for line in completed],
+                        analyze_out, data_line_out)
+            page_cache.put(key, fragment)
 
-    extracted_data = extract_transactions_from_pdf(pdf_path)
-    
-    for data in extracted_data:
-        result = extract_fields(data)
-        json_result.append(result)
+        pairs, analyze, data_line = fragment
+        for pair in pairs:
+            if pending is not None:
+                yield dict(pending[1])
+            pending = pair
 
-    json_file_path = f"{file_name}.json"
-    with open(json_file_path, "w", encoding="utf-8") as json_file:
-        json.dump(json_result, json_file, ensure_ascii=False, indent=4)
+        if on_page:
+            on_page(page_number, total_pages)
 
-    return json_file_path
+    if data_line:
+        if pending is not None:
+            yield dict(pending[1])
+        pending = (data_line, None)
+
+    if pending is None:
+        return
+
+    # El último registro se recorta fuera de la caché (depende de dónde termina el documento)
+    line, record = pending
+    trimmed = trim_last_record(line, profile)
+    if record is None or trimmed != line:
+        record = extract_fields(trimmed, profile, fields)
+    yield dict(record)
+
+def pdf_json_path(pdf_path):
+    """Ruta del JSON que escribe process_pdf_file para `pdf_path`."""
+    file_name = pdf_path[8:-4].strip().replace(" ", "_")
+    return f"{file_name}.json"
 
+def process_pdf_file(pdf_path, on_page=None, profile=None, on_record=None, use_cache=False, fields=None):
+    logger.info("Procesando PDF", extra={"fields": {"archivo": pdf_path[8:-4]}})
 
+    # Las transacciones se escriben conforme se extraen, sin acumular la lista completa
+    records = iter_statement_records(pdf_path, on_page, profile, on_record, use_cache, fields)
+
+    json_file_path = pdf_json_path(pdf_path)
+    write_json_array(records, json_file_path, indent=4)
+
+    return json_file_path
 
 
 def extract_transactions_partial_from_pdf(pdf_name):
@@ -88,7 +231,8 @@ def extract_transactions_partial_from_pdf(pdf_name):
             
             lines = page.split("\n")
             data.append(lines)
-            print(lines)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Líneas de página", extra={"fields": {"lines": lines}})
 
             #for line in lines:
                 
@@ -112,3 +256,311 @@ def extract_transactions_partial_from_pdf(pdf_name):
                   #  print(line)
                 
                 #print(line)  # Debugging line to see the content being processed
+
+
+def extract_partial_transactions(pdf_name, include_raw=True, include_control_number=False, profile=None,
+                                 fields=None):
+    """
+    Extrae transacciones de un PDF con el análisis línea por línea.
+
+    - include_raw: agrega `raw_lines` (líneas originales) a cada transacción
+    - include_control_number: agrega `numero_control` (formato ITCV21690056 o 23690586)
+    - fields: lista exacta de campos a calcular (reemplaza las dos opciones anteriores)
+    """
+    return extract_partial_transactions_from_pages(read_pdf(pdf_name), include_raw, include_control_number, profile,
+                                                   fields)
+
+
+def extract_partial_transactions_from_pages(pages, include_raw=True, include_control_number=False, profile=None,
+                                            fields=None):
+    return list(iter_partial_transactions(iter_page_lines(pages), include_raw, include_control_number, profile,
+                                          fields))
+
+
+def stream_partial_transactions(pdf_name, include_raw=True, include_control_number=False, on_page=None,
+                                profile=None, on_record=None, use_cache=False, fields=None):
+    """
+    Generador de transacciones para el modo de memoria acotada.
+    `on_record(transaccion)` se invoca por cada transacción reconocida.
+    Con `use_cache` un estado de cuenta ya visto (misma huella) se toma de la
+    caché de estados y las páginas ya vistas de la caché de páginas.
+    `fields` reemplaza a include_raw/include_control_number con la lista exacta de campos.
+    """
+    if profile is None:
+        profile = get_profile(parser="partial")
+    fields = partial_fields(include_raw, include_control_number, fields)
+    pages = read_pdf(pdf_name)
+    if use_cache and statement_cache.enabled:
+        # La huella lee todas las páginas: se renderizan una sola vez para la huella y el análisis
+        pages = list(pages)
+    if use_cache and page_cache.enabled:
+        parse = lambda: _iter_cached_partial_transactions(pages, fields, on_page, profile)
+    else:
+        parse = lambda: (
+            transaction for _, transaction, _ in _iter_partial_core(iter_page_lines(pages, on_page), fields, profile)
+        )
+    records = cached_statement_records(pages, profile, "partial", fields, parse, on_page) if use_cache else parse()
+    if on_record:
+        return _notify_records(records, on_record)
+    return records
+
+
+def _notify_records(records, on_record):
+    for record in records:
+        on_record(record)
+        yield record
+
+
+def partial_fields(include_raw=True, include_control_number=False, fields=None):
+    """Campos a calcular por el parser línea por línea."""
+    if fields is not None:
+        return tuple(fields)
+    return tuple(
+        name for name in PARTIAL_FIELDS
+        if (name != "raw_lines" or include_raw) and (name != "numero_control" or include_control_number)
+    )
+
+
+def _iter_cached_partial_transactions(pages, fields, on_page, profile):
+    """
+    Versión con caché de iter_partial_transactions.
+
+    Una transacción solo depende de la línea anterior y de las siguientes que se
+    revisan buscando folios, así que cada página se analiza con la última línea
+    de la página anterior y el texto de la siguiente como contexto, y ese
+    contexto forma parte de la llave. Si la búsqueda hacia adelante se agota en
+    el contexto y aún quedan páginas, la página se recalcula con el resto del
+    documento y no se cachea.
+    """
+    total_pages = len(pages) if hasattr(pages, "__len__") else None
+    pages = iter(pages)
+    page = next(pages, None)
+    prev_last = None
+    page_number = 0
+
+    while page is not None:
+        next_page = next(pages, None)
+        key = page_cache.key("partial", profile.fingerprint, fields, prev_last, page, next_page)
+        records = page_cache.get(key)
+        page_lines = page.split("\n")
+
+        if records is None:
+            context = [prev_last] if prev_last is not None else []
+            offset = len(context)
+            context.extend(page_lines)
+            if next_page is not None:
+                context.extend(next_page.split("\n"))
+
+            records, exhausted = _partial_page_records(context, offset, len(page_lines), fields, profile)
+            cacheable = True
+            if exhausted and next_page is not None:
+                # La búsqueda de folios cruzó el contexto: recalcular con el resto del documento
+                rest = list(pages)
+                pages = iter(rest)
+                for extra in rest:
+                    context.extend(extra.split("\n"))
+                records, _ = _partial_page_records(context, offset, len(page_lines), fields, profile)
+                cacheable = not rest
+            if cacheable:
+                page_cache.put(key, records)
+
+        for record in records:
+            yield dict(record)
+
+        if on_page:
+            on_page(page_number, total_pages)
+
+        prev_last = page_lines[-1]
+        page = next_page
+        page_number += 1
+
+
+def _partial_page_records(context, offset, count, fields, profile):
+    """Transacciones cuya línea de fecha cae en context[offset:offset + count]."""
+    records = []
+    exhausted = False
+    for index, transaction, lookahead_exhausted in _iter_partial_core(context, fields, profile):
+        if index < offset:
+            continue
+        if index >= offset + count:
+            break
+        records.append(transaction)
+        exhausted = exhausted or lookahead_exhausted
+    return records, exhausted
+
+
+def iter_partial_transactions(lines, include_raw=True, include_control_number=False, profile=None, fields=None):
+    """
+    Formato esperado del PDF:
+    - Línea 1: Concepto/Descripción
+    - Línea 2: Fecha (dd-mm) + Montos ($ cargo $ abono $ saldo)
+    - Línea 3: Información adicional (códigos, folios, etc.)
+
+    Recorre las líneas con una ventana deslizante: solo conserva la línea anterior
+    y las siguientes que hagan falta para buscar folios, por lo que la memoria no
+    crece con el número de páginas.
+
+    Con `fields` solo se calcula lo solicitado: sin folio, raw_lines ni
+    numero_control no se revisan las líneas siguientes.
+    """
+    fields = partial_fields(include_raw, include_control_number, fields)
+    for _, transaction, _ in _iter_partial_core(lines, fields, profile):
+        yield transaction
+
+
+def _iter_partial_core(lines, fields, profile):
+    """
+    Genera (índice de la línea con fecha, transacción, búsqueda_agotada); el último
+    indica que la búsqueda de folios llegó al final de las líneas disponibles.
+    """
+    if profile is None:
+        profile = get_profile(parser="partial")
+
+    wanted = set(fields)
+    include_raw = "raw_lines" in wanted
+    include_control_number = "numero_control" in wanted
+    need_amounts = bool(wanted & {"cargo", "abono", "saldo"})
+    # El concepto decide entre cargo y abono y contiene el número de control en línea
+    need_concepto = need_amounts or bool(wanted & {"concepto", "numero_control"})
+    need_lookahead = bool(wanted & {"folio", "raw_lines", "numero_control"})
+
+    # Expresiones regulares (compiladas una sola vez en el perfil)
+    money_re = profile.amount_re
+    date_re = profile.date_re
+    folio_re = profile.folio_re
+
+    lines = iter(lines)
+    ahead = deque()
+
+    def peek(k):
+        """Retorna la k-ésima línea siguiente (0 = actual) o None al final del documento."""
+        while len(ahead) <= k:
+            nxt = next(lines, None)
+            if nxt is None:
+                return None
+            ahead.append(nxt)
+        return ahead[k]
+
+    prev_line = None
+    index = -1
+    while peek(0) is not None:
+        raw_line = ahead.popleft()
+        index += 1
+        line = raw_line.strip()
+
+        # Ignorar líneas vacías o encabezados
+        if not line or profile.ignores(line):
+            prev_line = raw_line
+            continue
+
+        # Buscar línea con fecha (indica una transacción)
+        date_match = date_re.search(line)
+        if not date_match:
+            prev_line = raw_line
+            continue
+
+        # === TRANSACCIÓN ENCONTRADA ===
+        fecha = date_match.group(0).strip()
+
+        # Extraer montos de esta línea
+        amounts = [amt.replace(" ", "") for amt in money_re.findall(line)] if need_amounts else []
+
+        # CONCEPTO: revisar línea ANTERIOR
+        concepto = None
+        numero_control = None
+
+        if need_concepto and prev_line is not None:
+            prev = prev_line.strip()
+            if prev and not date_re.search(prev) and not profile.ignores(prev):
+                # Si tiene montos, tomar solo la parte antes del $
+                concepto = prev.split('$')[0].strip() if '$' in prev else prev
+
+        # Si no hay concepto anterior, buscar en la línea actual (después de fecha)
+        if need_concepto and not concepto:
+            after_date = line[date_match.end():].strip()
+            if after_date and '$' in after_date:
+                concepto = after_date.split('$')[0].strip()
+                if include_control_number:
+                    # Buscar número de control en la misma línea (formato: 000ITCV21690056)
+                    nc_inline = profile.inline_control_number_re.search(concepto)
+                    if nc_inline:
+                        numero_control = match_value(nc_inline, "control")
+                        # Limpiar el número de control del concepto
+                        concepto = profile.inline_control_number_cleanup_re.sub("", concepto).strip()
+
+        # INFORMACIÓN ADICIONAL: revisar líneas SIGUIENTES (folios, códigos)
+        folio = None
+        next_info = []
+        exhausted = False
+        j = 0
+        while need_lookahead and len(next_info) < 2:
+            nxt = peek(j)
+            if nxt is None:
+                exhausted = True
+                break
+            nxt = nxt.strip()
+
+            # Buscar número de control en las líneas siguientes
+            # Patrón 1: ITCV21690160 (con prefijo ITCV)
+            # Patrón 2: 23690586 (solo dígitos con 69 en medio)
+            if include_control_number and not numero_control:
+                numero_control = profile.find_control_number(nxt)
+
+            if not nxt:
+                j += 1
+                continue
+            # Si encontramos otra fecha, detenemos
+            if date_re.search(nxt):
+                break
+            # Si no tiene montos, es información adicional
+            if not money_re.search(nxt):
+                next_info.append(nxt)
+                # Buscar FOLIO
+                fm = folio_re.search(nxt)
+                if fm:
+                    folio = fm.group(1)
+            j += 1
+
+        # ASIGNAR MONTOS
+        cargo = abono = saldo = None
+        if need_amounts:
+            # Tipo de movimiento por palabras clave (una sola pasada sobre el concepto)
+            movement = profile.movements.classify(concepto)
+            if len(amounts) == 1:
+                abono = amounts[0]
+            elif len(amounts) == 2:
+                if movement.type == "cargo":
+                    cargo, saldo = amounts
+                else:
+                    abono, saldo = amounts
+            elif len(amounts) >= 3:
+                cargo, abono, saldo = amounts[0], amounts[1], amounts[2]
+
+            # Ajuste especial para cheques: son cargos aunque traigan un solo importe
+            if movement.force and movement.type == "cargo" and abono and not cargo:
+                cargo = abono
+                abono = None
+
+        transaction = {
+            "fecha": fecha,
+            "concepto": concepto,
+            "folio": folio,
+            "cargo": cargo,
+            "abono": abono,
+            "saldo": saldo,
+        }
+
+        if include_raw:
+            # RAW LINES para debugging
+            raw = []
+            if prev_line is not None and prev_line.strip():
+                raw.append(prev_line.strip())
+            raw.append(line)
+            raw.extend(next_info)
+            transaction["raw_lines"] = raw
+
+        if include_control_number:
+            transaction["numero_control"] = numero_control
+
+        prev_line = raw_line
+        yield index, {name: transaction[name] for name in fields}, exhausted
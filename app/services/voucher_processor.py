@@ -0,0 +1,83 @@
+from app.utils.bank_profiles import get_profile
+from .workers import pool_map, chunked
+
+import os
+import pdftotext
+
+# Los vouchers son PDFs de 1-2 páginas: se agrupan en lotes para que el costo de
+# enviar una tarea al pool no domine sobre el costo de extraer el texto.
+VOUCHER_BATCH_SIZE = int(os.getenv("VOUCHER_BATCH_SIZE", 16))
+
+
+def extract_voucher_fields(text, profile=None, fields=None):
+    """
+    Extrae número de control, monto y fecha del texto de un voucher.
+    Usa los patrones compilados del perfil "voucher" (ver app/config/bank_profiles.json).
+    `fields` limita los campos a buscar (None = todos); los demás quedan vacíos.
+    """
+    if profile is None:
+        profile = get_profile(parser="voucher")
+
+    numero_control = None
+    if fields is None or "numero_control" in fields:
+        numero_control = profile.find_control_number(text)
+
+    monto = None
+    raw_amount = profile.find_amount(text) if fields is None or "monto" in fields else None
+    if raw_amount:
+        monto = float(raw_amount.replace("$", "").replace(",", "").strip())
+
+    fecha = None
+    dm = profile.date_re.search(text) if fields is None or "fecha" in fields else None
+    if dm:
+        fecha = dm.group(0)
+
+    return {
+        "numero_control": numero_control if numero_control else "NA",
+        "monto": monto,
+        "fecha": fecha,
+    }
+
+
+def extract_voucher_from_pdf(pdf_path, profile=None, fields=None):
+    """Lee un voucher PDF y retorna sus campos."""
+    with open(pdf_path, "rb") as file:
+        pdf = pdftotext.PDF(file, physical=True)
+        text = "\n".join(pdf)
+    return extract_voucher_fields(text, profile, fields)
+
+
+def _process_voucher_batch(task):
+    """Procesa un lote de (nombre, ruta) dentro de un worker."""
+    profile_name, fields, batch = task
+    # El perfil se resuelve en el worker: los patrones se compilan una vez por proceso
+    profile = get_profile(profile_name, parser="voucher")
+    rows = []
+    for name, pdf_path in batch:
+        try:
+            values = extract_voucher_from_pdf(pdf_path, profile, fields)
+            error = None
+        except Exception as e:
+            values = {"numero_control": "NA", "monto": None, "fecha": None}
+            error = str(e)
+        row = {"archivo": name, **values, "error": error}
+        rows.append(row if fields is None else {f: row[f] for f in fields})
+    return rows
+
+
+def process_vouchers(vouchers, batch_size=VOUCHER_BATCH_SIZE, profile_name=None, fields=None):
+    """
+    Extrae los campos de muchos vouchers repartiendo lotes en el pool de procesos.
+    `vouchers` es una lista de tuplas (nombre_original, ruta_temporal).
+    Retorna una sola tabla (lista de dicts) en el mismo orden de entrada.
+    `fields` limita las columnas de la tabla (None = todas).
+    """
+    batches = [(profile_name, fields, batch) for batch in chunked(list(vouchers), max(1, batch_size))]
+    if len(batches) <= 1:
+        # Un solo lote no justifica el viaje al pool
+        return _process_voucher_batch(batches[0]) if batches else []
+
+    table = []
+    for rows in pool_map(_process_voucher_batch, batches):
+        table.extend(rows)
+    return table
@@ -0,0 +1,63 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, wait
+from functools import partial
+
+from app.utils.log import setup_worker_logging
+from .profiling import get_active_profiler, run_profiled
+
+# Pool de procesos compartido por los servicios que reparten trabajo de CPU
+# (pdftotext + regex). Se crea de forma perezosa para no lanzar procesos al importar.
+MAX_WORKERS = int(os.getenv("PARSER_MAX_WORKERS", os.cpu_count() or 1))
+
+_process_pool = None
+
+
+def get_process_pool():
+    """Retorna el pool de procesos compartido, creándolo la primera vez."""
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(max_workers=MAX_WORKERS, initializer=setup_worker_logging)
+    return _process_pool
+
+
+def shutdown_process_pool():
+    """Detiene el pool compartido (al apagar la aplicación)."""
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(cancel_futures=True)
+        _process_pool = None
+
+
+def chunked(items, size):
+    """Divide una lista en lotes de tamaño `size`."""
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def pool_map(fn, tasks):
+    """
+    pool.map sobre el pool compartido. Si la petición se está perfilando,
+    cada tarea se perfila dentro del worker y sus estadísticas se combinan
+    con las del proceso principal.
+
+    A diferencia de pool.map, espera a que terminen todas las tareas antes de
+    regresar o de propagar el primer error (en el orden de `tasks`): cuando el
+    llamador limpia lo que crearon los workers ya no queda ninguna corriendo.
+    """
+    pool = get_process_pool()
+    profiler = get_active_profiler()
+    task_fn = fn if profiler is None else partial(run_profiled, fn)
+    futures = []
+    try:
+        for task in tasks:
+            futures.append(pool.submit(task_fn, task))
+    finally:
+        wait(futures)
+
+    results = [future.result() for future in futures]
+    if profiler is None:
+        return results
+    merged = []
+    for result, stats in results:
+        profiler.merge_marshaled(stats)
+        merged.append(result)
+    return merged
@@ -1,2 +1,2 @@
 from .functions import clean_total_movements_line, extract_fields
-from .utils import phrases_to_ignore, pattern_date
+from .bank_profiles import get_profile
@@ -0,0 +1,252 @@
+from dataclasses import dataclass
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+from .movement_rules import MovementClassifier, compile_movement_rules
+
+# Archivo con los perfiles de cada banco/layout. Se recarga en caliente al cambiar.
+BANK_PROFILES_PATH = os.getenv(
+    "BANK_PROFILES_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), "config", "bank_profiles.json")
+)
+# Cada cuánto (segundos) se revisa el mtime del archivo como máximo
+BANK_PROFILES_RELOAD_INTERVAL = float(os.getenv("BANK_PROFILES_RELOAD_INTERVAL", 2))
+
+PARSERS = ("full", "partial", "voucher")
+
+
+class BankProfileError(ValueError):
+    """Perfil inexistente o configuración inválida."""
+
+
+@dataclass(frozen=True)
+class BankProfile:
+    """
+    Patrones de un layout de estado de cuenta, compilados una sola vez.
+    Es inmutable: una recarga crea perfiles nuevos en lugar de modificar los existentes,
+    por lo que un documento se procesa completo con la misma versión del perfil.
+    """
+    name: str
+    parser: str
+    # Hash de la configuración del perfil (para invalidar cachés al recargar)
+    fingerprint: str = ""
+    phrases_to_ignore: tuple = ()
+    date_re: re.Pattern = None
+    amount_res: tuple = ()
+    control_number_res: tuple = ()
+    # Número de cuenta en el encabezado (huella del estado de cuenta)
+    account_re: re.Pattern = None
+    # Parser "full" (download-pdf/csv)
+    start_marker: str = None
+    end_marker: str = None
+    transaction_start_re: re.Pattern = None
+    last_record_re: re.Pattern = None
+    description_header: str = ""
+    # Tabla de tipos de movimiento (abono/cargo) compilada, compartida por los parsers
+    movements: MovementClassifier = None
+    # Parser "partial" (extract-partial-json/csv)
+    folio_re: re.Pattern = None
+    inline_control_number_re: re.Pattern = None
+    inline_control_number_cleanup_re: re.Pattern = None
+
+    @property
+    def amount_re(self):
+        return self.amount_res[0] if self.amount_res else None
+
+    def ignores(self, line):
+        """True si la línea contiene alguna de las frases a ignorar."""
+        return any(phrase in line for phrase in self.phrases_to_ignore)
+
+    def find_control_number(self, text):
+        """Busca el número de control con cada patrón, en orden."""
+        for pattern in self.control_number_res:
+            match = pattern.search(text)
+            if match:
+                return match_value(match, "control")
+        return None
+
+    def find_account(self, text):
+        """Número de cuenta (solo dígitos) o None si el perfil no lo define o no aparece."""
+        if self.account_re is None:
+            return None
+        match = self.account_re.search(text)
+        if not match:
+            return None
+        return re.sub(r"\D", "", match_value(match, "account")) or None
+
+    def find_amount(self, text):
+        """Busca el primer monto con cada patrón, en orden. Retorna el texto encontrado."""
+        for pattern in self.amount_res:
+            match = pattern.search(text)
+            if match:
+                return match_value(match, "amount")
+        return None
+
+
+def match_value(match, group):
+    """Valor del grupo nombrado `group` si el patrón lo define, si no el texto completo."""
+    if group in match.re.groupindex:
+        return match.group(group)
+    return match.group(0)
+
+
+def _compile(pattern, name, field):
+    if pattern is None:
+        return None
+    try:
+        return re.compile(pattern)
+    except re.error as e:
+        raise BankProfileError(f"Patrón inválido en {name}.{field}: {e}")
+
+
+def legacy_movement_rules(raw):
+    """
+    Tabla de movimientos equivalente a las claves anteriores (`abono_rules`,
+    `cheque_keyword` y `cargo_keywords`) para archivos de perfiles sin `movement_rules`.
+    """
+    rules = [
+        {"category": rule["keyword"], "type": "abono", "keywords": [rule["keyword"]],
+         "control_number": rule.get("control_number")}
+        for rule in raw.get("abono_rules", ())
+    ]
+    if raw.get("cheque_keyword"):
+        rules.append({"category": raw["cheque_keyword"], "type": "cargo", "keywords": [raw["cheque_keyword"]], "force": True})
+    rules.extend(
+        {"category": keyword, "type": "cargo", "keywords": [keyword]} for keyword in raw.get("cargo_keywords", ())
+    )
+    return rules
+
+
+def _compile_movements(raw, name, parser):
+    # Sin regla que coincida: el parser parcial asume abono y el completo cargo
+    default_type = raw.get("default_movement_type", "abono" if parser == "partial" else "cargo")
+    rules = raw["movement_rules"] if "movement_rules" in raw else legacy_movement_rules(raw)
+    try:
+        return compile_movement_rules(rules, default_type)
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        raise BankProfileError(f"Regla de movimiento inválida en {name}: {e}")
+    except re.error as e:
+        raise BankProfileError(f"Patrón inválido en {name}.movement_rules: {e}")
+
+
+def compile_profile(name, raw):
+    """Construye un BankProfile a partir de su entrada en el archivo de configuración."""
+    parser = raw.get("parser")
+    if parser not in PARSERS:
+        raise BankProfileError(f"Parser inválido en {name}: {parser}")
+
+    return BankProfile(
+        name=name,
+        parser=parser,
+        fingerprint=hashlib.sha256(json.dumps(raw, sort_keys=True).encode("utf-8")).hexdigest()[:16],
+        phrases_to_ignore=tuple(raw.get("phrases_to_ignore", ())),
+        date_re=_compile(raw.get("date_pattern"), name, "date_pattern"),
+        amount_res=tuple(_compile(p, name, "amount_patterns") for p in raw.get("amount_patterns", ())),
+        control_number_res=tuple(
+            _compile(p, name, "control_number_patterns") for p in raw.get("control_number_patterns", ())
+        ),
+        account_re=_compile(raw.get("account_pattern"), name, "account_pattern"),
+        start_marker=raw.get("start_marker"),
+        end_marker=raw.get("end_marker"),
+        transaction_start_re=_compile(raw.get("transaction_start_pattern"), name, "transaction_start_pattern"),
+        last_record_re=_compile(raw.get("last_record_pattern"), name, "last_record_pattern"),
+        description_header=raw.get("description_header", ""),
+        movements=_compile_movements(raw, name, parser),
+        folio_re=_compile(raw.get("folio_pattern"), name, "folio_pattern"),
+        inline_control_number_re=_compile(raw.get("inline_control_number_pattern"), name, "inline_control_number_pattern"),
+        inline_control_number_cleanup_re=_compile(
+            raw.get("inline_control_number_cleanup"), name, "inline_control_number_cleanup"
+        ),
+    )
+
+
+def load_profiles(path):
+    """Lee y compila todos los perfiles del archivo. Falla completo si alguno es inválido."""
+    with open(path, "r", encoding="utf-8") as f:
+        try:
+            raw_profiles = json.load(f)
+        except json.JSONDecodeError as e:
+            raise BankProfileError(f"Archivo de perfiles inválido: {e}")
+    return {name: compile_profile(name, raw) for name, raw in raw_profiles.items()}
+
+
+class ProfileRegistry:
+    """
+    Mantiene los perfiles compilados y los recarga cuando cambia el archivo.
+
+    La recarga compila todos los perfiles aparte y luego reemplaza el diccionario
+    completo en una sola asignación, así los lectores ven la versión anterior o la
+    nueva, nunca una mezcla. Si el archivo nuevo es inválido se conservan los perfiles actuales.
+    """
+
+    def __init__(self, path=BANK_PROFILES_PATH, reload_interval=BANK_PROFILES_RELOAD_INTERVAL):
+        self.path = path
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._profiles = None
+        self._mtime = None
+        self._last_check = 0.0
+        self.last_error = None
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if self._profiles is not None and now - self._last_check < self.reload_interval:
+            return
+
+        with self._lock:
+            if self._profiles is not None and now - self._last_check < self.reload_interval:
+                return
+            self._last_check = now
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except OSError as e:
+                if self._profiles is None:
+                    raise BankProfileError(f"No se encontró el archivo de perfiles: {e}")
+                return
+            if mtime == self._mtime:
+                return
+            try:
+                profiles = load_profiles(self.path)
+            except (OSError, BankProfileError) as e:
+                if self._profiles is None:
+                    raise
+                self.last_error = str(e)
+                return
+            self._profiles = profiles
+            self._mtime = mtime
+            self.last_error = None
+
+    def get(self, name, parser=None):
+        """Retorna el perfil `name`; si se indica `parser` valida que sea de ese tipo."""
+        self._maybe_reload()
+        profile = self._profiles.get(name)
+        if profile is None:
+            raise BankProfileError(f"Perfil de banco desconocido: {name}")
+        if parser and profile.parser != parser:
+            raise BankProfileError(f"El perfil {name} es para el parser '{profile.parser}', no '{parser}'")
+        return profile
+
+    def names(self, parser=None):
+        self._maybe_reload()
+        return [name for name, p in self._profiles.items() if parser is None or p.parser == parser]
+
+
+# Perfiles por defecto de cada parser
+DEFAULT_PROFILES = {
+    "full": "bbva",
+    "partial": "partial",
+    "voucher": "voucher",
+}
+
+registry = ProfileRegistry()
+
+
+def get_profile(name=None, parser=None):
+    """Perfil compilado compartido; sin nombre se usa el perfil por defecto del parser."""
+    if name is None:
+        name = DEFAULT_PROFILES[parser]
+    return registry.get(name, parser)
@@ -1,4 +1,8 @@
 import re
+from datetime import date
+
+from .bank_profiles import get_profile
+from .utils import full_date_re, month_abbreviations, statement_period_re
 
 def clean_total_movements_line(line):
     """
@@ -15,18 +19,33 @@ def clean_total_movements_line(line):
     
     return line.strip()
 
-def extract_fields(text):
+def extract_fields(text, profile=None, fields=None):
+    """
+    Obtiene los campos de una transacción del parser completo.
+    `fields` limita los campos a calcular y regresar (None = todos).
+    """
+    if profile is None:
+        profile = get_profile(parser="full")
+    wanted = set(fields) if fields is not None else None
+
     # Extraer fechas
-    match_dates = re.findall(r"\d{2}/[A-Z]{3}", text)
-    date_oper = match_dates[0] if len(match_dates) > 0 else None
-    date_liq = match_dates[1] if len(match_dates) > 1 else None
+    date_oper = date_liq = None
+    if wanted is None or wanted & {"FECHA_OPER", "FECHA_LIQ"}:
+        match_dates = profile.date_re.findall(text)
+        date_oper = match_dates[0] if len(match_dates) > 0 else None
+        date_liq = match_dates[1] if len(match_dates) > 1 else None
+
+    if wanted is not None and not wanted - {"FECHA_OPER", "FECHA_LIQ"}:
+        # Solo se pidieron fechas: no hace falta separar montos ni descripción
+        dates = {"FECHA_OPER": date_oper, "FECHA_LIQ": date_liq}
+        return {name: dates[name] for name in fields}
 
     # Extraer amounts numéricos
-    amounts = re.findall(r"\d+(?:\.\d{2})", text.replace(",", ""))
+    amounts = profile.amount_re.findall(text.replace(",", ""))
     amounts_float = list(map(float, amounts))
 
     # Buscar la posición del primer número decimal para cortar la descripción
-    first_number = re.search(r"\d+(?:\.\d{2})", text.replace(",", ""))
+    first_number = profile.amount_re.search(text.replace(",", ""))
     if first_number:
         description = text[:first_number.start()].strip()
         rest = text[first_number.end():].strip()
@@ -40,46 +59,22 @@ def extract_fields(text):
 
     # Limpiar espacios múltiples
     description = re.sub(r"\s{2,}", " ", description).strip()
-    header = "OPER LIQ COD. DESCRIPCIÓN REFERENCIA CARGOS ABONOS OPERACIÓN LIQUIDACIÓN"
-    description = description.replace(header, "")
+    description = description.replace(profile.description_header, "")
     
     charges = abonos = operation = liquidation = 0
     control_number = ""
     
-    # En numero de control tener en cuenta C, B, M
-    # Asignar amounts según si es depósito o no
-    if "DEPOSITO E" in description.upper():
-        #Encuentra el numero de control y lo agrega en json
-        match_control_number = re.search(r"([CBM])?(\d{2,3})69(\d{3,5})", description)
-        if match_control_number:
-          letra = match_control_number.group(1) if match_control_number.group(1) else ""
-          resultado = letra + match_control_number.group(2) + "69" + match_control_number.group(3)
-          control_number = resultado
-        else:
-          control_number = "NA"
-            
-        if len(amounts_float) == 1:
-            abonos = amounts_float[0]
-        elif len(amounts_float) == 2:
-            abonos, operation = amounts_float
-        elif len(amounts_float) == 3:
-            abonos, operation, liquidation = amounts_float
-    elif "PAGO CUENTA" in description.upper():
-        control_number = "NA"
-        if len(amounts_float) == 1:
-            abonos = amounts_float[0]
-        elif len(amounts_float) == 2:
-            abonos, operation = amounts_float
-        elif len(amounts_float) == 3:
-            abonos, operation, liquidation = amounts_float
-    elif "SPEI RECIBIDO" in description.upper():
-        match_control_number = re.search(r"([CBM])?(\d{2,3})69(\d{3,5})", description)
-        if match_control_number:
-          letra = match_control_number.group(1) if match_control_number.group(1) else ""
-          resultado = letra + match_control_number.group(2) + "69" + match_control_number.group(3)
-          control_number = resultado
+    # Tipo de movimiento según la tabla del perfil (DEPOSITO E, PAGO CUENTA, SPEI RECIBIDO...
+    # son abonos); sin palabra clave el movimiento es cargo
+    movement = profile.movements.classify(description)
+
+    if movement.type == "abono":
+        # En numero de control tener en cuenta C, B, M
+        if movement.control_number and (wanted is None or "NUMERO_CONTROL" in wanted):
+            #Encuentra el numero de control y lo agrega en json
+            control_number = profile.find_control_number(description) or "NA"
         else:
-          control_number = "NA"
+            control_number = "NA"
 
         if len(amounts_float) == 1:
             abonos = amounts_float[0]
@@ -98,7 +93,7 @@ def extract_fields(text):
         elif len(amounts_float) == 3:
             charges, operation, liquidation = amounts_float
 
-    return {
+    record = {
         "FECHA_OPER": date_oper if date_oper else None,
         "FECHA_LIQ": date_liq if date_liq else None,
         "COD_DESCRIPCION": description,
@@ -107,4 +102,62 @@ def extract_fields(text):
         "OPERACION": operation,
         "LIQUIDACION": liquidation,
         "NUMERO_CONTROL": control_number
-    }
\ No newline at end of file
+    }
+    if fields is not None:
+        return {name: record[name] for name in fields}
+    return record
+
+
+def _month_number(month):
+    """Convierte '01' o 'ENE' al número de mes."""
+    if month.isdigit():
+        return int(month)
+    return month_abbreviations.get(month.upper())
+
+
+def extract_statement_period(text):
+    """
+    Obtiene (año, mes) de inicio del periodo a partir del encabezado del estado de cuenta.
+    Busca primero 'DEL dd/mm/aaaa AL dd/mm/aaaa' y si no existe usa la primera fecha completa.
+    Retorna None si el encabezado no contiene ninguna fecha con año.
+    """
+    match = statement_period_re.search(text)
+    if match:
+        month = _month_number(match.group(2))
+        if month:
+            return int(match.group(3)), month
+
+    for match in full_date_re.finditer(text):
+        month = _month_number(match.group(2))
+        if month:
+            return int(match.group(3)), month
+
+    return None
+
+
+def date_to_ordinal(fecha, period):
+    """
+    Convierte una fecha sin año ('dd/MMM' o 'dd-mm') en un ordinal ordenable
+    usando el periodo (año, mes) del estado de cuenta. Si el mes es menor al de
+    inicio del periodo (p. ej. estado DIC-ENE) se asume el año siguiente.
+    Retorna None si la fecha no se puede interpretar.
+    """
+    if not fecha or not period:
+        return None
+
+    match = re.match(r"(\d{2})[/-](\d{2}|[A-Z]{3})", fecha.strip(), re.IGNORECASE)
+    if not match:
+        return None
+
+    month = _month_number(match.group(2))
+    if not month:
+        return None
+
+    year, start_month = period
+    if month < start_month:
+        year += 1
+
+    try:
+        return date(year, month, int(match.group(1))).toordinal()
+    except ValueError:
+        return None
@@ -0,0 +1,145 @@
+from contextvars import ContextVar
+from datetime import datetime, timezone
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import uuid
+
+# Nivel de los logs de la aplicación (DEBUG habilita el detalle por página)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# json (una línea JSON por evento) o text (legible en desarrollo)
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+
+# Id de correlación de la petición en curso (se propaga a los hilos del threadpool)
+request_id_var = ContextVar("request_id", default=None)
+
+_listener = None
+
+
+class RequestIdFilter(logging.Filter):
+    """Agrega `request_id` al registro en el hilo que lo emite (antes de pasar a la cola)."""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Formatea cada evento como una línea JSON; los campos de `extra={"fields": {...}}` se incluyen al mismo nivel."""
+
+    def format(self, record):
+        event = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            event["request_id"] = record.request_id
+        event.update(getattr(record, "fields", None) or {})
+        return json.dumps(event, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s %(fields)s")
+
+    def format(self, record):
+        record.request_id = getattr(record, "request_id", None) or "-"
+        record.fields = getattr(record, "fields", None) or ""
+        return super().format(record)
+
+
+def setup_logging(level=LOG_LEVEL, fmt=LOG_FORMAT, stream=None):
+    """
+    Configura el logger "app": los eventos se encolan sin bloquear (QueueHandler)
+    y un hilo aparte (QueueListener) los escribe en stdout. Es idempotente.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(RequestIdFilter())
+
+    logger = logging.getLogger("app")
+    logger.setLevel(level)
+    logger.addHandler(queue_handler)
+    logger.propagate = False
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Vacía la cola y detiene el hilo de escritura (al apagar la aplicación)."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+        logger = logging.getLogger("app")
+        for handler in list(logger.handlers):
+            if isinstance(handler, logging.handlers.QueueHandler):
+                logger.removeHandler(handler)
+
+
+def setup_worker_logging(level=LOG_LEVEL, fmt=LOG_FORMAT):
+    """
+    Inicializador de los procesos del pool: el hilo de escritura del proceso
+    principal no existe en el worker, así que cada worker escribe directo a stdout.
+    """
+    global _listener
+    _listener = None
+    logger = logging.getLogger("app")
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+    logger.setLevel(level)
+    logger.addHandler(output)
+    logger.propagate = False
+
+
+def get_logger(name):
+    """Logger hijo de "app" (p. ej. get_logger(__name__) dentro de app/)."""
+    return logging.getLogger(name if name.startswith("app") else f"app.{name}")
+
+
+class RequestIdMiddleware:
+    """
+    Middleware ASGI que asigna un id de correlación a cada petición: usa el
+    header `X-Request-Id` si viene o genera uno, lo deja en `request_id_var`
+    para los logs y lo regresa en la respuesta.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = dict(scope.get("headers") or []).get(b"x-request-id")
+        request_id = incoming.decode("latin-1")[:64] if incoming else uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-request-id", request_id.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            request_id_var.reset(token)
@@ -0,0 +1,112 @@
+import os
+import threading
+import tracemalloc
+from contextlib import contextmanager
+
+# Techo de memoria (MB de Python rastreados por tracemalloc) para el modo de memoria acotada
+MEMORY_LIMIT_MB = float(os.getenv("MEMORY_LIMIT_MB", 256))
+
+_lock = threading.Lock()
+_active_trackers = 0
+# True si los trackers iniciaron tracemalloc (si ya estaba activo no lo detienen)
+_started_tracing = False
+
+
+class MemoryLimitExceeded(Exception):
+    """El procesamiento superó el techo de memoria configurado."""
+
+
+class MemoryTracker:
+    """
+    Mide el pico de memoria de cada etapa de una petición con tracemalloc.
+
+    tracemalloc solo rastrea memoria asignada por Python (no la de poppler), y es
+    global al proceso: con peticiones concurrentes los picos son aproximados.
+
+        with MemoryTracker(limit_mb=128) as tracker:
+            with tracker.stage("parse"):
+                ...
+                tracker.check()
+        tracker.report()  # {"parse": 1.234, ...} en MB
+    """
+
+    def __init__(self, limit_mb=MEMORY_LIMIT_MB):
+        self.limit_bytes = int(limit_mb * 1024 * 1024) if limit_mb else None
+        self.peaks = {}
+        self._baseline = 0
+
+    def __enter__(self):
+        global _active_trackers, _started_tracing
+        with _lock:
+            if _active_trackers == 0 and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                _started_tracing = True
+            _active_trackers += 1
+        self._baseline = tracemalloc.get_traced_memory()[0]
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        global _active_trackers, _started_tracing
+        with _lock:
+            _active_trackers -= 1
+            if _active_trackers == 0 and _started_tracing:
+                tracemalloc.stop()
+                _started_tracing = False
+        return False
+
+    @contextmanager
+    def stage(self, name):
+        """Registra el pico de memoria (sobre la línea base) alcanzado durante la etapa."""
+        tracemalloc.reset_peak()
+        stage_baseline = tracemalloc.get_traced_memory()[0]
+        try:
+            yield
+        finally:
+            peak = tracemalloc.get_traced_memory()[1]
+            self.peaks[name] = max(self.peaks.get(name, 0), peak - stage_baseline)
+
+    def check(self, *args):
+        """
+        Lanza MemoryLimitExceeded si la memoria actual supera el techo.
+        Acepta argumentos para poder usarse como callback `on_page`.
+        """
+        if self.limit_bytes is None:
+            return
+        current = tracemalloc.get_traced_memory()[0] - self._baseline
+        if current > self.limit_bytes:
+            raise MemoryLimitExceeded(
+                f"Se superó el límite de memoria de {self.limit_bytes / 1024 / 1024:.0f} MB"
+            )
+
+    def report(self):
+        """Picos por etapa en MB."""
+        return {name: round(peak / 1024 / 1024, 3) for name, peak in self.peaks.items()}
+
+
+class NullMemoryTracker:
+    """Misma interfaz que MemoryTracker sin costo alguno (modo normal)."""
+
+    limit_bytes = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    @contextmanager
+    def stage(self, name):
+        yield
+
+    def check(self, *args):
+        pass
+
+    def report(self):
+        return {}
+
+
+def get_memory_tracker(enabled, limit_mb=None):
+    """Retorna un MemoryTracker si el modo de memoria acotada está activo."""
+    if not enabled:
+        return NullMemoryTracker()
+    return MemoryTracker(limit_mb if limit_mb else MEMORY_LIMIT_MB)
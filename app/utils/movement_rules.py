@@ -0,0 +1,83 @@
+from collections import namedtuple
+import re
+
+# Tipos de movimiento: en qué columna van los importes
+MOVEMENT_TYPES = ("abono", "cargo")
+OTHER_CATEGORY = "OTROS"
+
+# Resultado de clasificar un concepto:
+#   category        nombre del tipo de movimiento (DEPOSITO, SPEI RECIBIDO, CHEQUE PAGADO...)
+#   type            "abono" o "cargo"
+#   control_number  si el concepto trae número de control (parser full)
+#   force           el tipo aplica aunque el renglón traiga un solo importe (p. ej. cheques pagados)
+MovementRule = namedtuple("MovementRule", ("category", "type", "control_number", "force"))
+
+
+class MovementClassifier:
+    """
+    Tabla de decisión de tipos de movimiento compilada en una sola expresión regular.
+
+    Las reglas se evalúan en orden de prioridad (la primera de la tabla gana), pero
+    el concepto se recorre una sola vez: la expresión busca todas las palabras
+    clave a la vez (con traslape) y se queda con la de mayor prioridad. Agregar un
+    tipo de movimiento no agrega otra pasada por cada renglón.
+    """
+
+    def __init__(self, rules, default):
+        self.rules = tuple(rules)
+        self.default = default
+        self._rule_by_keyword = {}
+        alternatives = []
+        for rule, keywords in self.rules:
+            for keyword in keywords:
+                keyword = keyword.upper()
+                if keyword and keyword not in self._rule_by_keyword:
+                    self._rule_by_keyword[keyword] = (len(self._rule_by_keyword), rule)
+                    alternatives.append(keyword)
+        # Lookahead: registra una coincidencia en cada posición sin consumir texto,
+        # así "CHEQUE PAGADO" no oculta a "PAGADO"; en cada posición gana la de mayor prioridad
+        self._matcher = (
+            re.compile("(?=(" + "|".join(re.escape(k) for k in alternatives) + "))") if alternatives else None
+        )
+
+    def classify(self, text):
+        """Regla de la palabra clave de mayor prioridad presente en `text`, o la regla por defecto."""
+        if not text or self._matcher is None:
+            return self.default
+        best = None
+        for match in self._matcher.finditer(text.upper()):
+            candidate = self._rule_by_keyword[match.group(1)]
+            if best is None or candidate[0] < best[0]:
+                best = candidate
+                if best[0] == 0:
+                    break
+        return best[1] if best else self.default
+
+
+def compile_movement_rules(raw, default_type):
+    """
+    Construye el clasificador a partir de `movement_rules` del perfil:
+
+        {"category": "SPEI RECIBIDO", "type": "abono", "keywords": ["SPEI RECIBIDO"], "control_number": true}
+
+    Lanza ValueError si alguna regla es inválida.
+    """
+    if default_type not in MOVEMENT_TYPES:
+        raise ValueError(f"tipo de movimiento por defecto inválido: {default_type}")
+    rules = []
+    for entry in raw:
+        movement_type = entry.get("type")
+        if movement_type not in MOVEMENT_TYPES:
+            raise ValueError(f"tipo de movimiento inválido: {movement_type}")
+        keywords = entry.get("keywords") or ()
+        if isinstance(keywords, str) or not keywords:
+            raise ValueError(f"la regla {entry.get('category')} necesita una lista de keywords")
+        rule = MovementRule(
+            entry.get("category") or keywords[0],
+            movement_type,
+            bool(entry.get("control_number")),
+            bool(entry.get("force")),
+        )
+        rules.append((rule, tuple(keywords)))
+    default = MovementRule(OTHER_CATEGORY, default_type, False, False)
+    return MovementClassifier(rules, default)
@@ -1,33 +1,33 @@
-phrases_to_ignore = [
-    "Estimado Cliente",
-    "Su Estado de Cuenta ha sido modificado",
-    "Contrato ha sido modificado",
-    "www.bbva.mx",
-    "Con BBVA adelante",
-    "GAT Real",
-    "BBVA BANCOMER",
-    "INSTITUCION DE BANCA MULTIPLE",
-    "Av. Paseo de la Reforma",
-    "Ciudad de México",
-    "R.F.C.",
-    "Estado de Cuenta",
-    "CASH MANAGEMENT MORALES MN",
-    "PAGINA",
-    "No. Cuenta",
-    "No. Cliente",
-    "MAESTRA PYME BBVA"
-]
+import re
 
-partial_phrases_to_ignore = [
-    "Cuenta con",
-    "TECNOLOGICO NACIONAL DE MEXICO",
-    "Número de cuenta",
-    "Saldo disponible",
-    "Detalle de movimientos",
-    "En cumplimiento",
-    "haber utilizado Cajeros",
-    "Cerrar"
-]
+from .bank_profiles import get_profile
 
-pattern_date = r"\b\d{2}/[A-Z]{3}\b"
+# Las frases y patrones de cada banco/layout están en app/config/bank_profiles.json
 
+# Meses abreviados como aparecen en los estados de cuenta (dd/MMM)
+month_abbreviations = {
+    "ENE": 1, "FEB": 2, "MAR": 3, "ABR": 4, "MAY": 5, "JUN": 6,
+    "JUL": 7, "AGO": 8, "SEP": 9, "OCT": 10, "NOV": 11, "DIC": 12
+}
+# Periodo del encabezado: "DEL 01/01/2024 AL 31/01/2024" o "DEL 01/ENE/2024 AL 31/ENE/2024"
+statement_period_re = re.compile(
+    r"DEL\s+(\d{2})[/-](\d{2}|[A-Z]{3})[/-](\d{4})\s+AL\s+(\d{2})[/-](\d{2}|[A-Z]{3})[/-](\d{4})",
+    re.IGNORECASE
+)
+full_date_re = re.compile(r"\b(\d{2})[/-](\d{2}|[A-Z]{3})[/-](\d{4})\b")
+
+
+def __getattr__(name):
+    """
+    Nombres anteriores a los perfiles de banco, para los módulos que aún los
+    importan. Se toman de los perfiles por defecto en cada acceso, así que
+    siguen las recargas de app/config/bank_profiles.json.
+    """
+    if name == "phrases_to_ignore":
+        return list(get_profile(parser="full").phrases_to_ignore)
+    if name == "partial_phrases_to_ignore":
+        return list(get_profile(parser="partial").phrases_to_ignore)
+    if name == "pattern_date":
+        # Fecha dd/MMM con límites de palabra, como el patrón original
+        return rf"\b{get_profile(parser='full').date_re.pattern}\b"
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,32 @@
+import pytest
+
+
+@pytest.fixture
+def statement_pdf():
+    """
+    Fábrica de estados de cuenta parciales (bytes de un PDF con PyMuPDF).
+
+    `statement_pdf(stamp, changed_page=None, pages=4)`: la primera página trae la
+    fecha y hora de generación `stamp`, el número de cuenta y el periodo; cada
+    página tiene 5 movimientos de $300.00 y en `changed_page` uno vale $999.00.
+    """
+    pymupdf = pytest.importorskip("pymupdf")
+
+    def build(stamp, changed_page=None, pages=4):
+        doc = pymupdf.open()
+        for number in range(pages):
+            lines = []
+            if number == 0:
+                lines += [f"05/03/2024 - {stamp}", "Número de cuenta: 0123456789", "Periodo del 01/03/2024 al 28/03/2024"]
+            lines.append("Detalle de movimientos")
+            for k in range(5):
+                amount = "$999.00" if number == changed_page and k == 1 else "$300.00"
+                lines += ["DEPOSITO EFECTIVO", f"{k + 1:02d}-03 {amount} $9,000.00", f"FOLIO: 55{k}{number} ITCV2169{k}{number}56"]
+            page = doc.new_page()
+            for i, line in enumerate(lines):
+                page.insert_text((30, 40 + 11 * i), line, fontsize=8)
+        data = doc.tobytes()
+        doc.close()
+        return data
+
+    return build
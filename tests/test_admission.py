@@ -0,0 +1,98 @@
+"""
+Control de admisión: cola justa ponderada por cliente, rechazo con la cola llena
+y carril lento para los estados de cuenta grandes.
+"""
+import asyncio
+import io
+
+import pytest
+
+from app.services.admission import AdmissionController, AdmissionRejected
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+async def grant_order(controller, requests):
+    """
+    Ocupa el único lugar, forma `requests` (clientes) en la cola y regresa el
+    orden en que reciben turno al liberar uno por uno.
+    """
+    await controller.acquire("ocupado")
+    order = []
+
+    async def one(index, client):
+        await controller.acquire(client)
+        order.append(f"{client}{index}")
+
+    tasks = [asyncio.ensure_future(one(i, client)) for i, client in enumerate(requests)]
+    await settle()
+    for _ in range(len(requests)):
+        controller.release()
+        await settle()
+    await asyncio.gather(*tasks)
+    return order
+
+
+def test_fair_queue_interleaves_clients():
+    controller = AdmissionController(max_concurrent=1, max_queue=16, max_queue_per_client=16, weights={})
+    order = asyncio.run(grant_order(controller, ["a", "a", "a", "a", "b"]))
+    # "b" llegó al final pero no espera a todas las cargas de "a"
+    assert order == ["a0", "b4", "a1", "a2", "a3"]
+
+
+def test_weights_give_more_turns():
+    controller = AdmissionController(max_concurrent=1, max_queue=16, max_queue_per_client=16, weights={"a": 2})
+    order = asyncio.run(grant_order(controller, ["a", "a", "a", "a", "b", "b"]))
+    assert order == ["a0", "a1", "b4", "a2", "a3", "b5"]
+
+
+def test_full_queue_is_rejected():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=1, max_queue=1, max_queue_per_client=1, weights={})
+        await controller.acquire("a")
+        waiting = asyncio.ensure_future(controller.acquire("a"))
+        await settle()
+        with pytest.raises(AdmissionRejected) as rejected:
+            await controller.acquire("b")
+        assert rejected.value.retry_after >= 1
+
+        # Una petición que se cancela en la cola deja su lugar
+        waiting.cancel()
+        await settle()
+        assert controller.stats()["queued"] == 0
+        waiting_b = asyncio.ensure_future(controller.acquire("b"))
+        await settle()
+        controller.release()
+        await waiting_b
+        assert controller.stats()["in_flight"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_large_statements_use_slow_lane(statement_pdf, monkeypatch):
+    pytest.importorskip("pdftotext")
+    from fastapi.testclient import TestClient
+    from app.app import app
+    from app.services import admission, preflight
+
+    lanes = []
+    for name, controller in (("normal", admission.admission), ("lento", admission.slow_admission)):
+        acquire = controller.acquire
+
+        async def spy(client, acquire=acquire, name=name):
+            lanes.append(name)
+            return await acquire(client)
+        monkeypatch.setattr(controller, "acquire", spy)
+    monkeypatch.setattr(preflight, "PREFLIGHT_LARGE_PAGES", 3)
+
+    with TestClient(app) as client:
+        for pages in (2, 4):
+            pdf = statement_pdf("09:00:00", pages=pages)
+            response = client.post(
+                "/api/v1/extract-partial-csv", files=[("file", ("estado.pdf", io.BytesIO(pdf), "application/pdf"))]
+            )
+            assert response.status_code == 200
+    assert lanes == ["normal", "lento"]
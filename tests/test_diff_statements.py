@@ -0,0 +1,40 @@
+"""
+/diff-statements debe encontrar un cambio aunque esté solo en una página intermedia
+(las cachés de páginas y de estados de cuenta no deben ocultarlo).
+"""
+import io
+
+import pytest
+
+pytest.importorskip("pdftotext")
+pytest.importorskip("pymupdf")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.app import app  # noqa: E402
+from app.services.page_cache import page_cache  # noqa: E402
+from app.services.statement_cache import statement_cache  # noqa: E402
+
+
+def test_change_on_middle_page(statement_pdf):
+    page_cache.clear()
+    statement_cache.clear()
+    old = statement_pdf("09:00:00")
+    new = statement_pdf("10:00:00", changed_page=2)
+
+    with TestClient(app) as client:
+        response = client.post(
+            "/api/v1/diff-statements?parser=partial",
+            files=[
+                ("old_file", ("old.pdf", io.BytesIO(old), "application/pdf")),
+                ("new_file", ("new.pdf", io.BytesIO(new), "application/pdf")),
+            ],
+        )
+
+    assert response.status_code == 200
+    diff = response.json()
+    assert diff["summary"]["modified"] == 1
+    change = diff["modified"][0]
+    assert change["changed"] == ["abono"]
+    assert change["before"]["abono"] == "$300.00"
+    assert change["after"]["abono"] == "$999.00"
@@ -0,0 +1,76 @@
+"""
+Peticiones condicionales: el mismo PDF con las mismas opciones responde 304 con
+If-None-Match, sin ocupar un lugar de análisis; cambiar una opción cambia el ETag.
+"""
+import io
+
+import pytest
+
+pytest.importorskip("pdftotext")
+pytest.importorskip("pymupdf")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.app import app  # noqa: E402
+from app.services import admission  # noqa: E402
+from app.services.etag import etag_matches  # noqa: E402
+
+
+def post(client, path, pdf, **headers):
+    return client.post(path, files=[("file", ("estado.pdf", io.BytesIO(pdf), "application/pdf"))], headers=headers)
+
+
+@pytest.fixture
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+def test_not_modified_skips_admission(client, statement_pdf, monkeypatch):
+    pdf = statement_pdf("09:00:00")
+    response = post(client, "/api/v1/extract-partial-csv", pdf)
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    assert not etag.startswith("W/")
+
+    # Sin lugares de análisis ni cola: solo un 304 puede responder sin esperar
+    monkeypatch.setattr(admission.admission, "in_flight", admission.admission.max_concurrent)
+    monkeypatch.setattr(admission.admission, "max_queue", 0)
+    cached = post(client, "/api/v1/extract-partial-csv", pdf, **{"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.headers["ETag"] == etag
+    assert cached.content == b""
+    assert post(client, "/api/v1/extract-partial-csv", pdf).status_code == 503
+
+
+def test_options_change_etag(client, statement_pdf):
+    pdf = statement_pdf("09:00:00")
+    base = post(client, "/api/v1/extract-partial-json", pdf).headers["ETag"]
+    assert post(client, "/api/v1/extract-partial-json", pdf).headers["ETag"] == base
+
+    for query in ("?output_format=ndjson", "?fields=fecha,abono"):
+        response = post(client, "/api/v1/extract-partial-json" + query, pdf)
+        assert response.headers["ETag"] != base
+        # El ETag anterior ya no coincide: se analiza de nuevo
+        assert post(client, "/api/v1/extract-partial-json" + query, pdf, **{"If-None-Match": base}).status_code == 200
+
+    other = statement_pdf("09:00:00", changed_page=1)
+    assert post(client, "/api/v1/extract-partial-json", other).headers["ETag"] != base
+
+
+def test_weak_etag_for_run_dependent_body(client, statement_pdf):
+    pdf = statement_pdf("09:00:00")
+    path = "/api/v1/summarize-statement?parser=partial"
+    etag = post(client, path, pdf).headers["ETag"]
+    # El cuerpo incluye execution_time: no es idéntico byte por byte
+    assert etag.startswith('W/"')
+    assert post(client, path, pdf, **{"If-None-Match": etag}).status_code == 304
+    assert post(client, path, pdf, **{"If-None-Match": etag[2:]}).status_code == 304
+
+
+def test_etag_matches():
+    assert etag_matches('"a", W/"b"', '"b"')
+    assert etag_matches('"b"', 'W/"b"')
+    assert etag_matches("*", '"b"')
+    assert not etag_matches('"a"', '"b"')
+    assert not etag_matches(None, '"b"')
@@ -0,0 +1,57 @@
+"""
+El clasificador compilado de tipos de movimiento debe elegir la misma regla que
+recorrer la tabla en orden y quedarse con la primera que tenga una palabra clave
+en el concepto (como lo hacían los parsers antes de compilarla).
+"""
+from itertools import permutations
+
+import pytest
+
+from app.utils.bank_profiles import get_profile
+from app.utils.movement_rules import compile_movement_rules
+
+
+def first_matching_rule(classifier, text):
+    """Recorrido lineal de la tabla en orden de prioridad."""
+    upper = (text or "").upper()
+    for rule, keywords in classifier.rules:
+        if any(keyword.upper() in upper for keyword in keywords):
+            return rule
+    return classifier.default
+
+
+def concepts(classifier):
+    """Conceptos con cada palabra clave sola, en pares (ambos órdenes) y sin ninguna."""
+    keywords = [keyword for _, rule_keywords in classifier.rules for keyword in rule_keywords]
+    yield from ("", None, "TRASPASO ENTRE CUENTAS", "deposito")
+    for keyword in keywords:
+        yield keyword
+        yield f"REF 123 {keyword.lower()} SUC 45"
+    for first, second in permutations(keywords, 2):
+        yield f"{first} {second}"
+        yield f"{first}{second}"
+
+
+@pytest.mark.parametrize("name,parser", [("bbva", "full"), ("partial", "partial")])
+def test_matches_linear_rule_order(name, parser):
+    classifier = get_profile(name, parser).movements
+    for text in concepts(classifier):
+        assert classifier.classify(text) == first_matching_rule(classifier, text), text
+
+
+def test_overlapping_keywords_keep_priority():
+    # "CHEQUE PAGADO" contiene a "PAGADO" y a "CHEQUE": gana la regla anterior en la tabla
+    classifier = compile_movement_rules([
+        {"category": "CHEQUE PAGADO", "type": "cargo", "keywords": ["CHEQUE PAGADO"], "force": True},
+        {"category": "CHEQUES", "type": "cargo", "keywords": ["CHEQUE", "PAGADO"]},
+        {"category": "DEPOSITO", "type": "abono", "keywords": ["DEPOSITO"]},
+    ], "abono")
+    assert classifier.classify("CHEQUE PAGADO 0012").category == "CHEQUE PAGADO"
+    assert classifier.classify("PAGADO CHEQUE").category == "CHEQUES"
+    assert classifier.classify("DEPOSITO CHEQUE PAGADO").category == "CHEQUE PAGADO"
+    assert classifier.classify("TRASPASO") == classifier.default
+
+
+def test_invalid_rule_type():
+    with pytest.raises(ValueError):
+        compile_movement_rules([{"type": "retiro", "keywords": ["RETIRO"]}], "abono")
@@ -0,0 +1,65 @@
+"""
+Transporte columnar por memoria compartida: las filas salen del segmento
+idénticas a como entraron, y el libro combina los flujos en orden cronológico.
+"""
+from multiprocessing.shared_memory import SharedMemory
+
+import pytest
+
+pytest.importorskip("pdftotext")
+
+from app.services.period_aggregator import Ledger  # noqa: E402
+from app.services.shared_columns import SharedColumns, pack_stream, segment_names  # noqa: E402
+
+
+def pack(stream):
+    name = segment_names(1)[0]
+    return SharedColumns(pack_stream(stream, name))
+
+
+def test_round_trip_keeps_values_and_types():
+    stream = [
+        (738000, {"fecha": "01/MAR", "fecha_iso": "2024-03-01", "cargo": 1500, "abono": None,
+                  "saldo": 9000.5, "raw_lines": ["DEPOSITO EFECTIVO", "01-03 $1,500.00"], "concepto": "Depósito ñ"}),
+        (738001, {"fecha": "02/MAR", "fecha_iso": "2024-03-02", "cargo": None, "abono": 0.01,
+                  "saldo": -12.25, "raw_lines": ["A\x1eB"], "concepto": ""}),
+        # Columnas ausentes y valores que no son importes ni fechas ISO
+        (738001, {"fecha": "03/MAR", "fecha_iso": "2024-3-3", "cargo": 1.005, "concepto": {"k": [1, 2]}}),
+    ]
+    columns = pack(stream)
+    try:
+        assert len(columns) == 3
+        rows = list(columns)
+        assert rows == stream
+        for (_, expected), (_, row) in zip(stream, rows):
+            assert [type(v) for v in row.values()] == [type(v) for v in expected.values()]
+            assert list(row) == list(expected)
+    finally:
+        columns.close()
+
+
+def test_close_releases_segment():
+    columns = pack([(1, {"a": 1})])
+    name = columns.name
+    columns.close()
+    columns.close()
+    with pytest.raises(FileNotFoundError):
+        SharedMemory(name=name)
+
+
+def test_ledger_merges_in_date_order():
+    january = [(10, {"estado_cuenta": "ene", "n": 1}), (12, {"estado_cuenta": "ene", "n": 2}),
+               (15, {"estado_cuenta": "ene", "n": 3})]
+    february = [(12, {"estado_cuenta": "feb", "n": 4}), (12, {"estado_cuenta": "feb", "n": 5}),
+                (20, {"estado_cuenta": "feb", "n": 6})]
+    march = [(9, {"estado_cuenta": "mar", "n": 7}), (30, {"estado_cuenta": "mar", "n": 8})]
+    streams = [pack(january), february, pack(march)]
+
+    with Ledger(streams) as ledger:
+        assert len(ledger) == 8
+        assert ledger.fieldnames == ["estado_cuenta", "n"]
+        # Orden por fecha; en empates el estado anterior (y dentro de él, el orden del PDF)
+        assert [row["n"] for row in ledger] == [7, 1, 2, 4, 5, 3, 6, 8]
+    for stream in (streams[0], streams[2]):
+        with pytest.raises(FileNotFoundError):
+            SharedMemory(name=stream.name)
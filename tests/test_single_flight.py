@@ -0,0 +1,137 @@
+"""
+Single-flight: peticiones idénticas simultáneas comparten un solo trabajo; si
+la petición que lo hacía se cancela, las que esperaban lo vuelven a intentar.
+"""
+import asyncio
+
+import pytest
+
+from app.services.cancellation import CancellationToken, RequestCancelled
+from app.services.single_flight import SingleFlight
+
+
+class Work:
+    """Trabajo que espera a que la prueba lo libere y cuenta sus ejecuciones."""
+
+    def __init__(self, fail_first=None):
+        self.calls = 0
+        self.cleaned = []
+        self.gate = asyncio.Event()
+        self.fail_first = fail_first
+
+    async def __call__(self, value):
+        self.calls += 1
+        call = self.calls
+        await self.gate.wait()
+        if call == 1 and self.fail_first is not None:
+            raise self.fail_first
+        return f"{value}-{call}"
+
+    def cleanup(self, result):
+        self.cleaned.append(result)
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_identical_requests_share_one_run():
+    async def scenario():
+        flight, work = SingleFlight(), Work()
+        leader = asyncio.ensure_future(flight.run("k", work, "pdf", cleanup=work.cleanup))
+        await settle()
+        follower = asyncio.ensure_future(flight.run("k", work, "pdf", cleanup=work.cleanup))
+        await settle()
+        work.gate.set()
+        (first, release_first), (second, release_second) = await asyncio.gather(leader, follower)
+
+        assert first == second == "pdf-1"
+        assert work.calls == 1 and flight.coalesced == 1
+        release_first()
+        assert work.cleaned == []
+        release_second()
+        release_second()
+        assert work.cleaned == ["pdf-1"]
+        assert flight.in_flight() == 0
+
+    asyncio.run(scenario())
+
+
+def test_follower_retries_when_leader_is_cancelled():
+    async def scenario():
+        flight, work = SingleFlight(), Work()
+        leader = asyncio.ensure_future(flight.run("k", work, "pdf", cleanup=work.cleanup))
+        await settle()
+        follower = asyncio.ensure_future(flight.run("k", work, "pdf", cleanup=work.cleanup))
+        await settle()
+
+        leader.cancel()
+        await settle()
+        work.gate.set()
+        result, release = await follower
+
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        # El seguidor hizo su propio trabajo (segunda ejecución)
+        assert result == "pdf-2"
+        assert work.calls == 2
+        release()
+        assert work.cleaned == ["pdf-2"]
+
+    asyncio.run(scenario())
+
+
+def test_follower_retries_when_leader_request_is_cancelled():
+    async def scenario():
+        flight = SingleFlight()
+        work = Work(fail_first=RequestCancelled("El cliente cerró la conexión.", 499))
+        leader = asyncio.ensure_future(flight.run("k", work, "pdf"))
+        await settle()
+        follower = asyncio.ensure_future(flight.run("k", work, "pdf"))
+        await settle()
+        work.gate.set()
+
+        with pytest.raises(RequestCancelled):
+            await leader
+        result, _ = await follower
+        assert result == "pdf-2"
+        assert work.calls == 2
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_follower_does_not_stop_leader():
+    async def scenario():
+        flight, work = SingleFlight(), Work()
+        cancel = CancellationToken(None)
+        leader = asyncio.ensure_future(flight.run("k", work, "pdf", cleanup=work.cleanup))
+        await settle()
+        follower = asyncio.ensure_future(flight.run("k", work, "pdf", cleanup=work.cleanup, cancel=cancel))
+        await settle()
+
+        cancel.cancel("El cliente cerró la conexión.")
+        with pytest.raises(RequestCancelled):
+            await follower
+        work.gate.set()
+        result, release = await leader
+
+        assert result == "pdf-1" and work.calls == 1
+        # El seguidor cancelado ya soltó su parte: al liberar el líder se limpia
+        release()
+        assert work.cleaned == ["pdf-1"]
+
+    asyncio.run(scenario())
+
+
+def test_requests_without_key_are_not_grouped():
+    async def scenario():
+        flight, work = SingleFlight(), Work()
+        runs = [asyncio.ensure_future(flight.run(None, work, "pdf")) for _ in range(2)]
+        await settle()
+        work.gate.set()
+        results = [result for result, _ in await asyncio.gather(*runs)]
+        assert sorted(results) == ["pdf-1", "pdf-2"]
+        assert flight.coalesced == 0
+
+    asyncio.run(scenario())
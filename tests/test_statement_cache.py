@@ -0,0 +1,62 @@
+"""
+Caché por huella del estado de cuenta: cada página se extrae con pdftotext una
+sola vez por petición, tanto si la huella ya estaba en la caché como si no.
+"""
+import pytest
+
+pytest.importorskip("pdftotext")
+pytest.importorskip("pymupdf")
+
+from app.services import statement_processor  # noqa: E402
+from app.services.page_cache import page_cache  # noqa: E402
+from app.services.statement_cache import statement_cache  # noqa: E402
+
+
+class CountingPages:
+    """Páginas de pdftotext que cuentan cuántas veces se extrae cada una."""
+
+    def __init__(self, pdf, renders):
+        self.pdf = pdf
+        self.renders = renders
+
+    def __len__(self):
+        return len(self.pdf)
+
+    def __getitem__(self, index):
+        self.renders.append(index)
+        return self.pdf[index]
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+
+@pytest.fixture
+def renders(monkeypatch):
+    renders = []
+    read_pdf = statement_processor.read_pdf
+    monkeypatch.setattr(statement_processor, "read_pdf", lambda path: CountingPages(read_pdf(path), renders))
+    page_cache.clear()
+    statement_cache.clear()
+    return renders
+
+
+def test_each_page_rendered_once(tmp_path, statement_pdf, renders):
+    first = tmp_path / "first.pdf"
+    second = tmp_path / "second.pdf"
+    # Misma información, distinta hora de generación: la segunda es un acierto
+    first.write_bytes(statement_pdf("09:00:00", pages=12))
+    second.write_bytes(statement_pdf("10:00:00", pages=12))
+
+    def parse(path):
+        return list(statement_processor.stream_partial_transactions(str(path), use_cache=True))
+
+    miss = parse(first)
+    assert sorted(renders) == list(range(12))
+    assert statement_cache.stats()["misses"] == 1
+
+    renders.clear()
+    hit = parse(second)
+    assert sorted(renders) == list(range(12))
+    assert statement_cache.stats()["hits"] == 1
+    assert hit == miss
@@ -0,0 +1,75 @@
+"""
+El XLSX que se escribe a mano (fila por fila dentro del ZIP) debe abrirse en un
+lector de hojas de cálculo con importes como números y fechas como fechas.
+"""
+from datetime import datetime
+import io
+
+import pytest
+
+openpyxl = pytest.importorskip("openpyxl")
+
+from app.services.exporters import write_xlsx  # noqa: E402
+from app.utils.functions import date_to_ordinal  # noqa: E402
+
+
+def to_ordinal(value):
+    return date_to_ordinal(value, (2024, 3))
+
+
+def test_workbook_opens_with_typed_cells(tmp_path):
+    path = tmp_path / "transacciones.xlsx"
+    records = (
+        {"fecha": "01-03", "concepto": "DEPOSITO <EFECTIVO> & \"CIA\"", "abono": "$1,500.00", "cargo": None,
+         "raw_lines": ["DEPOSITO", "01-03 $1,500.00"]},
+        {"fecha": "sin fecha", "concepto": "PAGO\x0b TARJETA", "abono": "", "cargo": "$12.34", "raw_lines": []},
+    )
+    fieldnames = ["fecha", "concepto", "abono", "cargo", "raw_lines"]
+
+    count = write_xlsx(records, str(path), fieldnames, ("abono", "cargo"), ("fecha",), to_ordinal)
+
+    assert count == 2
+    sheet = openpyxl.load_workbook(path).active
+    assert sheet.title == "Transacciones"
+    assert sheet.freeze_panes == "A2"
+    assert [cell.value for cell in sheet[1]] == fieldnames
+    assert sheet["A1"].font.bold
+
+    first = [cell.value for cell in sheet[2]]
+    assert first[0] == datetime(2024, 3, 1)
+    assert first[1] == 'DEPOSITO <EFECTIVO> & "CIA"'
+    assert first[2] == 1500.0
+    assert first[3] is None
+    assert first[4] == "DEPOSITO | 01-03 $1,500.00"
+
+    second = [cell.value for cell in sheet[3]]
+    # Una fecha que no se puede convertir queda como texto; los caracteres de control se quitan
+    assert second[0] == "sin fecha"
+    assert second[1] == "PAGO TARJETA"
+    assert second[2] is None
+    assert second[3] == 12.34
+    assert sheet.max_row == 3
+
+
+def test_no_records_writes_nothing(tmp_path):
+    path = tmp_path / "vacio.xlsx"
+    assert write_xlsx(iter(()), str(path)) == 0
+    assert not path.exists()
+
+
+def test_download_xlsx_endpoint(statement_pdf):
+    pytest.importorskip("pdftotext")
+    from fastapi.testclient import TestClient
+    from app.app import app
+
+    with TestClient(app) as client:
+        response = client.post(
+            "/api/v1/download-xlsx?parser=partial&fields=fecha,abono,saldo",
+            files=[("file", ("estado.pdf", io.BytesIO(statement_pdf("09:00:00")), "application/pdf"))],
+        )
+    assert response.status_code == 200
+    sheet = openpyxl.load_workbook(io.BytesIO(response.content)).active
+    rows = list(sheet.values)
+    assert rows[0] == ("fecha", "abono", "saldo")
+    assert len(rows) - 1 == int(response.headers["X-Total-Count"]) == 20
+    assert all(row[1] == 300.0 and row[2] == 9000.0 for row in rows[1:])